@@ -0,0 +1,173 @@
+import numpy as np
+
+import archive
+import streaks
+from repository import dialect_of, open_cursor
+
+# Estatísticas de longo prazo calculadas no servidor a partir dos totais
+# diários (habit_daily_totals). Cada hábito vira um vetor denso com um dia por
+# posição, e todas as contas são feitas sobre esse vetor, sem laços por dia.
+
+ROLLING_WINDOWS = (7, 30)
+
+
+def daily_totals_query(dialect, habit_ids, start_date, end_date):
+    # (habit_id, dias desde start_date, total) em ordem de hábito e dia
+    query = f"""
+        SELECT habit_id, {dialect.days_between("record_date", "%s")},
+               {dialect.cast_int("total_quantity")}
+        FROM habit_daily_totals
+        WHERE record_date >= %s AND record_date <= %s
+    """
+    params = [start_date, start_date, end_date]
+    if habit_ids is not None:
+        query += f" AND habit_id IN ({', '.join(['%s'] * len(habit_ids))})"
+        params.extend(habit_ids)
+    query += " ORDER BY habit_id, record_date"
+    return query, tuple(params)
+
+
+def load_daily_totals(connection, habit_ids, start_date, end_date):
+    # Devolve {habit_id: (deslocamentos em dias a partir de start_date, totais)}
+    # Cursor de tuplas: as linhas viram uma matriz int64 de uma vez
+    cursor = open_cursor(connection, dict_rows=False)
+    cursor.execute(
+        *daily_totals_query(dialect_of(connection), habit_ids, start_date, end_date)
+    )
+    data = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+    cursor.close()
+
+    habit_column = data[:, 0]
+    ids, starts = np.unique(habit_column, return_index=True)
+    ends = np.append(starts[1:], len(habit_column))
+    daily = {
+        int(habit_id): (data[start:end, 1], data[start:end, 2])
+        for habit_id, start, end in zip(ids, starts, ends)
+    }
+
+    # Anos arquivados (archive.py) entram nos mesmos vetores
+    cursor = connection.cursor()
+    archived = archive.archived_days(cursor, habit_ids, start_date, end_date)
+    cursor.close()
+    empty = np.zeros(0, dtype=np.int64)
+    for habit_id, days in archived.items():
+        offsets = np.array([(day - start_date).days for day, _ in days], dtype=np.int64)
+        totals = np.array([quantity for _, quantity in days], dtype=np.int64)
+        hot_offsets, hot_totals = daily.get(habit_id, (empty, empty))
+        offsets = np.concatenate((offsets, hot_offsets))
+        totals = np.concatenate((totals, hot_totals))
+        order = np.argsort(offsets, kind="stable")
+        daily[habit_id] = (offsets[order], totals[order])
+    return daily
+
+
+def _runs(done):
+    # Início e tamanho de cada sequência de dias cumpridos
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], done.astype(np.int8), [0]))))
+    starts = edges[0::2]
+    return starts, edges[1::2] - starts
+
+
+def _rate(value):
+    return round(float(value), 4) if value is not None else None
+
+
+def _period_rates(done, period_index, period_lengths, expected_days):
+    # Só períodos inteiros dentro da janela entram na média
+    days_in_window = np.bincount(period_index)
+    completed = np.bincount(period_index, weights=done)
+    full = days_in_window == period_lengths
+    if not full.any():
+        return {"periods": 0, "completion_rate": None, "met_target_rate": None}
+    expected = expected_days[full]
+    completed = completed[full]
+    return {
+        "periods": int(full.sum()),
+        "completion_rate": _rate(np.minimum(completed / expected, 1.0).mean()),
+        "met_target_rate": _rate((completed >= expected).mean()),
+    }
+
+
+def summarize(habit, offsets, totals, start_date, end_date):
+    day_count = (end_date - start_date).days + 1
+    quantities = np.zeros(day_count, dtype=np.int64)
+    quantities[offsets] = totals
+    if streaks.uses_target(habit):
+        done = quantities >= habit["target_quantity"]
+    else:
+        done = np.zeros(day_count, dtype=bool)
+        done[offsets] = True
+
+    run_starts, run_lengths = _runs(done)
+    longest_streak = int(run_lengths.max()) if len(run_lengths) else 0
+    # Mesma regra de calculate_streak: a sequência vale se termina no
+    # último dia da janela ou no anterior
+    current_streak = 0
+    if len(run_lengths) and run_starts[-1] + run_lengths[-1] >= day_count - 1:
+        current_streak = int(run_lengths[-1])
+
+    target_days = habit.get("target_days_per_week") or 7
+    day_numbers = np.arange(day_count)
+    weekday = (day_numbers + start_date.weekday()) % 7
+    week_index = (day_numbers + start_date.weekday()) // 7
+    weeks = _period_rates(
+        done,
+        week_index,
+        np.full(week_index[-1] + 1, 7),
+        np.full(week_index[-1] + 1, float(target_days)),
+    )
+
+    dates = np.datetime64(start_date) + day_numbers
+    months = dates.astype("datetime64[M]")
+    month_index = (months - months[0]).astype(np.int64)
+    month_starts = months[0] + np.arange(month_index[-1] + 1)
+    month_lengths = (
+        (month_starts + 1).astype("datetime64[D]") - month_starts.astype("datetime64[D]")
+    ).astype(np.int64)
+    # Meta mensal proporcional: target_days_per_week dias a cada 7
+    months_summary = _period_rates(
+        done, month_index, month_lengths, month_lengths * (target_days / 7.0)
+    )
+
+    rolling = {}
+    cumulative = np.concatenate(([0], np.cumsum(quantities)))
+    for window in ROLLING_WINDOWS:
+        if day_count < window:
+            rolling[str(window)] = {"current": None, "max": None}
+            continue
+        averages = (cumulative[window:] - cumulative[:-window]) / window
+        rolling[str(window)] = {
+            "current": _rate(averages[-1]),
+            "max": _rate(averages.max()),
+        }
+
+    return {
+        "habit_id": habit["id"],
+        "days": day_count,
+        "days_completed": int(done.sum()),
+        "completion_rate": _rate(done.mean()),
+        "total_quantity": int(quantities.sum()),
+        "longest_streak": longest_streak,
+        "current_streak": current_streak,
+        "weekly": {"target_days_per_week": target_days, **weeks},
+        "monthly": {"target_days_per_week": target_days, **months_summary},
+        "rolling_average": rolling,
+        # Segunda-feira primeiro, como datetime.date.weekday()
+        "weekday_distribution": {
+            "days_completed": np.bincount(weekday[done], minlength=7).tolist(),
+            "quantity": np.bincount(weekday, weights=quantities, minlength=7)
+            .astype(np.int64)
+            .tolist(),
+        },
+    }
+
+
+def habit_summaries(connection, habits, start_date, end_date, all_habits=False):
+    # Com all_habits a consulta não filtra por id (varre a janela inteira)
+    habit_ids = None if all_habits else [habit["id"] for habit in habits]
+    series = load_daily_totals(connection, habit_ids, start_date, end_date)
+    empty = np.empty(0, dtype=np.int64)
+    return [
+        summarize(habit, *series.get(habit["id"], (empty, empty)), start_date, end_date)
+        for habit in habits
+    ]
@@ -1,12 +1,46 @@
+import array
+import contextlib
 import datetime
 import os
+import shutil
+import tempfile
 import traceback
 
 from flask import Flask, jsonify, request
-from flask_mysqldb import MySQL
+
+import analytics
+import archive
+import bulk_import
+import changes
+import habit_queries
+import record_batch
+import rollups
+import store
+import streaks
+from completion_index import CompletionIndex
+from jobs import JobRunner
+from metrics import Metrics
+from pagination import (
+    bounded_date_range,
+    decode_key_token,
+    encode_page_token,
+    next_page_headers,
+    requested_page_size,
+    wants_pagination,
+)
+from repository import create_repository
+from response_cache import ResponseCache, add_cache_tags, cached_response
+from streaming import streamed_response
+from streaks import calculate_streak  # noqa: F401 - mantido como API do módulo
+from write_buffer import WriteBuffer, merge_days, pending_by_habit
 
 app = Flask(__name__)
 
+# Motor de armazenamento: "mysql" (padrão) ou "sqlite", um arquivo local para
+# instalações de um nó só (ver repository.py)
+app.config["DATABASE_ENGINE"] = os.environ.get("DATABASE_ENGINE", "mysql")
+app.config["SQLITE_PATH"] = os.environ.get("SQLITE_PATH", "habit_tracker.db")
+
 # Configurações do Banco de Dados
 app.config["MYSQL_HOST"] = os.environ.get("MYSQL_HOST", "localhost")
 app.config["MYSQL_USER"] = os.environ.get("MYSQL_USER", "root")
@@ -14,54 +48,124 @@ app.config["MYSQL_PASSWORD"] = os.environ.get("MYSQL_PASSWORD", "admin")
 app.config["MYSQL_DB"] = os.environ.get("MYSQL_DB", "habit_tracker")
 app.config["MYSQL_CURSORCLASS"] = "DictCursor"
 
-mysql = MySQL(app)
+# Pool de conexões: cada worker (processo) tem o seu, então
+# MYSQL_POOL_MAX_SIZE deve ser >= número de threads por worker
+app.config["MYSQL_POOL_MIN_SIZE"] = int(os.environ.get("MYSQL_POOL_MIN_SIZE", "1"))
+app.config["MYSQL_POOL_MAX_SIZE"] = int(os.environ.get("MYSQL_POOL_MAX_SIZE", "10"))
+app.config["MYSQL_POOL_TIMEOUT"] = float(os.environ.get("MYSQL_POOL_TIMEOUT", "5"))
+app.config["MYSQL_POOL_RECYCLE"] = int(os.environ.get("MYSQL_POOL_RECYCLE", "3600"))
+
+# Réplicas de leitura (replicas.py): "host[:porta][/banco],...". Rotas
+# marcadas com @db.read_only leem delas; vazio = tudo no primário
+app.config["MYSQL_REPLICAS"] = os.environ.get("MYSQL_REPLICAS", "")
+app.config["REPLICA_HEALTH_CHECK_SECONDS"] = float(
+    os.environ.get("REPLICA_HEALTH_CHECK_SECONDS", "2")
+)
+app.config["REPLICA_MAX_LAG_SECONDS"] = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "30"))
+
+# Linhas buscadas por vez no cursor do servidor durante a exportação
+app.config["EXPORT_FETCH_SIZE"] = int(os.environ.get("EXPORT_FETCH_SIZE", "1000"))
+# Linhas por executemany durante a importação
+app.config["IMPORT_BATCH_SIZE"] = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+# Linhas apagadas por transação em delete_all_data
+app.config["DELETE_BATCH_SIZE"] = int(os.environ.get("DELETE_BATCH_SIZE", "1000"))
+# O import replace é uma transação só: linhas apagadas + inseridas, no máximo
+app.config["IMPORT_REPLACE_MAX_ROWS"] = int(
+    os.environ.get("IMPORT_REPLACE_MAX_ROWS", "1000000")
+)
+# Threads por worker para tarefas em segundo plano (?async=1)
+app.config["JOBS_MAX_WORKERS"] = int(os.environ.get("JOBS_MAX_WORKERS", "2"))
+# Limites do endpoint de heatmap em lote
+app.config["HEATMAP_BATCH_MAX_HABITS"] = 200
+app.config["HEATMAP_DEFAULT_WINDOW_DAYS"] = 183
+# Máximo de operações por POST /habit_records/batch
+app.config["RECORDS_BATCH_MAX_OPERATIONS"] = 1000
+# Paginação: tamanho padrão e máximo por página, e janela de datas usada
+# quando o cliente não informa start_date
+app.config["HABITS_PAGE_SIZE_DEFAULT"] = 100
+app.config["HABITS_PAGE_SIZE_MAX"] = 500
+app.config["RECORDS_PAGE_SIZE_DEFAULT"] = 5000
+app.config["RECORDS_PAGE_SIZE_MAX"] = 20000
+app.config["RECORDS_DEFAULT_WINDOW_DAYS"] = 366
+# Estatísticas de longo prazo (/analytics): janela padrão e máxima, em dias
+app.config["ANALYTICS_DEFAULT_WINDOW_DAYS"] = 3 * 366
+app.config["ANALYTICS_MAX_WINDOW_DAYS"] = 10 * 366
+# Registros com mais de ARCHIVE_HORIZON_DAYS (em anos inteiros) vão para
+# habit_record_archive quando "python archive.py run" roda (archive.py)
+app.config["ARCHIVE_HORIZON_DAYS"] = int(os.environ.get("ARCHIVE_HORIZON_DAYS", "730"))
+
+# Cache de respostas dos GETs mais usados pelo app
+app.config["RESPONSE_CACHE_ENABLED"] = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+app.config["RESPONSE_CACHE_MAX_ENTRIES"] = int(
+    os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512")
+)
+app.config["RESPONSE_CACHE_TTL"] = float(os.environ.get("RESPONSE_CACHE_TTL", "30"))
+# GETs idênticos simultâneos compartilham um só cálculo (response_cache.py)
+app.config["RESPONSE_COALESCING_ENABLED"] = (
+    os.environ.get("RESPONSE_COALESCING_ENABLED", "1") == "1"
+)
+
+# Instrumentação (/metrics): consultas mais lentas que o limite vão para o log
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+app.config["SLOW_QUERY_THRESHOLD_MS"] = float(
+    os.environ.get("SLOW_QUERY_THRESHOLD_MS", "200")
+)
+
+# Buffer de escrita para toques em hábitos de quantidade/minutos (veja
+# write_buffer.py): desligado por padrão
+app.config["WRITE_BUFFER_ENABLED"] = os.environ.get("WRITE_BUFFER_ENABLED", "0") == "1"
+app.config["WRITE_BUFFER_WINDOW_MS"] = int(os.environ.get("WRITE_BUFFER_WINDOW_MS", "200"))
+app.config["WRITE_BUFFER_MAX_KEYS"] = int(os.environ.get("WRITE_BUFFER_MAX_KEYS", "500"))
+app.config["WRITE_BUFFER_JOURNAL_DIR"] = os.environ.get(
+    "WRITE_BUFFER_JOURNAL_DIR", "write_buffer_journal"
+)
+app.config["WRITE_BUFFER_FSYNC"] = os.environ.get("WRITE_BUFFER_FSYNC", "0") == "1"
+app.config["WRITE_BUFFER_READ_WAIT_MS"] = int(os.environ.get("WRITE_BUFFER_READ_WAIT_MS", "2000"))
+app.config["WRITE_BUFFER_FLUSH_RETENTION_DAYS"] = int(
+    os.environ.get("WRITE_BUFFER_FLUSH_RETENTION_DAYS", "7")
+)
+
+# Índice em memória dos dias cumpridos por hábito (completion_index.py), usado
+# nas streaks do GET /habits
+app.config["COMPLETION_INDEX_ENABLED"] = (
+    os.environ.get("COMPLETION_INDEX_ENABLED", "1") == "1"
+)
+app.config["COMPLETION_INDEX_MAX_HABITS"] = int(
+    os.environ.get("COMPLETION_INDEX_MAX_HABITS", "100000")
+)
+
+# Formato colunar de /all_habit_records: listas paralelas e datas como
+# deslocamento em dias a partir de base_date
+COLUMNAR_RECORDS_MIMETYPE = "application/vnd.habit-records.columnar+json"
+
+metrics = Metrics(app)
+db = create_repository(app, metrics.wrap_cursor if metrics.enabled else None)
+response_cache = ResponseCache(app, db)
+jobs = JobRunner(app, db)
+
+
+def _invalidate_records(habit_ids):
+    response_cache.invalidate(
+        *(f"habit:{habit_id}" for habit_id in habit_ids),
+        *(f"records:{habit_id}" for habit_id in habit_ids),
+        "records",
+    )
 
 
-def calculate_streak(completed_dates_raw):
-    if not completed_dates_raw:
-        return 0
-    completed_dates = sorted(
-        [
-            d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d))
-            for d in completed_dates_raw
-        ],
-        reverse=True,
-    )
-    current_streak = 0
-    today = datetime.date.today()
-    yesterday = today - datetime.timedelta(days=1)
-
-    if not completed_dates:
-        return 0
-
-    # Verifica se o hábito foi completado hoje ou ontem para iniciar a contagem
-    if completed_dates[0] == today:
-        current_streak = 1
-        compare_date = yesterday
-    elif completed_dates[0] == yesterday:
-        current_streak = 1
-        compare_date = yesterday - datetime.timedelta(days=1)
-    else:
-        # Se não foi completado nem hoje nem ontem, a streak é 0
-        return 0
-
-    # Continua a contagem para os dias anteriores
-    for i in range(1, len(completed_dates)):
-        if completed_dates[i] == compare_date:
-            current_streak += 1
-            compare_date -= datetime.timedelta(days=1)
-        elif completed_dates[i] < compare_date:
-            # Houve uma quebra na sequência
-            break
-    return current_streak
+write_buffer = WriteBuffer(app, db, on_flushed=_invalidate_records)
+# Réplicas só atendem leituras depois de aplicarem o último flush do buffer
+# (deste processo ou dos segmentos de outros que a requisição esperou)
+db.add_read_floor(write_buffer.read_floor)
+completion_index = CompletionIndex(app)
 
 
 @app.route("/categories", methods=["GET"])
+@cached_response(response_cache, "categories")
+@db.read_only
 def get_all_categories():
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id, name FROM categories ORDER BY name ASC")
-        categories = cursor.fetchall()
+        cursor = db.connection.cursor()
+        categories = store.list_categories(cursor)
         cursor.close()
         return jsonify(categories), 200
     except Exception as e:
@@ -86,27 +190,25 @@ def add_habit():
         if not name:
             return jsonify({"error": "Name is required"}), 400
 
-        cursor = mysql.connection.cursor()
-        cursor.execute(
-            "INSERT INTO habits (name, description, count_method, completion_method, target_quantity, target_days_per_week) VALUES (%s, %s, %s, %s, %s, %s)",
-            (
-                name,
-                description,
-                count_method,
-                completion_method,
-                target_quantity,
-                target_days_per_week,
-            ),
+        cursor = db.connection.cursor()
+        habit_id = store.insert_habit(
+            cursor,
+            {
+                "name": name,
+                "description": description,
+                "count_method": count_method,
+                "completion_method": completion_method,
+                "target_quantity": target_quantity,
+                "target_days_per_week": target_days_per_week,
+            },
         )
-        habit_id = cursor.lastrowid
+        streaks.save_state(cursor, streaks.state_from_dates(habit_id, []))
 
         if isinstance(category_ids, list):
-            for category_id in category_ids:
-                cursor.execute(
-                    "INSERT INTO habit_categories (habit_id, category_id) VALUES (%s, %s)",
-                    (habit_id, category_id),
-                )
-        mysql.connection.commit()
+            store.add_habit_categories(cursor, habit_id, category_ids)
+        changes.log(cursor, [changes.habit_change(habit_id)])
+        db.connection.commit()
+        response_cache.invalidate("habits")
         cursor.close()
         return jsonify({"message": "Habit added successfully!", "id": habit_id}), 201
     except KeyError as e:
@@ -114,130 +216,150 @@ def add_habit():
         return jsonify({"error": f"Missing data: {e}"}), 400
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+def _add_pending_to_habits(cursor, habits, pending, today, last_completed_by_habit):
+    # Soma ao período atual de cada hábito os incrementos ainda no buffer de
+    # escrita. Um dia pendente só conta como dia cumprido se ainda não tinha
+    # total no banco.
+    existing = store.days_with_totals(
+        cursor, [(habit_id, day) for habit_id, days in pending.items() for day in days]
+    )
+    for habit in habits:
+        days = pending.get(habit["id"])
+        if not days:
+            continue
+        if habit["count_method"] == "daily":
+            period_start, period_end = today, today
+        elif habit["count_method"] == "monthly":
+            period_start, period_end = rollups.period_bounds("month", today)
+        else:
+            period_start, period_end = rollups.period_bounds("week", today)
+        for day, quantity in days.items():
+            if period_start <= day <= period_end:
+                habit["current_period_quantity"] += quantity
+                if (habit["id"], day) not in existing:
+                    habit["current_period_days_completed"] += 1
+        if today in days:
+            habit["is_completed_today"] = True
+        last_completed = last_completed_by_habit.get(habit["id"])
+        if isinstance(last_completed, str):
+            # MAX() no SQLite devolve a data como texto
+            last_completed = datetime.date.fromisoformat(last_completed)
+        if last_completed is None or max(days) > last_completed:
+            last_completed_by_habit[habit["id"]] = max(days)
+
+
 @app.route("/habits", methods=["GET"])
+@cached_response(response_cache, "habits")
+@write_buffer.consistent_reads
+@db.read_only
 def get_habits():
     try:
-        cursor = mysql.connection.cursor()
+        cursor = db.connection.cursor()
         today = datetime.date.today()
 
-        # Determina o início do período (semana ou mês) com base no count_method (exemplo simplificado para semanal)
-        # Para uma lógica mais precisa de período, você precisaria ajustar isso conforme o count_method
-        # Por ora, current_period_quantity e current_period_days_completed usam a semana atual.
-        start_of_current_period = today - datetime.timedelta(
-            days=today.weekday()
-        )  # Início da semana atual (segunda-feira)
-
-        base_query = """
-            SELECT
-                h.id, h.name, h.description, h.count_method, h.completion_method,
-                h.target_quantity, h.target_days_per_week, h.created_at,
-                (SELECT COUNT(*) FROM habit_records hr_today WHERE hr_today.habit_id = h.id AND hr_today.record_date = %s) > 0 AS is_completed_today,
-                (SELECT MAX(hr_last.record_date) FROM habit_records hr_last WHERE hr_last.habit_id = h.id) AS last_completed_date,
-                COALESCE((
-                    SELECT SUM(hr_qty.quantity_completed)
-                    FROM habit_records hr_qty
-                    WHERE hr_qty.habit_id = h.id
-                      AND hr_qty.record_date >= %s -- início do período atual
-                      AND hr_qty.record_date <= %s -- data de hoje
-                ), 0) AS current_period_quantity,
-                COALESCE((
-                    SELECT COUNT(DISTINCT hr_days.record_date)
-                    FROM habit_records hr_days
-                    WHERE hr_days.habit_id = h.id
-                      AND hr_days.record_date >= %s -- início do período atual
-                      AND hr_days.record_date <= %s -- data de hoje
-                ), 0) AS current_period_days_completed
-            FROM habits h
-        """
-
-        query_params_dates = [
-            today.isoformat(),
-            start_of_current_period.isoformat(),  # Para current_period_quantity
-            today.isoformat(),  # Para current_period_quantity
-            start_of_current_period.isoformat(),  # Para current_period_days_completed
-            today.isoformat(),  # Para current_period_days_completed
-        ]
-
-        filter_category_id = request.args.get("category_id", type=int)
-        final_query_params = list(query_params_dates)
-
-        if filter_category_id:
-            base_query += """
-                JOIN habit_categories hc ON h.id = hc.habit_id
-                WHERE hc.category_id = %s
-            """
-            final_query_params.append(filter_category_id)
+        # SQL compartilhado com async_app.py (habit_queries.py)
+        # Sem limit/per_page/page/page_token, a lista vem inteira
+        page_size = None
+        if wants_pagination():
+            page_size = requested_page_size(
+                app.config["HABITS_PAGE_SIZE_DEFAULT"], app.config["HABITS_PAGE_SIZE_MAX"]
+            )
+        page_token = request.args.get("page_token")
+        page_after = None
+        page_offset = 0
+        if page_token:
+            try:
+                page_after = habit_queries.parse_page_token(page_token)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        elif page_size is not None:
+            # Compatibilidade com ?page=N do app: desloca por OFFSET
+            page_offset = (max(request.args.get("page", 1, type=int), 1) - 1) * page_size
 
-        base_query += " ORDER BY h.created_at DESC"
+        cursor.execute(
+            *habit_queries.habits_query(
+                today,
+                page_size,
+                category_id=request.args.get("category_id", type=int),
+                after=page_after,
+                offset=page_offset,
+            )
+        )
+        habits_results, next_token = habit_queries.split_page(cursor.fetchall(), page_size)
+
+        habit_ids = [habit["id"] for habit in habits_results]
+        add_cache_tags(*(f"habit:{habit_id}" for habit_id in habit_ids))
+        categories_by_habit = {}
+        last_completed_by_habit = {}
+        streak_states = {}
+        streak_states_created = False
+        index_entries = {}
+        pending = {}
+
+        if habit_ids:
+            cursor.execute(*habit_queries.categories_query(habit_ids))
+            categories_by_habit = habit_queries.categories_by_habit(
+                habit_ids, cursor.fetchall()
+            )
 
-        cursor.execute(base_query, tuple(final_query_params))
-        habits_results = cursor.fetchall()
+            cursor.execute(*habit_queries.last_completed_query(habit_ids))
+            for row in cursor.fetchall():
+                last_completed_by_habit[row["habit_id"]] = row["last_completed_date"]
 
-        for habit in habits_results:
-            cat_cursor = mysql.connection.cursor()
-            cat_cursor.execute(
-                """
-                SELECT c.id, c.name FROM categories c
-                JOIN habit_categories hc ON c.id = hc.category_id
-                WHERE hc.habit_id = %s
-            """,
-                (habit["id"],),
-            )
-            habit["categories"] = cat_cursor.fetchall()
-            cat_cursor.close()
-
-            streak_cursor = mysql.connection.cursor()
-            if habit["completion_method"] == "boolean":
-                streak_cursor.execute(
-                    "SELECT DISTINCT record_date FROM habit_records WHERE habit_id = %s ORDER BY record_date DESC",
-                    (habit["id"],),
-                )
-            elif (
-                habit["completion_method"] in ["quantity", "minutes"]
-                and habit["target_quantity"] is not None
-                and habit["target_quantity"] > 0
-            ):
-                streak_cursor.execute(
-                    """
-                    SELECT record_date
-                    FROM (
-                        SELECT record_date, SUM(quantity_completed) as total_quantity_today
-                        FROM habit_records
-                        WHERE habit_id = %s
-                        GROUP BY record_date
-                    ) AS daily_totals
-                    WHERE daily_totals.total_quantity_today >= %s
-                    ORDER BY record_date DESC
-                    """,
-                    (habit["id"], habit["target_quantity"]),
+            if completion_index.enabled:
+                # Bitmap dos dias cumpridos, atualizado pelo registro de alterações
+                index_version = completion_index.sync(cursor)
+                index_entries = completion_index.get_many(
+                    cursor, habits_results, index_version
                 )
             else:
-                streak_cursor.execute(
-                    "SELECT DISTINCT record_date FROM habit_records WHERE habit_id = %s ORDER BY record_date DESC",
-                    (habit["id"],),
+                # Estado de streak persistido: leitura O(1) por hábito
+                streak_states = streaks.load_states(cursor, habit_ids)
+
+            # Incrementos ainda no buffer de escrita (leitura das próprias escritas)
+            pending = pending_by_habit(write_buffer.request_pending(habit_ids))
+            if pending:
+                _add_pending_to_habits(
+                    cursor, habits_results, pending, today, last_completed_by_habit
                 )
 
-            completed_dates_raw_dicts = streak_cursor.fetchall()
-            completed_dates_raw = [
-                row["record_date"] for row in completed_dates_raw_dicts
-            ]
-            streak_cursor.close()
-            habit["current_streak"] = calculate_streak(completed_dates_raw)
-
-            habit["is_completed_today"] = bool(habit["is_completed_today"])
-            if isinstance(habit.get("last_completed_date"), datetime.date):
-                habit["last_completed_date"] = habit["last_completed_date"].isoformat()
-            if isinstance(
-                habit.get("created_at"), datetime.datetime
-            ):  # Assegura que created_at seja string
-                habit["created_at"] = habit["created_at"].isoformat()
+        for habit in habits_results:
+            entry = index_entries.get(habit["id"])
+            if habit["id"] in pending:
+                # Dias pendentes podem estender a sequência: recalcula com eles
+                state = streaks.state_with_pending(cursor, habit, pending[habit["id"]])
+                current_streak = streaks.current_streak_from_state(state, today)
+                longest_streak = state["longest_streak"]
+            elif entry is not None:
+                current_streak = entry.current_streak(today)
+                longest_streak = entry.longest_streak()
+            else:
+                state = streak_states.get(habit["id"])
+                if state is None and db.using_replica:
+                    # Réplicas são só leitura: calcula sem gravar
+                    state = streaks.compute_state(cursor, habit)
+                elif state is None:
+                    # Hábito ainda sem estado persistido: calcula uma vez e grava
+                    state = streaks.recompute_state(cursor, habit)
+                    streak_states_created = True
+                current_streak = streaks.current_streak_from_state(state, today)
+                longest_streak = state["longest_streak"]
+            habit_queries.format_habit(
+                habit,
+                categories_by_habit[habit["id"]],
+                last_completed_by_habit.get(habit["id"]),
+                current_streak,
+                longest_streak,
+            )
 
+        if streak_states_created:
+            db.connection.commit()
         cursor.close()
-        return jsonify(habits_results), 200
+        return jsonify(habits_results), 200, next_page_headers(next_token)
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -247,65 +369,59 @@ def get_habits():
 def update_habit(habit_id):
     try:
         data = request.json
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id FROM habits WHERE id = %s", (habit_id,))
-        if not cursor.fetchone():
+        cursor = db.connection.cursor()
+        habit_info = store.habit_info(cursor, habit_id)
+        if not habit_info:
             cursor.close()
             return jsonify({"error": f"Habit with ID {habit_id} not found."}), 404
 
-        update_fields_habits = []
-        params_habits = []
-        allowed_fields = [
-            "name",
-            "description",
-            "count_method",
-            "completion_method",
-            "target_quantity",
-            "target_days_per_week",
-        ]
-        for field in allowed_fields:
-            if field in data:
-                update_fields_habits.append(f"{field} = %s")
-                params_habits.append(data[field])
-
-        if update_fields_habits:
-            query_habits = (
-                "UPDATE habits SET "
-                + ", ".join(update_fields_habits)
-                + " WHERE id = %s"
-            )
-            params_habits.append(habit_id)
-            cursor.execute(query_habits, tuple(params_habits))
+        if any(field in data for field in store.HABIT_FIELDS):
+            store.update_habit(cursor, habit_id, data)
+
+            # Mudou o critério de conclusão: todo o histórico precisa ser reavaliado
+            if "target_quantity" in data or "completion_method" in data:
+                habit_info.update(
+                    {
+                        field: data[field]
+                        for field in ("target_quantity", "completion_method")
+                        if field in data
+                    }
+                )
+                streaks.recompute_state(cursor, habit_info)
 
         if "category_ids" in data:
             new_category_ids = data.get("category_ids", [])
-            cursor.execute(
-                "DELETE FROM habit_categories WHERE habit_id = %s", (habit_id,)
+            store.replace_habit_categories(
+                cursor, habit_id, new_category_ids if isinstance(new_category_ids, list) else []
             )
-            if isinstance(new_category_ids, list):
-                for category_id in new_category_ids:
-                    cursor.execute(
-                        "INSERT INTO habit_categories (habit_id, category_id) VALUES (%s, %s)",
-                        (habit_id, category_id),
-                    )
-        mysql.connection.commit()
+        changes.log(cursor, [changes.habit_change(habit_id)])
+        db.connection.commit()
+        # Trocar categorias muda quais listas filtradas contêm o hábito
+        if "category_ids" in data:
+            response_cache.invalidate("habits")
+        else:
+            response_cache.invalidate(f"habit:{habit_id}")
         cursor.close()
         return jsonify(
             {"message": f"Habit with ID {habit_id} updated successfully!"}
         ), 200
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/habits/<int:habit_id>", methods=["DELETE"])
+@write_buffer.flushed_first
 def delete_habit(habit_id):
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("DELETE FROM habits WHERE id = %s", (habit_id,))
-        mysql.connection.commit()
-        if cursor.rowcount == 0:
+        cursor = db.connection.cursor()
+        deleted = store.delete_habit(cursor, habit_id)
+        if deleted:
+            changes.log(cursor, [changes.habit_change(habit_id, changes.DELETE)])
+        db.connection.commit()
+        response_cache.invalidate(f"habit:{habit_id}", f"records:{habit_id}", "records")
+        if not deleted:
             cursor.close()
             return jsonify({"error": f"Habit with ID {habit_id} not found."}), 404
         cursor.close()
@@ -314,7 +430,7 @@ def delete_habit(habit_id):
         ), 200
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({"error": str(e)}), 500
 
 
@@ -329,61 +445,132 @@ def add_habit_record():
         if not habit_id or not record_date_str:
             return jsonify({"error": "habit_id and record_date are required."}), 400
 
-        cursor = mysql.connection.cursor()
-        cursor.execute(
-            "SELECT id, completion_method FROM habits WHERE id = %s", (habit_id,)
-        )
-        habit_info = cursor.fetchone()
+        cursor = db.connection.cursor()
+        habit_info = store.habit_info(cursor, habit_id)
         if not habit_info:
             cursor.close()
             return jsonify({"error": f"Habit with ID {habit_id} not found."}), 404
 
-        if habit_info["completion_method"] == "boolean":
-            sql = """
-                INSERT INTO habit_records (habit_id, record_date, quantity_completed)
-                VALUES (%s, %s, 1)
-                ON DUPLICATE KEY UPDATE created_at = CURRENT_TIMESTAMP
-            """
-            params = (habit_id, record_date_str)
-        else:
-            sql = """
-                INSERT INTO habit_records (habit_id, record_date, quantity_completed)
-                VALUES (%s, %s, %s)
-                ON DUPLICATE KEY UPDATE quantity_completed = quantity_completed + VALUES(quantity_completed),
-                                       created_at = CURRENT_TIMESTAMP
-            """
-            params = (habit_id, record_date_str, quantity_to_add)
-
-        cursor.execute(sql, params)
-        mysql.connection.commit()
-        record_id = cursor.lastrowid
+        if write_buffer.enabled and habit_info["completion_method"] != "boolean":
+            # Toque em hábito de quantidade: o incremento fica no buffer e é
+            # gravado junto com os próximos (write_buffer.py)
+            cursor.close()
+            try:
+                record_date = datetime.date.fromisoformat(str(record_date_str))
+            except ValueError:
+                return jsonify({"error": "record_date deve estar no formato AAAA-MM-DD."}), 400
+            if not isinstance(quantity_to_add, int) or isinstance(quantity_to_add, bool):
+                return jsonify({"error": "quantity_completed deve ser um inteiro."}), 400
+            write_buffer.add(habit_id, record_date, quantity_to_add)
+            _invalidate_records([habit_id])
+            return jsonify(
+                {"message": "Habit record added/updated successfully!", "id": None, "buffered": True}
+            ), 201
+
+        archive.thaw(cursor, [(habit_id, record_date_str)])
+        record_id = store.write_record(cursor, habit_info, record_date_str, quantity_to_add)
+        rollups.refresh_day(cursor, habit_id, record_date_str)
+        streaks.on_day_changed(cursor, habit_info, record_date_str)
+        changes.log(cursor, [changes.record_change(habit_id, record_date_str)])
+        db.connection.commit()
+        response_cache.invalidate(f"habit:{habit_id}", f"records:{habit_id}", "records")
         cursor.close()
         return jsonify(
             {"message": "Habit record added/updated successfully!", "id": record_id}
         ), 201
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/habit_records/batch", methods=["POST"])
+@write_buffer.flushed_first
+def apply_habit_records_batch():
+    # Várias operações de registro (add/set/delete, veja record_batch.py) em
+    # uma só transação. Operações inválidas são recusadas individualmente e
+    # as demais aplicadas; a resposta traz o resultado de cada item.
+    data = request.get_json(silent=True)
+    operations = data.get("operations") if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations deve ser uma lista não vazia."}), 400
+    if len(operations) > app.config["RECORDS_BATCH_MAX_OPERATIONS"]:
+        return jsonify(
+            {
+                "error": f"No máximo {app.config['RECORDS_BATCH_MAX_OPERATIONS']} operações por requisição."
+            }
+        ), 400
+
+    results = []
+    parsed = []
+    for index, item in enumerate(operations):
+        try:
+            parsed.append((index, *record_batch.parse_operation(item)))
+            results.append({"index": index, "status": "ok"})
+        except ValueError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+
+    try:
+        cursor = db.connection.cursor()
+        # Todos os hábitos validados com uma consulta
+        habits = store.habit_infos(cursor, sorted({operation[2] for operation in parsed}))
+
+        effects = {}
+        for index, op, habit_id, record_date, quantity in parsed:
+            habit = habits.get(habit_id)
+            if habit is None:
+                results[index] = {
+                    "index": index,
+                    "status": "error",
+                    "error": f"Habit with ID {habit_id} not found.",
+                }
+                continue
+            key = (habit_id, record_date)
+            effects[key] = record_batch.combine(
+                effects.get(key), op, quantity, habit["completion_method"] == "boolean"
+            )
+
+        if effects:
+            changed_habit_ids = record_batch.write_effects(cursor, habits, effects)
+            db.connection.commit()
+            _invalidate_records(changed_habit_ids)
+        cursor.close()
+    except Exception as e:
+        traceback.print_exc()
+        db.connection.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    applied = sum(1 for result in results if result["status"] == "ok")
+    return jsonify(
+        {"applied": applied, "failed": len(results) - applied, "results": results}
+    ), 200
+
+
 @app.route("/habit_records/today", methods=["DELETE"])
+@write_buffer.flushed_first
 def delete_habit_record_today():
     habit_id = request.args.get("habit_id", type=int)
     record_date_str = datetime.date.today().isoformat()
     if not habit_id:
         return jsonify({"error": "habit_id is required as a query parameter."}), 400
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT id FROM habits WHERE id = %s", (habit_id,))
-        if not cursor.fetchone():
+        cursor = db.connection.cursor()
+        habit_info = store.habit_info(cursor, habit_id)
+        if not habit_info:
             cursor.close()
             return jsonify({"error": f"Habit with ID {habit_id} not found."}), 404
-        result = cursor.execute(
-            "DELETE FROM habit_records WHERE habit_id = %s AND record_date = %s",
-            (habit_id, record_date_str),
-        )
-        mysql.connection.commit()
+        result = store.delete_record(cursor, habit_id, record_date_str)
+        if result > 0:
+            rollups.refresh_day(cursor, habit_id, record_date_str)
+            streaks.on_day_changed(cursor, habit_info, record_date_str)
+            changes.log(
+                cursor, [changes.record_change(habit_id, record_date_str, changes.DELETE)]
+            )
+        db.connection.commit()
+        if result > 0:
+            response_cache.invalidate(
+                f"habit:{habit_id}", f"records:{habit_id}", "records"
+            )
         cursor.close()
         if result > 0:
             return jsonify(
@@ -399,64 +586,241 @@ def delete_habit_record_today():
             ), 200
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify(
             {"error": "Failed to delete habit record for today.", "details": str(e)}
         ), 500
 
 
 @app.route("/habits/<int:habit_id>/records", methods=["GET"])
+@cached_response(response_cache)
+@write_buffer.consistent_reads
+@db.read_only
 def get_habit_records_for_heatmap(habit_id):
     try:
-        start_date_str = request.args.get("start_date")
-        end_date_str = request.args.get("end_date")
-        cursor = mysql.connection.cursor()
-        query = "SELECT record_date, quantity_completed FROM habit_records WHERE habit_id = %s"
-        params = [habit_id]
-        if start_date_str:
-            query += " AND record_date >= %s"
-            params.append(start_date_str)
-        if end_date_str:
-            query += " AND record_date <= %s"
-            params.append(end_date_str)
-        query += " ORDER BY record_date ASC"
-        cursor.execute(query, tuple(params))
-        records = cursor.fetchall()
+        add_cache_tags(f"records:{habit_id}")
+        try:
+            start_date, end_date = bounded_date_range(
+                request.args.get("start_date"),
+                request.args.get("end_date"),
+                app.config["RECORDS_DEFAULT_WINDOW_DAYS"],
+            )
+            page_token = request.args.get("page_token")
+            first_day = (
+                decode_key_token(page_token, datetime.date.fromisoformat)[0]
+                if page_token
+                else None
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        page_size = requested_page_size(
+            app.config["RECORDS_PAGE_SIZE_DEFAULT"], app.config["RECORDS_PAGE_SIZE_MAX"]
+        )
+
+        cursor = db.connection.cursor()
+        # Uma linha a mais indica que existe próxima página
+        records = store.habit_records_page(
+            cursor, habit_id, start_date, end_date, first_day, page_size + 1
+        )
         cursor.close()
+
+        pending = pending_by_habit(write_buffer.request_pending([habit_id])).get(habit_id)
+        if pending:
+            # Com a página cheia, dias pendentes depois dela ficam para a próxima
+            last_day = records[-1][0] if len(records) > page_size else end_date
+            records = merge_days(
+                records,
+                {
+                    day: quantity
+                    for day, quantity in pending.items()
+                    if start_date <= day <= last_day and (first_day is None or day > first_day)
+                },
+            )
+
+        next_token = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_token = encode_page_token([records[-1][0]])
         formatted_records = [
             {
-                "record_date": record["record_date"].isoformat(),
-                "quantity_completed": record["quantity_completed"],
+                "record_date": record_date.isoformat(),
+                "quantity_completed": quantity,
             }
-            for record in records
+            for record_date, quantity in records
         ]
-        return jsonify(formatted_records), 200
+        return jsonify(formatted_records), 200, next_page_headers(next_token)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/habit_records/batch", methods=["GET"])
+@cached_response(response_cache)
+@write_buffer.consistent_reads
+@db.read_only
+def get_habit_records_batch_for_heatmap():
+    # Séries de heatmap de vários hábitos em uma só requisição. Cada série é
+    # compacta: dias contados a partir de start_date e quantidades paralelas.
+    try:
+        raw_ids = request.args.get("habit_ids", "")
+        try:
+            habit_ids = sorted({int(value) for value in raw_ids.split(",") if value})
+        except ValueError:
+            return jsonify({"error": "habit_ids deve ser uma lista de inteiros"}), 400
+        if not habit_ids:
+            return jsonify({"error": "habit_ids is required as a query parameter."}), 400
+        if len(habit_ids) > app.config["HEATMAP_BATCH_MAX_HABITS"]:
+            return jsonify(
+                {
+                    "error": f"No máximo {app.config['HEATMAP_BATCH_MAX_HABITS']} hábitos por requisição."
+                }
+            ), 400
+
+        try:
+            end_date = datetime.date.fromisoformat(
+                request.args.get("end_date") or datetime.date.today().isoformat()
+            )
+            start_date = datetime.date.fromisoformat(
+                request.args.get("start_date")
+                or (
+                    end_date
+                    - datetime.timedelta(days=app.config["HEATMAP_DEFAULT_WINDOW_DAYS"])
+                ).isoformat()
+            )
+        except ValueError as e:
+            return jsonify({"error": f"Data inválida: {e}"}), 400
+
+        add_cache_tags(*(f"records:{habit_id}" for habit_id in habit_ids))
+
+        cursor = db.connection.cursor()
+        rows_by_habit = store.records_by_habit(cursor, habit_ids, start_date, end_date)
+        cursor.close()
+
+        # Incrementos ainda no buffer de escrita
+        for habit_id, days in pending_by_habit(
+            write_buffer.request_pending(habit_ids)
+        ).items():
+            rows_by_habit[habit_id] = merge_days(
+                rows_by_habit[habit_id],
+                {day: quantity for day, quantity in days.items() if start_date <= day <= end_date},
+            )
+
+        series = {}
+        for habit_id, rows in rows_by_habit.items():
+            series[str(habit_id)] = {
+                "day_offsets": [(record_date - start_date).days for record_date, _ in rows],
+                "quantities": [quantity for _, quantity in rows],
+            }
+
+        return jsonify(
+            {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "habits": series,
+            }
+        ), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/analytics", methods=["GET"])
+@cached_response(response_cache)
+@write_buffer.flushed_first
+def get_habit_analytics():
+    # Resumo histórico por hábito (maior streak, taxas por semana e mês,
+    # médias móveis, distribuição por dia da semana) calculado no servidor,
+    # no lugar de o app baixar /all_habit_records e percorrer tudo.
+    try:
+        raw_ids = request.args.get("habit_ids", "")
+        try:
+            habit_ids = sorted({int(value) for value in raw_ids.split(",") if value})
+        except ValueError:
+            return jsonify({"error": "habit_ids deve ser uma lista de inteiros"}), 400
+        try:
+            start_date, end_date = bounded_date_range(
+                request.args.get("start_date"),
+                request.args.get("end_date"),
+                app.config["ANALYTICS_DEFAULT_WINDOW_DAYS"],
+            )
+        except ValueError as e:
+            return jsonify({"error": f"Data inválida: {e}"}), 400
+        if end_date < start_date:
+            return jsonify({"error": "end_date deve ser posterior a start_date"}), 400
+        if (end_date - start_date).days >= app.config["ANALYTICS_MAX_WINDOW_DAYS"]:
+            return jsonify(
+                {
+                    "error": f"Janela máxima de {app.config['ANALYTICS_MAX_WINDOW_DAYS']} dias."
+                }
+            ), 400
+
+        if habit_ids:
+            add_cache_tags(
+                *(f"habit:{habit_id}" for habit_id in habit_ids),
+                *(f"records:{habit_id}" for habit_id in habit_ids),
+            )
+        else:
+            add_cache_tags("habits", "records")
+        cursor = db.connection.cursor()
+        habits = store.analytics_habits(cursor, habit_ids)
+        cursor.close()
+
+        summaries = []
+        if habits:
+            summaries = analytics.habit_summaries(
+                db.connection, habits, start_date, end_date, all_habits=not habit_ids
+            )
+        return jsonify(
+            {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat(),
+                "habits": summaries,
+            }
+        ), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/all_habit_records", methods=["GET"])
+@cached_response(response_cache, "records")
+@write_buffer.flushed_first
+@db.read_only
 def get_all_habit_records_for_heatmap():
     try:
-        start_date_str = request.args.get("start_date")
-        end_date_str = request.args.get("end_date")
-        cursor = mysql.connection.cursor()
-        query = "SELECT habit_id, record_date, quantity_completed FROM habit_records"
-        params = []
-        where_clauses = []
-        if start_date_str:
-            where_clauses.append("record_date >= %s")
-            params.append(start_date_str)
-        if end_date_str:
-            where_clauses.append("record_date <= %s")
-            params.append(end_date_str)
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-        query += " ORDER BY record_date ASC"
-        cursor.execute(query, tuple(params))
-        records = cursor.fetchall()
+        try:
+            start_date, end_date = bounded_date_range(
+                request.args.get("start_date"),
+                request.args.get("end_date"),
+                app.config["RECORDS_DEFAULT_WINDOW_DAYS"],
+            )
+            page_token = request.args.get("page_token")
+            last_key = (
+                decode_key_token(page_token, datetime.date.fromisoformat, int)
+                if page_token
+                else None
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        page_size = requested_page_size(
+            app.config["RECORDS_PAGE_SIZE_DEFAULT"], app.config["RECORDS_PAGE_SIZE_MAX"]
+        )
+
+        # Continua depois da última linha (record_date, habit_id) entregue
+        after = tuple(last_key) if last_key else None
+        if _wants_columnar_records():
+            return _columnar_records_response(start_date, end_date, after, page_size)
+
+        cursor = db.connection.cursor()
+        records = store.all_records_page(cursor, start_date, end_date, after, page_size + 1)
         cursor.close()
+
+        next_token = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_token = encode_page_token(
+                [records[-1]["record_date"], records[-1]["habit_id"]]
+            )
         formatted_records = [
             {
                 "habit_id": record["habit_id"],
@@ -465,233 +829,486 @@ def get_all_habit_records_for_heatmap():
             }
             for record in records
         ]
-        return jsonify(formatted_records), 200
+        return jsonify(formatted_records), 200, next_page_headers(next_token)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+def _wants_columnar_records():
+    # Formato colunar é opcional: ?format=columnar ou pelo cabeçalho Accept
+    if request.args.get("format") == "columnar":
+        return True
+    return COLUMNAR_RECORDS_MIMETYPE in request.accept_mimetypes.values()
+
+
+def _columnar_records_response(base_date, end_date, after, page_size):
+    # Lê as linhas como tuplas, com cursor do servidor, para colunas
+    # compactas (array de inteiros), sem montar um dict por registro
+    habit_ids = array.array("q")
+    day_offsets = array.array("l")
+    quantities = []
+    next_token = None
+    rows = store.iter_all_records_rows(
+        db.connection, base_date, end_date, after, page_size + 1, app.config["EXPORT_FETCH_SIZE"]
+    )
+    with contextlib.closing(rows):
+        last_key = None
+        for habit_id, record_date, quantity_completed in rows:
+            if len(habit_ids) == page_size:
+                next_token = encode_page_token(last_key)
+                break
+            habit_ids.append(habit_id)
+            day_offsets.append((record_date - base_date).days)
+            quantities.append(quantity_completed)
+            last_key = [record_date, habit_id]
+
+    return streamed_response(
+        _generate_columnar_records(base_date, habit_ids, day_offsets, quantities),
+        COLUMNAR_RECORDS_MIMETYPE,
+        headers=next_page_headers(next_token),
+    )
+
+
+def _json_number_chunks(values, chunk_size=8192):
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start : start + chunk_size]
+        yield ("," if start else "") + ",".join(
+            "null" if value is None else str(value) for value in chunk
+        )
+
+
+def _generate_columnar_records(base_date, habit_ids, day_offsets, quantities):
+    yield '{"base_date":%s,"count":%d,"habit_id":[' % (
+        _dump_compact(base_date.isoformat()),
+        len(habit_ids),
+    )
+    yield from _json_number_chunks(habit_ids)
+    yield '],"day_offset":['
+    yield from _json_number_chunks(day_offsets)
+    yield '],"quantity_completed":['
+    yield from _json_number_chunks(quantities)
+    yield "]}\n"
+
+
+def _export_habit(habit_raw, category_ids_json):
+    return {
+        "id_json": habit_raw["id"],
+        "name": habit_raw["name"],
+        "description": habit_raw["description"],
+        "count_method": habit_raw["count_method"],
+        "completion_method": habit_raw["completion_method"],
+        "target_quantity": habit_raw["target_quantity"],
+        "target_days_per_week": habit_raw["target_days_per_week"],
+        "created_at": habit_raw["created_at"].isoformat()
+        if isinstance(habit_raw["created_at"], datetime.datetime)
+        else str(habit_raw["created_at"]),
+        "category_ids_json": category_ids_json,
+    }
+
+
+def _export_record(rec):
+    return {
+        "habit_id_json": rec["habit_id"],  # Usa o ID original do hábito
+        "record_date": rec["record_date"].isoformat()
+        if isinstance(rec["record_date"], datetime.date)
+        else str(rec["record_date"]),
+        "quantity_completed": rec["quantity_completed"],
+    }
+
+
+def _iter_export_records():
+    # As linhas chegam em blocos durante a resposta, sem fetchall()
+    for rec in store.iter_all_records(db.connection, app.config["EXPORT_FETCH_SIZE"]):
+        yield _export_record(rec)
+
+
+def _dump_compact(value):
+    # Mesmo formato do jsonify (chaves ordenadas, sem espaços)
+    return app.json.dumps(value, separators=(",", ":"))
+
+
+def _json_array(items):
+    for index, item in enumerate(items):
+        yield ("," if index else "") + _dump_compact(item)
+
+
+def _generate_export_json(categories_export, habits_export):
+    # As seções saem na mesma ordem (alfabética) do jsonify original
+    yield '{"categories":['
+    yield from _json_array(categories_export)
+    yield '],"habit_records":['
+    yield from _json_array(_iter_export_records())
+    yield '],"habits":['
+    yield from _json_array(habits_export)
+    yield "]}\n"
+
+
+def _generate_export_ndjson(categories_export, habits_export):
+    # Uma linha por item; hábitos vêm antes dos registros que os referenciam
+    for section, items in (
+        ("categories", categories_export),
+        ("habits", habits_export),
+        ("habit_records", _iter_export_records()),
+    ):
+        for item in items:
+            yield _dump_compact({"section": section, "data": item}) + "\n"
+
+
+def _sync_habits(cursor, habit_ids=None):
+    # Campos do hábito, ids das categorias e o estado da streak
+    habits = store.habits_with_category_ids(cursor, habit_ids)
+    if not habits:
+        return []
+    states = streaks.load_states(cursor, [habit["id"] for habit in habits])
+    today = datetime.date.today()
+    for habit in habits:
+        state = states.get(habit["id"])
+        habit["current_streak"] = (
+            streaks.current_streak_from_state(state, today) if state else 0
+        )
+        habit["longest_streak"] = state["longest_streak"] if state else 0
+        if isinstance(habit.get("created_at"), datetime.datetime):
+            habit["created_at"] = habit["created_at"].isoformat()
+    return habits
+
+
+def _record_json(record):
+    return {
+        "habit_id": record["habit_id"],
+        "record_date": record["record_date"].isoformat(),
+        "quantity_completed": record["quantity_completed"],
+    }
+
+
+@app.route("/sync", methods=["GET"])
+@write_buffer.flushed_first
+def sync():
+    # Sincronização incremental: o cliente manda a versão da última chamada
+    # (since) e recebe só o que mudou depois dela, com a nova versão. Sem
+    # since, depois de um reset (import/delete_all_data) ou se o log já foi
+    # podado, a resposta é completa (full = true) e o cliente troca tudo.
+    since = request.args.get("since", 0, type=int)
+    try:
+        cursor = db.connection.cursor()
+        version = changes.current_version(cursor)
+        if since > version:
+            cursor.close()
+            return jsonify({"error": f"since maior que a versão atual ({version})."}), 400
+
+        full = since <= 0
+        delta = None
+        if not full and since < version:
+            oldest = changes.oldest_version(cursor)
+            if not changes.log_covers(since, oldest):
+                full = True
+            else:
+                delta = changes.changes_between(cursor, since, version)
+                full = delta["reset"]
+
+        payload = {
+            "version": version,
+            "full": full,
+            "habits": [],
+            "deleted_habit_ids": [],
+            "records": [],
+            "deleted_records": [],
+        }
+        if full:
+            start_date = datetime.date.today() - datetime.timedelta(
+                days=app.config["RECORDS_DEFAULT_WINDOW_DAYS"]
+            )
+            payload["habits"] = _sync_habits(cursor)
+            payload["categories"] = store.list_categories(cursor)
+            # Histórico mais antigo continua disponível em /all_habit_records
+            payload["records"] = [
+                _record_json(record) for record in store.recent_records(cursor, start_date)
+            ]
+            payload["records_start_date"] = start_date.isoformat()
+        elif delta is not None:
+            deleted_habits = {
+                habit_id for habit_id, op in delta["habits"].items() if op == changes.DELETE
+            }
+            # Registros alterados também mudam a streak do hábito
+            habit_ids = (
+                set(delta["habits"]) | {habit_id for habit_id, _ in delta["records"]}
+            ) - deleted_habits
+            habits = _sync_habits(cursor, sorted(habit_ids))
+            found = {habit["id"] for habit in habits}
+            payload["habits"] = habits
+            payload["deleted_habit_ids"] = sorted(
+                deleted_habits | {i for i in delta["habits"] if i not in found}
+            )
+
+            upserted = [
+                key
+                for key, op in delta["records"].items()
+                if op == changes.UPSERT and key[0] not in deleted_habits
+            ]
+            records = store.records_for_keys(cursor, upserted)
+            present = {(record["habit_id"], record["record_date"]) for record in records}
+            payload["records"] = [_record_json(record) for record in records]
+            payload["deleted_records"] = [
+                {"habit_id": habit_id, "record_date": record_date.isoformat()}
+                for habit_id, record_date in sorted(delta["records"])
+                if habit_id not in deleted_habits
+                and (habit_id, record_date) not in present
+            ]
+        cursor.close()
+        return jsonify(payload), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/export_data", methods=["GET"])
+@write_buffer.flushed_first
+@db.read_only
 def export_data():
     try:
-        cursor = mysql.connection.cursor()
+        export_format = request.args.get("format", "json")
+        if export_format not in ("json", "ndjson"):
+            return jsonify({"error": f"Formato de exportação inválido: {export_format}"}), 400
+
+        cursor = db.connection.cursor()
 
         # Exportar Categorias
-        cursor.execute("SELECT id, name FROM categories")
-        categories_raw = cursor.fetchall()
         categories_export = [
-            {"id_json": cat["id"], "name": cat["name"]} for cat in categories_raw
+            {"id_json": cat["id"], "name": cat["name"]}
+            for cat in store.list_categories(cursor)
         ]
 
-        # Exportar Hábitos
-        cursor.execute("""
-            SELECT h.id, h.name, h.description, h.count_method, h.completion_method,
-                   h.target_quantity, h.target_days_per_week, h.created_at
-            FROM habits h
-        """)
-        habits_raw = cursor.fetchall()
-        habits_export = []
-        for habit_raw in habits_raw:
-            # Buscar categorias para este hábito
-            cursor.execute(
-                """
-                SELECT category_id FROM habit_categories WHERE habit_id = %s
-            """,
-                (habit_raw["id"],),
-            )
-            habit_categories_raw = cursor.fetchall()
-            # Usamos o ID original do banco como id_json para facilitar o mapeamento
-            # das relações em habit_categories e habit_records
-            category_ids_json = [hc["category_id"] for hc in habit_categories_raw]
-
-            habits_export.append(
-                {
-                    "id_json": habit_raw["id"],
-                    "name": habit_raw["name"],
-                    "description": habit_raw["description"],
-                    "count_method": habit_raw["count_method"],
-                    "completion_method": habit_raw["completion_method"],
-                    "target_quantity": habit_raw["target_quantity"],
-                    "target_days_per_week": habit_raw["target_days_per_week"],
-                    "created_at": habit_raw["created_at"].isoformat()
-                    if isinstance(habit_raw["created_at"], datetime.datetime)
-                    else str(habit_raw["created_at"]),
-                    "category_ids_json": category_ids_json,
-                }
-            )
-
-        # Exportar Registros de Hábitos
-        cursor.execute(
-            "SELECT habit_id, record_date, quantity_completed FROM habit_records"
-        )
-        records_raw = cursor.fetchall()
-        records_export = [
-            {
-                "habit_id_json": rec["habit_id"],  # Usa o ID original do hábito
-                "record_date": rec["record_date"].isoformat()
-                if isinstance(rec["record_date"], datetime.date)
-                else str(rec["record_date"]),
-                "quantity_completed": rec["quantity_completed"],
-            }
-            for rec in records_raw
+        # Exportar Hábitos, com as categorias de todos em uma única consulta.
+        # Usamos o ID original do banco como id_json para facilitar o mapeamento
+        # das relações em habit_categories e habit_records
+        habits_export = [
+            _export_habit(habit_raw, habit_raw["category_ids"])
+            for habit_raw in store.habits_with_category_ids(cursor)
         ]
-
         cursor.close()
 
-        export_content = {
-            "categories": categories_export,
-            "habits": habits_export,
-            "habit_records": records_export,
-        }
-        return jsonify(export_content), 200
+        # Exportar Registros de Hábitos: gerados sob demanda durante a resposta
+        # ?gzip=1/0 força a compressão; sem o parâmetro vale o Accept-Encoding
+        compress = request.args.get("gzip", type=int)
+        if compress is not None:
+            compress = bool(compress)
+        if export_format == "ndjson":
+            return streamed_response(
+                _generate_export_ndjson(categories_export, habits_export),
+                "application/x-ndjson",
+                compress=compress,
+            )
+        return streamed_response(
+            _generate_export_json(categories_export, habits_export),
+            "application/json",
+            compress=compress,
+        )
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Erro ao exportar dados", "details": str(e)}), 500
 
 
+def _wants_async():
+    return request.args.get("async", "0") == "1"
+
+
+def _job_accepted(job_id):
+    response = jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response, 202
+
+
 @app.route("/import_data", methods=["POST"])
+@write_buffer.flushed_first
 def import_data():
-    try:
-        data = request.json
+    # O corpo é lido em partes e as linhas são inseridas com executemany.
+    # strategy=replace (padrão) apaga tudo antes, como antes, numa transação
+    # só, sem lotes confirmados: acima de IMPORT_REPLACE_MAX_ROWS linhas
+    # responde 413. strategy=merge faz upsert sobre os dados existentes,
+    # confirmando cada lote. Com ?async=1 o corpo vai para um arquivo
+    # temporário e a carga roda como tarefa em segundo plano (202 com o id
+    # para GET /jobs/<id>; no replace o progresso só aparece no final).
+    strategy = request.args.get("strategy", "replace")
+    if strategy not in bulk_import.IMPORT_STRATEGIES:
+        return jsonify({"error": f"Estratégia de importação inválida: {strategy}"}), 400
+    batch_size = request.args.get(
+        "batch_size", default=app.config["IMPORT_BATCH_SIZE"], type=int
+    )
+    if batch_size <= 0:
+        return jsonify({"error": "batch_size deve ser positivo"}), 400
+    max_replace_rows = app.config["IMPORT_REPLACE_MAX_ROWS"]
 
-        imported_categories = data.get("categories", [])
-        imported_habits = data.get("habits", [])
-        imported_records = data.get("habit_records", [])
+    gzip_encoded = request.headers.get("Content-Encoding", "").lower() == "gzip"
+    ndjson = request.mimetype == "application/x-ndjson"
 
-        cursor = mysql.connection.cursor()
+    def sections(stream):
+        if ndjson:
+            return bulk_import.iter_ndjson_sections(stream, gzip_encoded)
+        return bulk_import.iter_json_sections(stream, gzip_encoded)
 
-        # 1. Limpar dados existentes (ordem reversa de criação para FKs)
-        cursor.execute(
-            "SET FOREIGN_KEY_CHECKS=0"
-        )  # Desabilitar temporariamente para facilitar a limpeza
-        cursor.execute("DELETE FROM habit_records")
-        cursor.execute("DELETE FROM habit_categories")
-        cursor.execute("DELETE FROM habits")
-        cursor.execute("DELETE FROM categories")
-        cursor.execute("SET FOREIGN_KEY_CHECKS=1")  # Reabilitar
-
-        # Mapeamentos de IDs JSON para novos IDs do DB
-        category_id_map = {}  # json_id -> db_id
-        habit_id_map = {}  # json_id -> db_id
-
-        # 2. Importar Categorias
-        for cat_data in imported_categories:
-            cursor.execute(
-                "INSERT INTO categories (name) VALUES (%s)", (cat_data["name"],)
-            )
-            new_category_id = cursor.lastrowid
-            category_id_map[cat_data["id_json"]] = new_category_id
+    if _wants_async():
+        spooled = tempfile.TemporaryFile()
+        try:
+            shutil.copyfileobj(request.stream, spooled, bulk_import.READ_CHUNK_BYTES)
+            spooled.seek(0)
 
-        # 3. Importar Hábitos e suas relações com categorias
-        for habit_data in imported_habits:
-            created_at_dt = None
-            if habit_data.get("created_at"):
+            def run(connection, report):
                 try:
-                    created_at_dt = datetime.datetime.fromisoformat(
-                        habit_data["created_at"].replace("Z", "+00:00")
+                    return bulk_import.run_import(
+                        connection,
+                        sections(spooled),
+                        strategy,
+                        batch_size,
+                        app.logger,
+                        report,
+                        max_replace_rows,
                     )
-                except (
-                    ValueError
-                ):  # Tentar apenas parsing de data se datetime falhar, ou deixar null
-                    try:
-                        created_at_dt = datetime.datetime.combine(
-                            datetime.date.fromisoformat(habit_data["created_at"]),
-                            datetime.time.min,
-                        )
-                    except ValueError:
-                        pass  # ou definir um default, ou logar um aviso
-
-            cursor.execute(
-                """INSERT INTO habits (name, description, count_method, completion_method,
-                                     target_quantity, target_days_per_week, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    habit_data["name"],
-                    habit_data.get("description"),
-                    habit_data["count_method"],
-                    habit_data["completion_method"],
-                    habit_data.get("target_quantity"),
-                    habit_data.get("target_days_per_week"),
-                    created_at_dt,
-                ),
+                finally:
+                    response_cache.clear()
+
+            job_id = jobs.submit(
+                "import_data",
+                run,
+                {"strategy": strategy, "batch_size": batch_size},
+                cleanup=spooled.close,
             )
-            new_habit_id = cursor.lastrowid
-            habit_id_map[habit_data["id_json"]] = new_habit_id
-
-            # Associar categorias ao hábito
-            for json_category_id in habit_data.get("category_ids_json", []):
-                if json_category_id in category_id_map:
-                    db_category_id = category_id_map[json_category_id]
-                    cursor.execute(
-                        "INSERT INTO habit_categories (habit_id, category_id) VALUES (%s, %s)",
-                        (new_habit_id, db_category_id),
-                    )
-
-        # 4. Importar Registros de Hábitos
-        for record_data in imported_records:
-            json_habit_id = record_data["habit_id_json"]
-            if json_habit_id in habit_id_map:
-                db_habit_id = habit_id_map[json_habit_id]
-                record_date_dt = None
-                if record_data.get("record_date"):
-                    try:
-                        record_date_dt = datetime.date.fromisoformat(
-                            record_data["record_date"]
-                        )
-                    except ValueError:
-                        pass  # Lidar com data inválida, se necessário
-
-                if record_date_dt:
-                    cursor.execute(
-                        """INSERT INTO habit_records (habit_id, record_date, quantity_completed)
-                        VALUES (%s, %s, %s)""",
-                        (
-                            db_habit_id,
-                            record_date_dt,
-                            record_data.get(
-                                "quantity_completed", 1
-                            ),  # Default para 1 se for booleano
-                        ),
-                    )
+        except Exception as e:
+            traceback.print_exc()
+            spooled.close()
+            return jsonify({"error": "Erro ao importar dados", "details": str(e)}), 500
+        return _job_accepted(job_id)
 
-        mysql.connection.commit()
-        cursor.close()
-        return jsonify({"message": "Dados importados com sucesso!"}), 201
+    try:
+        try:
+            stats = bulk_import.run_import(
+                db.connection,
+                sections(request.stream),
+                strategy,
+                batch_size,
+                app.logger,
+                max_replace_rows=max_replace_rows,
+            )
+        finally:
+            # No merge, lotes já confirmados ficam visíveis mesmo com erro
+            response_cache.clear()
+        return jsonify({"message": "Dados importados com sucesso!", **stats}), 201
 
+    except bulk_import.ReplaceTooLarge as e:
+        return jsonify({"error": str(e)}), 413
     except KeyError as e:
         traceback.print_exc()
-        mysql.connection.rollback()
         return jsonify({"error": f"Formato JSON inválido. Campo faltando: {e}"}), 400
+    except ValueError as e:
+        traceback.print_exc()
+        return jsonify({"error": "Formato JSON inválido", "details": str(e)}), 400
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
         return jsonify({"error": "Erro ao importar dados", "details": str(e)}), 500
 
 
+def _delete_all_data(connection, batch_size, report=None):
+    try:
+        deleted = bulk_import.delete_all_rows(connection, batch_size, report)
+        cursor = connection.cursor()
+        changes.log(cursor, [changes.reset_change("delete_all_data")])
+        connection.commit()
+        cursor.close()
+    finally:
+        # Lotes já confirmados ficam visíveis mesmo com erro
+        response_cache.clear()
+    return {"deleted": deleted}
+
+
 @app.route("/delete_all_data", methods=["DELETE"])
+@write_buffer.flushed_first
 def delete_all_data():
+    # Apaga em lotes de batch_size linhas, cada um na sua transação. Com
+    # ?async=1 roda como tarefa em segundo plano (202 com o id do job).
+    batch_size = request.args.get(
+        "batch_size", default=app.config["DELETE_BATCH_SIZE"], type=int
+    )
+    if batch_size <= 0:
+        return jsonify({"error": "batch_size deve ser positivo"}), 400
     try:
-        cursor = mysql.connection.cursor()
-        cursor.execute("SET FOREIGN_KEY_CHECKS=0")  # Desabilitar checagem de FK
-        cursor.execute("DELETE FROM habit_records")
-        cursor.execute("DELETE FROM habit_categories")
-        cursor.execute("DELETE FROM habits")
-        cursor.execute(
-            "DELETE FROM categories"
-        )  # Decide se quer limpar categorias também
-        # Se não quiser limpar categorias: cursor.execute("TRUNCATE TABLE categories") -> para resetar auto_increment se a tabela estiver vazia
-        cursor.execute("SET FOREIGN_KEY_CHECKS=1")  # Reabilitar checagem de FK
-        mysql.connection.commit()
-        cursor.close()
-        return jsonify({"message": "Todos os dados foram deletados com sucesso!"}), 200
+        if _wants_async():
+            job_id = jobs.submit(
+                "delete_all_data",
+                lambda connection, report: _delete_all_data(connection, batch_size, report),
+                {"batch_size": batch_size},
+            )
+            return _job_accepted(job_id)
+        stats = _delete_all_data(db.connection, batch_size)
+        return jsonify(
+            {"message": "Todos os dados foram deletados com sucesso!", **stats}
+        ), 200
     except Exception as e:
         traceback.print_exc()
-        mysql.connection.rollback()
+        db.connection.rollback()
         return jsonify(
             {"error": "Erro ao deletar todos os dados", "details": str(e)}
         ), 500
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    try:
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+
+@app.route("/pool/stats", methods=["GET"])
+def get_pool_stats():
+    return jsonify(db.stats()), 200
+
+
+@app.route("/write_buffer/stats", methods=["GET"])
+def get_write_buffer_stats():
+    return jsonify(write_buffer.stats()), 200
+
+
+@app.route("/completion_index/stats", methods=["GET"])
+def get_completion_index_stats():
+    return jsonify(completion_index.stats()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    gauges = {}
+    # Os mesmos números de /pool/stats, /cache/stats, /write_buffer/stats e
+    # /completion_index/stats, como gauges
+    db_stats = db.stats()
+    for prefix, source, stats in (
+        ("db_pool", "/pool/stats", db_stats),
+        ("response_cache", "/cache/stats", response_cache.stats()),
+        ("write_buffer", "/write_buffer/stats", write_buffer.stats()),
+        ("completion_index", "/completion_index/stats", completion_index.stats()),
+    ):
+        for name, value in stats.items():
+            if isinstance(value, (int, float)):
+                gauges[f"{prefix}_{name}"] = (f"Campo {name} de {source}.", value)
+    for position, replica in enumerate(db_stats.get("replicas", [])):
+        for name in ("healthy", "version", "lag_seconds", "reads", "behind", "failed_checks"):
+            if isinstance(replica[name], (int, float)):
+                gauges[f"db_replica{position}_{name}"] = (
+                    f"Campo {name} da réplica {replica['name']} em /pool/stats.",
+                    replica[name],
+                )
+    return app.response_class(
+        metrics.render(gauges), mimetype="text/plain; version=0.0.4"
+    )
+
+
 if __name__ == "__main__":
+    # Servidor de desenvolvimento; em produção use o gunicorn (veja wsgi.py)
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,537 @@
+import array
+import datetime
+import heapq
+import re
+import sys
+
+from repository import dialect_of
+
+# Histórico frio de habit_records (migração 0008). Registros de anos
+# inteiros mais antigos que ARCHIVE_HORIZON_DAYS saem de habit_records e de
+# habit_daily_totals e viram um segmento por hábito e ano em
+# habit_record_archive: um bitmap dos dias com registro (bit i = 1º de
+# janeiro + i) e as quantidades desses dias, em ordem, como int32.
+#
+# Cada (hábito, dia) fica em exatamente uma das camadas, então as leituras
+# (streaks, heatmaps, analytics, export, /sync) só somam as duas.
+# habit_period_totals continua com todos os períodos. Uma escrita num dia
+# arquivado primeiro devolve o ano inteiro à camada quente (thaw), porque os
+# totais da semana e do mês são recalculados a partir dos totais diários.
+# A próxima execução arquiva de novo.
+#
+# Arquivar não muda o que as rotas devolvem, então não entra no registro de
+# alterações nem invalida caches. id e created_at dos registros arquivados
+# não são guardados (nenhuma leitura os devolve).
+#
+#   python archive.py run [--horizon-days N] [--dry-run]   # ex.: diário, no cron
+#   python archive.py status
+#   python archive.py check [casos]   # codificação dos segmentos
+
+# Mínimo do horizonte: o ano corrente, o anterior e a janela padrão das
+# rotas (RECORDS_DEFAULT_WINDOW_DAYS, inclusive o snapshot do /sync) ficam
+# sempre na camada quente
+MIN_HORIZON_DAYS = 400
+# Partições anuais criadas à frente de hoje (só MySQL)
+PARTITION_YEARS_AHEAD = 2
+
+SEGMENT_COLUMNS = (
+    "habit_id",
+    "year",
+    "day_bitmap",
+    "quantities",
+    "record_count",
+    "first_date",
+    "last_date",
+)
+
+
+def _as_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def archive_cutoff(today, horizon_days):
+    # Primeiro dia que continua quente: só anos inteiros são arquivados
+    horizon_days = max(horizon_days, MIN_HORIZON_DAYS)
+    return datetime.date((today - datetime.timedelta(days=horizon_days)).year, 1, 1)
+
+
+def oldest_hot_year(today=None):
+    # Nenhum ano a partir deste pode estar arquivado
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=MIN_HORIZON_DAYS)).year
+
+
+def encode_segment(year, days):
+    # days: [(data, quantidade)] do mesmo ano -> (bitmap, quantidades)
+    first = datetime.date(year, 1, 1)
+    by_offset = {}
+    bits = 0
+    for day, quantity in days:
+        offset = (day - first).days
+        bits |= 1 << offset
+        by_offset[offset] = quantity
+    quantities = array.array("i", (by_offset[offset] for offset in sorted(by_offset)))
+    if sys.byteorder == "big":
+        quantities.byteswap()
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little"), quantities.tobytes()
+
+
+def decode_segment(year, bitmap, quantities):
+    # [(data, quantidade)] em ordem de data
+    values = array.array("i")
+    values.frombytes(bytes(quantities))
+    if sys.byteorder == "big":
+        values.byteswap()
+    first = datetime.date(year, 1, 1)
+    bits = int.from_bytes(bytes(bitmap), "little")
+    days = []
+    index = 0
+    while bits:
+        lowest = bits & -bits
+        days.append((first + datetime.timedelta(days=lowest.bit_length() - 1), values[index]))
+        index += 1
+        bits ^= lowest
+    return days
+
+
+def segment_days(segment, start=None, end=None):
+    # Dias de uma linha de habit_record_archive dentro de [start, end]
+    days = decode_segment(segment["year"], segment["day_bitmap"], segment["quantities"])
+    if start is not None or end is not None:
+        days = [
+            (day, quantity)
+            for day, quantity in days
+            if (start is None or day >= start) and (end is None or day <= end)
+        ]
+    return days
+
+
+def segments_query(habit_ids=None, start=None, end=None):
+    # Segmentos que cobrem [start, end], em ordem de (habit_id, year). Com
+    # habit_ids é uma faixa da chave primária; sem, usa o índice por ano.
+    where = []
+    params = []
+    if habit_ids is not None:
+        where.append(f"habit_id IN ({_placeholders(habit_ids)})")
+        params.extend(habit_ids)
+    if start is not None:
+        where.append("year >= %s")
+        params.append(start.year)
+    if end is not None:
+        where.append("year <= %s")
+        params.append(end.year)
+    query = "SELECT habit_id, year, day_bitmap, quantities FROM habit_record_archive"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return query + " ORDER BY habit_id, year", tuple(params)
+
+
+def days_by_habit(segments, start=None, end=None):
+    # {habit_id: [(data, quantidade)]} a partir das linhas de segments_query
+    by_habit = {}
+    for segment in segments:
+        by_habit.setdefault(segment["habit_id"], []).extend(segment_days(segment, start, end))
+    return by_habit
+
+
+def archived_days(cursor, habit_ids=None, start=None, end=None):
+    # Janelas só com anos quentes (o caso comum) não consultam o arquivo
+    if (habit_ids is not None and not habit_ids) or (
+        start is not None and start.year >= oldest_hot_year()
+    ):
+        return {}
+    cursor.execute(*segments_query(habit_ids, start, end))
+    return days_by_habit(cursor.fetchall(), start, end)
+
+
+def merge_rows(hot, archived):
+    # As camadas não se sobrepõem: basta intercalar as duas listas ordenadas
+    if not archived:
+        return hot
+    return list(heapq.merge(hot, archived, key=lambda row: row[0]))
+
+
+def archived_years_query(start, end):
+    return (
+        """
+        SELECT DISTINCT year FROM habit_record_archive
+        WHERE year >= %s AND year <= %s ORDER BY year
+        """,
+        (start.year, end.year),
+    )
+
+
+def archived_records(cursor, start, end, after=None, limit=None):
+    # [(record_date, habit_id, quantidade)] de todos os hábitos em [start, end],
+    # em ordem de (record_date, habit_id), depois da chave after e até limit.
+    # Lê um ano por vez a partir do ano de after, então as páginas seguintes
+    # não decodificam de novo os anos que já passaram.
+    if after is not None:
+        start = max(start, after[0])
+    end = min(end, datetime.date(oldest_hot_year() - 1, 12, 31))
+    if start > end:
+        return []
+    cursor.execute(*archived_years_query(start, end))
+    records = []
+    for row in cursor.fetchall():
+        year_start = max(start, datetime.date(row["year"], 1, 1))
+        year_end = min(end, datetime.date(row["year"], 12, 31))
+        cursor.execute(*segments_query(None, year_start, year_end))
+        year_records = sorted(
+            (day, habit_id, quantity)
+            for habit_id, days in days_by_habit(cursor.fetchall(), year_start, year_end).items()
+            for day, quantity in days
+        )
+        if after is not None:
+            year_records = [record for record in year_records if record[:2] > after]
+        records.extend(year_records)
+        if limit is not None and len(records) >= limit:
+            return records[:limit]
+    return records
+
+
+def records_for_keys(cursor, keys, chunk_size=500):
+    # {(habit_id, data): quantidade} dos pares que estão arquivados
+    hot_year = oldest_hot_year()
+    wanted = {
+        (habit_id, _as_date(day))
+        for habit_id, day in keys
+        if _as_date(day).year < hot_year
+    }
+    pairs = sorted({(habit_id, day.year) for habit_id, day in wanted})
+    found = {}
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start : start + chunk_size]
+        cursor.execute(
+            "SELECT habit_id, year, day_bitmap, quantities FROM habit_record_archive WHERE "
+            + dialect_of(cursor).row_in(("habit_id", "year"), len(chunk)),
+            tuple(value for pair in chunk for value in pair),
+        )
+        for segment in cursor.fetchall():
+            for day, quantity in segment_days(segment):
+                if (segment["habit_id"], day) in wanted:
+                    found[(segment["habit_id"], day)] = quantity
+    return found
+
+
+def iter_archived_records(cursor, fetch_size=1000):
+    # Todos os registros arquivados, um segmento por vez (export)
+    cursor.execute(*segments_query())
+    while True:
+        segments = cursor.fetchmany(fetch_size)
+        if not segments:
+            break
+        for segment in segments:
+            for day, quantity in segment_days(segment):
+                yield {
+                    "habit_id": segment["habit_id"],
+                    "record_date": day,
+                    "quantity_completed": quantity,
+                }
+
+
+def _restore(cursor, segments, chunk_size=1000):
+    # Devolve os segmentos à camada quente; linhas quentes já existentes
+    # (import com merge) prevalecem
+    if not segments:
+        return 0
+    dialect = dialect_of(cursor)
+    records = [
+        (segment["habit_id"], day, quantity)
+        for segment in segments
+        for day, quantity in segment_days(segment)
+    ]
+    insert_record = dialect.insert_ignore(
+        "habit_records", ("habit_id", "record_date", "quantity_completed")
+    )
+    insert_total = dialect.insert_ignore(
+        "habit_daily_totals", ("habit_id", "record_date", "total_quantity", "record_count")
+    )
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start : start + chunk_size]
+        cursor.executemany(insert_record, chunk)
+        cursor.executemany(insert_total, [(*record, 1) for record in chunk])
+    keys = [(segment["habit_id"], segment["year"]) for segment in segments]
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start : start + chunk_size]
+        cursor.execute(
+            "DELETE FROM habit_record_archive WHERE "
+            + dialect.row_in(("habit_id", "year"), len(chunk)),
+            tuple(value for key in chunk for value in key),
+        )
+    return len(records)
+
+
+def _years_touched(day):
+    # Anos cujos totais diários entram no recálculo da semana e do mês do dia
+    week_start = day - datetime.timedelta(days=day.weekday())
+    return {week_start.year, day.year, (week_start + datetime.timedelta(days=6)).year}
+
+
+def thaw(cursor, keys, chunk_size=500):
+    # Chamado pelas escritas antes de alterar os dias em keys
+    # ((habit_id, data)), na mesma transação
+    return thaw_years(
+        cursor,
+        {
+            (habit_id, year)
+            for habit_id, day in keys
+            for year in _years_touched(_as_date(day))
+        },
+        chunk_size,
+    )
+
+
+def thaw_years(cursor, pairs, chunk_size=500):
+    # Devolve à camada quente os segmentos dos (habit_id, ano) em pairs. Anos
+    # que não podem estar arquivados não consultam o arquivo.
+    hot_year = oldest_hot_year()
+    pairs = sorted((habit_id, year) for habit_id, year in pairs if year < hot_year)
+    dialect = dialect_of(cursor)
+    restored = 0
+    for start in range(0, len(pairs), chunk_size):
+        chunk = pairs[start : start + chunk_size]
+        # Leitura com lock: não corre em paralelo com archive_habit do mesmo ano
+        cursor.execute(
+            "SELECT habit_id, year, day_bitmap, quantities FROM habit_record_archive WHERE "
+            + dialect.row_in(("habit_id", "year"), len(chunk))
+            + dialect.for_update(),
+            tuple(value for pair in chunk for value in pair),
+        )
+        restored += _restore(cursor, cursor.fetchall())
+    return restored
+
+
+def archive_habit(cursor, habit_id, cutoff):
+    # Move os registros de habit_id anteriores a cutoff (1º de janeiro) para
+    # os segmentos anuais, juntando com o que o ano já tinha. Devolve quantos
+    # registros saíram da camada quente.
+    dialect = dialect_of(cursor)
+    # Arquivo primeiro e registros depois: a mesma ordem de locks de thaw
+    cursor.execute(
+        """
+        SELECT habit_id, year, day_bitmap, quantities FROM habit_record_archive
+        WHERE habit_id = %s AND year < %s
+        """
+        + dialect.for_update(),
+        (habit_id, cutoff.year),
+    )
+    days_by_year = {
+        segment["year"]: dict(segment_days(segment)) for segment in cursor.fetchall()
+    }
+    cursor.execute(
+        """
+        SELECT record_date, quantity_completed FROM habit_records
+        WHERE habit_id = %s AND record_date < %s
+        """
+        + dialect.for_update(),
+        (habit_id, cutoff),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+
+    touched = set()
+    for row in rows:
+        day = _as_date(row["record_date"])
+        days_by_year.setdefault(day.year, {})[day] = row["quantity_completed"]
+        touched.add(day.year)
+    segments = []
+    for year in sorted(touched):
+        days = sorted(days_by_year[year].items())
+        bitmap, quantities = encode_segment(year, days)
+        segments.append((habit_id, year, bitmap, quantities, len(days), days[0][0], days[-1][0]))
+    cursor.executemany(
+        dialect.upsert(
+            "habit_record_archive",
+            SEGMENT_COLUMNS,
+            ("habit_id", "year"),
+            {column: dialect.new(column) for column in SEGMENT_COLUMNS[2:]},
+        ),
+        segments,
+    )
+    cursor.execute(
+        "DELETE FROM habit_records WHERE habit_id = %s AND record_date < %s", (habit_id, cutoff)
+    )
+    cursor.execute(
+        "DELETE FROM habit_daily_totals WHERE habit_id = %s AND record_date < %s",
+        (habit_id, cutoff),
+    )
+    return len(rows)
+
+
+def _partition_names(cursor):
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME AS name, TABLE_ROWS AS estimated_rows
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'habit_records'
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """
+    )
+    return cursor.fetchall()
+
+
+def ensure_partitions(cursor, through_year):
+    # Cria as partições anuais que faltam até through_year dividindo
+    # p_future (vazia enquanto ninguém grava datas no futuro distante)
+    names = {row["name"] for row in _partition_names(cursor)}
+    if "p_future" not in names:
+        return []
+    years = [int(name[1:]) for name in names if re.fullmatch(r"p\d{4}", name)]
+    first = max(years) + 1 if years else datetime.date.today().year
+    created = list(range(first, through_year + 1))
+    if not created:
+        return []
+    partitions = ", ".join(
+        f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')" for year in created
+    )
+    cursor.execute(
+        "ALTER TABLE habit_records REORGANIZE PARTITION p_future INTO ("
+        + partitions
+        + ", PARTITION p_future VALUES LESS THAN (MAXVALUE))"
+    )
+    return [f"p{year}" for year in created]
+
+
+def run(connection, horizon_days, dry_run=False, report=None, today=None):
+    # Um hábito por transação, como as remoções em lote (bulk_import.py)
+    today = today or datetime.date.today()
+    cutoff = archive_cutoff(today, horizon_days)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT habit_id, COUNT(*) AS records FROM habit_records
+            WHERE record_date < %s GROUP BY habit_id ORDER BY habit_id
+            """,
+            (cutoff,),
+        )
+        pending = cursor.fetchall()
+        stats = {
+            "cutoff": cutoff.isoformat(),
+            "habits": len(pending),
+            "records": sum(row["records"] for row in pending),
+            "archived": 0,
+            "partitions_created": [],
+        }
+        if dry_run:
+            return stats
+        for row in pending:
+            try:
+                stats["archived"] += archive_habit(cursor, row["habit_id"], cutoff)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            if report:
+                report(stats)
+        if dialect_of(cursor).name == "mysql":
+            stats["partitions_created"] = ensure_partitions(
+                cursor, today.year + PARTITION_YEARS_AHEAD
+            )
+        return stats
+    finally:
+        cursor.close()
+
+
+def status(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT COUNT(*) AS records, MIN(record_date) AS oldest FROM habit_records"
+        )
+        hot = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS segments, COALESCE(SUM(record_count), 0) AS records,
+                   COALESCE(SUM(LENGTH(day_bitmap) + LENGTH(quantities)), 0) AS bytes,
+                   MIN(year) AS first_year, MAX(year) AS last_year
+            FROM habit_record_archive
+            """
+        )
+        archived = cursor.fetchone()
+        result = {
+            "hot_records": hot["records"],
+            "oldest_hot_date": str(hot["oldest"]) if hot["oldest"] is not None else None,
+            "archived_segments": archived["segments"],
+            "archived_records": int(archived["records"]),
+            "archived_bytes": int(archived["bytes"]),
+            "archived_years": [archived["first_year"], archived["last_year"]],
+        }
+        if dialect_of(cursor).name == "mysql":
+            result["partitions"] = {
+                row["name"]: row["estimated_rows"] for row in _partition_names(cursor)
+            }
+        return result
+    finally:
+        cursor.close()
+
+
+def check(cases=2000, seed=1):
+    # Ida e volta da codificação em anos aleatórios (bissextos, 31/12,
+    # quantidades zero e negativas) e o filtro por janela
+    import random
+
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        year = rng.randrange(1990, 2040)
+        first = datetime.date(year, 1, 1)
+        length = (datetime.date(year + 1, 1, 1) - first).days
+        density = rng.random()
+        days = [
+            (first + datetime.timedelta(days=offset), rng.randrange(-5, 10**6))
+            for offset in range(length)
+            if rng.random() < density
+        ]
+        shuffled = list(days)
+        rng.shuffle(shuffled)
+        bitmap, quantities = encode_segment(year, shuffled)
+        segment = {"year": year, "day_bitmap": bitmap, "quantities": quantities}
+        start = first + datetime.timedelta(days=rng.randrange(length))
+        end = start + datetime.timedelta(days=rng.randrange(400))
+        expected = {
+            "days": days,
+            "window": [(day, quantity) for day, quantity in days if start <= day <= end],
+        }
+        got = {"days": segment_days(segment), "window": segment_days(segment, start, end)}
+        if got != expected:
+            failures.append({"case": case, "year": year, "records": len(days)})
+    return failures
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="arquiva os anos além do horizonte")
+    run_parser.add_argument("--horizon-days", type=int)
+    run_parser.add_argument("--dry-run", action="store_true")
+    commands.add_parser("status", help="tamanho das camadas quente e arquivada")
+    check_parser = commands.add_parser("check", help="testa a codificação dos segmentos")
+    check_parser.add_argument("cases", type=int, nargs="?", default=2000)
+    args = parser.parse_args()
+
+    if args.command == "check":
+        failures = check(args.cases)
+        print(json.dumps(failures[:10], indent=2))
+        sys.exit(1 if failures else 0)
+
+    from app import app, db
+
+    with app.app_context():
+        if args.command == "run":
+            horizon_days = args.horizon_days or app.config["ARCHIVE_HORIZON_DAYS"]
+            print(json.dumps(run(db.connection, horizon_days, args.dry_run), indent=2))
+        else:
+            print(json.dumps(status(db.connection), indent=2, default=str))
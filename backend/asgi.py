@@ -0,0 +1,12 @@
+# Ponto de entrada ASGI da variante assíncrona (veja async_app.py).
+#
+#   cd backend
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+#
+# Cada worker é um processo com um pool do aiomysql para as rotas
+# assíncronas (até ASYNC_MYSQL_POOL_MAX_SIZE conexões) e o pool do app Flask
+# para as demais (até MYSQL_POOL_MAX_SIZE). O total de conexões no MySQL
+# fica em até workers * (ASYNC_MYSQL_POOL_MAX_SIZE + MYSQL_POOL_MAX_SIZE).
+from async_app import create_application
+
+application = create_application()
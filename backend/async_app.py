@@ -0,0 +1,517 @@
+import asyncio
+import datetime
+import os
+import traceback
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+from quart import Quart, Response, request
+from werkzeug.exceptions import HTTPException
+
+import archive
+import changes
+import habit_queries
+import store
+import streaks
+import streaming
+from app import _dump_compact, _export_habit, _export_record
+from app import app as flask_app
+from completion_index import entry_for
+from events import LAGGED, EventHub
+from pagination import next_page_headers, requested_page_size, wants_pagination
+
+# Variante assíncrona da API (ASGI, veja asgi.py). As rotas de leitura que
+# mais esperam pelo banco rodam em Quart sobre um pool do aiomysql, e as
+# consultas independentes de uma mesma requisição saem ao mesmo tempo, cada
+# uma na sua conexão (asyncio.gather). Enquanto esperam, as requisições não
+# seguram um thread: muitas requisições lentas dividem um processo. O mesmo
+# vale para as conexões abertas do GET /events (events.py).
+#
+# As demais rotas continuam no app Flask (app.py), chamado pelo mesmo
+# processo através do WSGIMiddleware (em um pool de threads do tamanho de
+# MYSQL_POOL_MAX_SIZE). O SQL e a formatação do GET /habits vêm de
+# habit_queries.py e o JSON é serializado pelo provedor do Flask, então as
+# duas variantes devolvem o mesmo corpo; loadtest.py --check-against confere.
+#
+# Diferenças em relação ao app síncrono:
+# - Só MySQL: com DATABASE_ENGINE=sqlite tudo vai para o app Flask, que não
+#   tem o /events.
+# - Sem cache de respostas nem Server-Timing nas rotas assíncronas.
+# - Consultas paralelas usam conexões diferentes (autocommit), então cada
+#   uma vê o banco no seu próprio instante, e não um retrato único.
+# - Com WRITE_BUFFER_ENABLED, GET /habits e /export_data ficam no Flask, que
+#   soma ou grava antes as pendências do buffer do processo.
+# - A streak de um hábito ainda sem estado persistido é calculada sem gravar;
+#   a próxima leitura pelo app síncrono grava o estado.
+
+app = Quart(__name__)
+app.config["ASYNC_MYSQL_POOL_MIN_SIZE"] = int(
+    os.environ.get("ASYNC_MYSQL_POOL_MIN_SIZE", "1")
+)
+app.config["ASYNC_MYSQL_POOL_MAX_SIZE"] = int(
+    os.environ.get("ASYNC_MYSQL_POOL_MAX_SIZE", "20")
+)
+# Notificações de mudanças (GET /events): intervalo de leitura do registro de
+# alterações, comentário de keep-alive, conexões por processo e eventos que
+# podem ficar na fila de um cliente lento antes de ele receber um reset
+app.config["EVENTS_POLL_MS"] = int(os.environ.get("EVENTS_POLL_MS", "500"))
+app.config["EVENTS_HEARTBEAT_SECONDS"] = float(
+    os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15")
+)
+app.config["EVENTS_MAX_SUBSCRIBERS"] = int(
+    os.environ.get("EVENTS_MAX_SUBSCRIBERS", "10000")
+)
+app.config["EVENTS_QUEUE_SIZE"] = int(os.environ.get("EVENTS_QUEUE_SIZE", "64"))
+# A exportação e o /events são transmitidos enquanto a conexão durar: sem
+# limite de duração
+app.config["RESPONSE_TIMEOUT"] = None
+
+pool = None
+
+
+def async_endpoints():
+    if flask_app.config["DATABASE_ENGINE"] != "mysql":
+        return set()
+    endpoints = {
+        "get_all_categories",
+        "get_habits",
+        "export_data",
+        "get_events",
+        "get_event_stats",
+    }
+    if flask_app.config["WRITE_BUFFER_ENABLED"]:
+        endpoints -= {"get_habits", "export_data"}
+    return endpoints
+
+
+ASYNC_ENDPOINTS = async_endpoints()
+
+
+@app.before_serving
+async def open_pool():
+    global pool
+    if not ASYNC_ENDPOINTS:
+        return
+    config = flask_app.config
+    pool = await aiomysql.create_pool(
+        host=config["MYSQL_HOST"],
+        port=config.get("MYSQL_PORT", 3306),
+        user=config["MYSQL_USER"],
+        password=config["MYSQL_PASSWORD"] or "",
+        db=config["MYSQL_DB"],
+        charset=config.get("MYSQL_CHARSET", "utf8"),
+        minsize=app.config["ASYNC_MYSQL_POOL_MIN_SIZE"],
+        maxsize=app.config["ASYNC_MYSQL_POOL_MAX_SIZE"],
+        pool_recycle=config["MYSQL_POOL_RECYCLE"],
+        cursorclass=aiomysql.DictCursor,
+        autocommit=True,
+    )
+
+
+@app.after_serving
+async def close_pool():
+    await event_hub.close()
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+
+
+async def fetchall(query, params=()):
+    async with pool.acquire() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+
+
+def json_response(value, status=200, headers=None):
+    # Mesmo serializador, ordem de chaves e separadores do jsonify do Flask
+    return Response(
+        _dump_compact(value) + "\n",
+        status=status,
+        mimetype="application/json",
+        headers=headers,
+    )
+
+
+@app.route("/categories", methods=["GET"])
+async def get_all_categories():
+    try:
+        categories = await fetchall("SELECT id, name FROM categories ORDER BY name ASC")
+        return json_response(categories)
+    except Exception as e:
+        traceback.print_exc()
+        return json_response(
+            {"error": "Erro interno ao buscar categorias", "details": str(e)}, 500
+        )
+
+
+async def _streak_entries(habits):
+    # Hábitos sem estado persistido: streak a partir dos totais diários
+    if not habits:
+        return {}
+    habit_ids = [habit["id"] for habit in habits]
+    rows = await fetchall(
+        "SELECT habit_id, record_date, total_quantity FROM habit_daily_totals "
+        f"WHERE habit_id IN ({', '.join(['%s'] * len(habit_ids))})",
+        tuple(habit_ids),
+    )
+    rows_by_habit = {habit_id: [] for habit_id in habit_ids}
+    for row in rows:
+        rows_by_habit[row["habit_id"]].append((row["record_date"], row["total_quantity"]))
+    # Anos arquivados (archive.py)
+    segments = await fetchall(*archive.segments_query(habit_ids))
+    for habit_id, days in archive.days_by_habit(segments).items():
+        rows_by_habit[habit_id].extend(days)
+    return {habit["id"]: entry_for(habit, rows_by_habit[habit["id"]]) for habit in habits}
+
+
+async def _complete_habits(habits, today):
+    # Categorias, último dia e streaks, como nos itens do GET /habits
+    habit_ids = [habit["id"] for habit in habits]
+    if not habit_ids:
+        return habits
+    # As três consultas dependem só dos ids
+    category_rows, last_completed_rows, state_rows = await asyncio.gather(
+        fetchall(*habit_queries.categories_query(habit_ids)),
+        fetchall(*habit_queries.last_completed_query(habit_ids)),
+        fetchall(*streaks.states_query(habit_ids)),
+    )
+    categories_by_habit = habit_queries.categories_by_habit(habit_ids, category_rows)
+    last_completed_by_habit = {
+        row["habit_id"]: row["last_completed_date"] for row in last_completed_rows
+    }
+    streak_states = {row["habit_id"]: row for row in state_rows}
+    entries = await _streak_entries(
+        [habit for habit in habits if habit["id"] not in streak_states]
+    )
+
+    for habit in habits:
+        state = streak_states.get(habit["id"])
+        if state is not None:
+            current_streak = streaks.current_streak_from_state(state, today)
+            longest_streak = state["longest_streak"]
+        else:
+            entry = entries[habit["id"]]
+            current_streak = entry.current_streak(today)
+            longest_streak = entry.longest_streak()
+        habit_queries.format_habit(
+            habit,
+            categories_by_habit[habit["id"]],
+            last_completed_by_habit.get(habit["id"]),
+            current_streak,
+            longest_streak,
+        )
+    return habits
+
+
+@app.route("/habits", methods=["GET"])
+async def get_habits():
+    try:
+        today = datetime.date.today()
+        page_size = None
+        if wants_pagination(request.args):
+            page_size = requested_page_size(
+                flask_app.config["HABITS_PAGE_SIZE_DEFAULT"],
+                flask_app.config["HABITS_PAGE_SIZE_MAX"],
+                request.args,
+            )
+        page_token = request.args.get("page_token")
+        page_after = None
+        page_offset = 0
+        if page_token:
+            try:
+                page_after = habit_queries.parse_page_token(page_token)
+            except ValueError as e:
+                return json_response({"error": str(e)}, 400)
+        elif page_size is not None:
+            page_offset = (max(request.args.get("page", 1, type=int), 1) - 1) * page_size
+
+        habits_results, next_token = habit_queries.split_page(
+            await fetchall(
+                *habit_queries.habits_query(
+                    today,
+                    page_size,
+                    category_id=request.args.get("category_id", type=int),
+                    after=page_after,
+                    offset=page_offset,
+                )
+            ),
+            page_size,
+        )
+        await _complete_habits(habits_results, today)
+
+        headers = next_page_headers(next_token, request.args, request.base_url)
+        return json_response(habits_results, headers=headers)
+    except Exception as e:
+        traceback.print_exc()
+        return json_response({"error": str(e)}, 500)
+
+
+async def _iter_export_records():
+    # Cursor do lado do servidor, como no app síncrono
+    async with pool.acquire() as connection:
+        async with connection.cursor(aiomysql.SSDictCursor) as cursor:
+            await cursor.execute(
+                "SELECT habit_id, record_date, quantity_completed FROM habit_records"
+            )
+            while True:
+                rows = await cursor.fetchmany(flask_app.config["EXPORT_FETCH_SIZE"])
+                if not rows:
+                    break
+                for rec in rows:
+                    yield _export_record(rec)
+            # Depois, os anos arquivados, um segmento por vez
+            await cursor.execute(*archive.segments_query())
+            while True:
+                segments = await cursor.fetchmany(flask_app.config["EXPORT_FETCH_SIZE"])
+                if not segments:
+                    break
+                for segment in segments:
+                    for day, quantity in archive.segment_days(segment):
+                        yield _export_record(
+                            {
+                                "habit_id": segment["habit_id"],
+                                "record_date": day,
+                                "quantity_completed": quantity,
+                            }
+                        )
+
+
+async def _json_array(items):
+    index = 0
+    async for item in items:
+        yield ("," if index else "") + _dump_compact(item)
+        index += 1
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+async def _generate_export_json(categories_export, habits_export):
+    yield '{"categories":['
+    async for part in _json_array(_iterate(categories_export)):
+        yield part
+    yield '],"habit_records":['
+    async for part in _json_array(_iter_export_records()):
+        yield part
+    yield '],"habits":['
+    async for part in _json_array(_iterate(habits_export)):
+        yield part
+    yield "]}\n"
+
+
+async def _generate_export_ndjson(categories_export, habits_export):
+    for section, items in (
+        ("categories", _iterate(categories_export)),
+        ("habits", _iterate(habits_export)),
+        ("habit_records", _iter_export_records()),
+    ):
+        async for item in items:
+            yield _dump_compact({"section": section, "data": item}) + "\n"
+
+
+async def _streamed_body(chunks, encoding):
+    # Blocos de ~STREAM_BUFFER_BYTES, comprimidos como em streamed_response
+    compress, finish = streaming.compressor(encoding) if encoding else (None, None)
+    pending = []
+    size = 0
+    async for chunk in chunks:
+        chunk = chunk.encode("utf-8")
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= streaming.STREAM_BUFFER_BYTES:
+            block = b"".join(pending)
+            pending = []
+            size = 0
+            if compress is not None:
+                block = compress(block)
+            if block:
+                yield block
+    block = b"".join(pending)
+    if compress is not None:
+        block = compress(block) + finish()
+    if block:
+        yield block
+
+
+@app.route("/export_data", methods=["GET"])
+async def export_data():
+    try:
+        export_format = request.args.get("format", "json")
+        if export_format not in ("json", "ndjson"):
+            return json_response(
+                {"error": f"Formato de exportação inválido: {export_format}"}, 400
+            )
+
+        # Mesmas consultas (e ordens) do export síncrono (store.py)
+        categories_raw, habit_categories, habits_raw = await asyncio.gather(
+            fetchall(*store.categories_query()),
+            fetchall(*store.category_ids_query()),
+            fetchall(*store.habit_fields_query()),
+        )
+        categories_export = [
+            {"id_json": cat["id"], "name": cat["name"]} for cat in categories_raw
+        ]
+        category_ids_by_habit = store.group_category_ids(habit_categories)
+        habits_export = [
+            _export_habit(habit_raw, category_ids_by_habit.get(habit_raw["id"], []))
+            for habit_raw in habits_raw
+        ]
+
+        compress = request.args.get("gzip", type=int)
+        if compress is not None:
+            compress = bool(compress)
+        encoding = streaming.choose_encoding(
+            compress, request.headers.get("Accept-Encoding", "")
+        )
+        if export_format == "ndjson":
+            chunks = _generate_export_ndjson(categories_export, habits_export)
+            mimetype = "application/x-ndjson"
+        else:
+            chunks = _generate_export_json(categories_export, habits_export)
+            mimetype = "application/json"
+        return Response(
+            _streamed_body(chunks, encoding),
+            mimetype=mimetype,
+            headers=streaming.encoding_headers(encoding),
+        )
+
+    except Exception as e:
+        traceback.print_exc()
+        return json_response({"error": "Erro ao exportar dados", "details": str(e)}, 500)
+
+
+async def change_event(since, until):
+    # Mudanças entre duas versões do registro de alterações, com os hábitos
+    # afetados no formato dos itens do GET /habits (streak e totais do
+    # período já atualizados)
+    oldest_rows, change_rows = await asyncio.gather(
+        fetchall(changes.OLDEST_VERSION_SQL),
+        fetchall(changes.CHANGES_BETWEEN_SQL, (since, until)),
+    )
+    if not changes.log_covers(since, oldest_rows[0]["version"]):
+        return {"version": until, "reset": True}
+    delta = changes.reduce_changes(change_rows)
+    if delta["reset"]:
+        return {"version": until, "reset": True}
+
+    deleted_habit_ids = sorted(
+        habit_id for habit_id, op in delta["habits"].items() if op == changes.DELETE
+    )
+    records = [
+        {"habit_id": habit_id, "record_date": record_date.isoformat(), "op": op}
+        for (habit_id, record_date), op in sorted(delta["records"].items())
+        if habit_id not in deleted_habit_ids
+    ]
+    changed_ids = sorted(
+        {habit_id for habit_id in delta["habits"] if habit_id not in deleted_habit_ids}
+        | {record["habit_id"] for record in records}
+    )
+    habits = []
+    if changed_ids:
+        today = datetime.date.today()
+        habits = await _complete_habits(
+            await fetchall(*habit_queries.habits_by_id_query(today, changed_ids)), today
+        )
+    return {
+        "version": until,
+        "reset": False,
+        "habits": habits,
+        "deleted_habit_ids": deleted_habit_ids,
+        "records": records,
+    }
+
+
+async def poll_changes(since):
+    rows = await fetchall(changes.CURRENT_VERSION_SQL)
+    version = rows[0]["version"] if rows else 0
+    if since is None or version <= since:
+        return version, None
+    return version, await change_event(since, version)
+
+
+event_hub = EventHub(
+    poll_changes,
+    interval=app.config["EVENTS_POLL_MS"] / 1000.0,
+    max_subscribers=app.config["EVENTS_MAX_SUBSCRIBERS"],
+    queue_size=app.config["EVENTS_QUEUE_SIZE"],
+)
+
+
+def _sse(event, version, payload):
+    return f"id: {version}\nevent: {event}\ndata: {_dump_compact(payload)}\n\n"
+
+
+@app.route("/events", methods=["GET"])
+async def get_events():
+    # Server-sent events: "ready" com a versão atual na conexão e "changes" a
+    # cada commit que passa pelo registro de alterações (reset: true pede ao
+    # cliente que busque tudo de novo). Na reconexão o EventSource manda o
+    # Last-Event-ID (ou o cliente passa ?since=) e recebe o que perdeu.
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    try:
+        subscriber = await event_hub.subscribe()
+    except Exception as e:
+        traceback.print_exc()
+        return json_response({"error": str(e)}, 500)
+    if subscriber is None:
+        return json_response({"error": "Limite de conexões de eventos atingido."}, 503)
+
+    async def stream():
+        try:
+            if since is not None and since < subscriber.since:
+                event = await change_event(since, subscriber.since)
+                yield _sse("changes", subscriber.since, event)
+            else:
+                yield _sse("ready", subscriber.since, {"version": subscriber.since})
+            while True:
+                item = await subscriber.next(app.config["EVENTS_HEARTBEAT_SECONDS"])
+                if item is None:
+                    # Mantém proxies e balanceadores sem fechar a conexão ociosa
+                    yield ": ping\n\n"
+                elif item is LAGGED:
+                    reset = {"version": event_hub.version, "reset": True}
+                    yield _sse("changes", event_hub.version, reset)
+                else:
+                    version, event = item
+                    yield _sse("changes", version, event)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/events/stats", methods=["GET"])
+async def get_event_stats():
+    return json_response(event_hub.stats())
+
+
+def _served_async(scope):
+    adapter = app.url_map.bind("")
+    try:
+        endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+    except HTTPException:
+        return False
+    return endpoint in ASYNC_ENDPOINTS
+
+
+def create_application():
+    # Rotas assíncronas no Quart; o resto (e os métodos que o Quart não
+    # atende) no app Flask. O lifespan vai para o Quart, que abre o pool.
+    fallback = WSGIMiddleware(flask_app, workers=flask_app.config["MYSQL_POOL_MAX_SIZE"])
+
+    async def application(scope, receive, send):
+        if scope["type"] == "http" and not _served_async(scope):
+            await fallback(scope, receive, send)
+        else:
+            await app(scope, receive, send)
+
+    return application
@@ -0,0 +1,725 @@
+# Benchmarks reproduzíveis das rotas principais e de calculate_streak, sobre
+# dados sintéticos gerados a partir de uma semente fixa.
+#
+#   python benchmark.py seed --habits 200 --years 3       # (re)cria os dados
+#   python benchmark.py run --output bench.json           # mede as rotas
+#   python benchmark.py scaling --habits 50,200,1000 --years 1,3
+#
+# ATENÇÃO: seed e scaling apagam todos os dados de MYSQL_DB. Por padrão o
+# banco é habit_tracker_bench (criado se não existir); qualquer servidor
+# compatível com MySQL (ex.: MariaDB em um container) serve. Com
+# DATABASE_ENGINE=sqlite os dados vão para SQLITE_PATH (padrão
+# habit_tracker_bench.db). O cache de respostas fica desligado para medir o
+# trabalho real de cada rota.
+#
+# bench_analytics também confere o resultado de analytics.summarize (NumPy)
+# contra uma versão em Python puro antes de medir as duas, e
+# bench_write_buffer confere que os toques gravados com o buffer de escrita
+# somam o mesmo que os síncronos.
+#
+# A saída é JSON com o commit atual, os parâmetros dos dados e, por
+# benchmark, latências em ms e o número de comandos SQL por requisição
+# (lido do cabeçalho Server-Timing), para comparar execuções entre commits.
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("MYSQL_DB", "habit_tracker_bench")
+os.environ.setdefault("SQLITE_PATH", "habit_tracker_bench.db")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+
+import MySQLdb  # noqa: E402
+import numpy as np  # noqa: E402
+
+import analytics  # noqa: E402
+import migrate  # noqa: E402
+import rollups  # noqa: E402
+import streaks  # noqa: E402
+from app import app, write_buffer  # noqa: E402
+from repository import dialect_of  # noqa: E402
+
+ENGINE = app.config["DATABASE_ENGINE"]
+
+COMPLETION_METHODS = (("boolean", 0.5), ("quantity", 0.3), ("minutes", 0.2))
+COUNT_METHODS = (("daily", 0.6), ("weekly", 0.3), ("monthly", 0.1))
+INSERT_BATCH_SIZE = 5000
+
+_SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def _weighted_choice(rng, choices):
+    value = rng.random()
+    for choice, weight in choices:
+        value -= weight
+        if value < 0:
+            return choice
+    return choices[-1][0]
+
+
+def _ensure_database():
+    if ENGINE == "sqlite":
+        # O arquivo é criado na primeira conexão
+        connection = migrate.connect(ENGINE)
+        migrate.upgrade(connection, engine=ENGINE)
+        return connection
+    connection = MySQLdb.connect(
+        host=os.environ.get("MYSQL_HOST", "localhost"),
+        user=os.environ.get("MYSQL_USER", "root"),
+        passwd=os.environ.get("MYSQL_PASSWORD", "admin"),
+        charset="utf8mb4",
+    )
+    try:
+        connection.cursor().execute(
+            f"CREATE DATABASE IF NOT EXISTS `{os.environ['MYSQL_DB']}`"
+        )
+    finally:
+        connection.close()
+    connection = migrate.connect()
+    migrate.upgrade(connection)
+    return connection
+
+
+def generate_dataset(habit_count, years, category_count, seed):
+    # Mistura de hábitos booleanos, por quantidade e por minutos, cada um com
+    # uma taxa de adesão própria ao longo do histórico
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    history_days = int(years * 365)
+    first_day = today - datetime.timedelta(days=history_days - 1)
+
+    categories = [(i, f"Categoria {i}") for i in range(1, category_count + 1)]
+    habits = []
+    habit_categories = []
+    records = []
+    for habit_id in range(1, habit_count + 1):
+        completion_method = _weighted_choice(rng, COMPLETION_METHODS)
+        if completion_method == "quantity":
+            target = rng.randint(1, 10)
+        elif completion_method == "minutes":
+            target = rng.choice((10, 15, 20, 30, 45, 60))
+        else:
+            target = None
+        habits.append(
+            (
+                habit_id,
+                f"Hábito {habit_id}",
+                None,
+                _weighted_choice(rng, COUNT_METHODS),
+                completion_method,
+                target,
+                rng.randint(1, 7),
+                datetime.datetime.combine(first_day, datetime.time(8))
+                + datetime.timedelta(minutes=habit_id),
+            )
+        )
+        if categories:
+            picked = rng.sample(categories, min(len(categories), rng.randint(1, 2)))
+            for category_id, _ in picked:
+                habit_categories.append((habit_id, category_id))
+
+        adherence = rng.uniform(0.3, 0.9)
+        for offset in range(history_days):
+            if rng.random() >= adherence:
+                continue
+            if target is None:
+                quantity = 1
+            else:
+                quantity = rng.randint(max(1, target // 2), target * 2)
+            records.append((habit_id, first_day + datetime.timedelta(days=offset), quantity))
+
+    return {
+        "categories": categories,
+        "habits": habits,
+        "habit_categories": habit_categories,
+        "habit_records": records,
+    }
+
+
+def seed_database(connection, habit_count, years, category_count, seed):
+    started = time.perf_counter()
+    dataset = generate_dataset(habit_count, years, category_count, seed)
+    cursor = connection.cursor()
+    dialect = dialect_of(cursor)
+    dialect.set_foreign_key_checks(cursor, False)
+    for table in (
+        "habit_records",
+        "habit_record_archive",
+        "habit_daily_totals",
+        "habit_period_totals",
+        "habit_streaks",
+        "habit_categories",
+        "habits",
+        "categories",
+    ):
+        cursor.execute(f"DELETE FROM {table}")
+    statements = {
+        "categories": "INSERT INTO categories (id, name) VALUES (%s, %s)",
+        "habits": """INSERT INTO habits (id, name, description, count_method, completion_method,
+                                         target_quantity, target_days_per_week, created_at)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+        "habit_categories": "INSERT INTO habit_categories (habit_id, category_id) VALUES (%s, %s)",
+        "habit_records": """INSERT INTO habit_records (habit_id, record_date, quantity_completed)
+                            VALUES (%s, %s, %s)""",
+    }
+    for table, statement in statements.items():
+        rows = dataset[table]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            cursor.executemany(statement, rows[start : start + INSERT_BATCH_SIZE])
+    rollups.rebuild(cursor)
+    streaks.rebuild_all(cursor)
+    connection.commit()
+    dialect.set_foreign_key_checks(cursor, True)
+    cursor.close()
+    return {
+        "habits": habit_count,
+        "years": years,
+        "categories": category_count,
+        "seed": seed,
+        "records": len(dataset["habit_records"]),
+        "seed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _summary(name, samples, extra=None):
+    samples = sorted(samples)
+    result = {
+        "name": name,
+        "repeat": len(samples),
+        "min_ms": round(samples[0] * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)] * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "per_second": round(len(samples) / sum(samples), 1) if sum(samples) else None,
+    }
+    result.update(extra or {})
+    return result
+
+
+def bench_route(client, name, method, url, repeat, warmup=1, body=None, content_type=None):
+    def call():
+        response = client.open(url, method=method, data=body, content_type=content_type)
+        payload = response.get_data()  # Consome respostas em streaming
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name}: HTTP {response.status_code} {payload[:200]!r}")
+        return response, payload
+
+    for _ in range(warmup):
+        call()
+    samples = []
+    queries = []
+    db_ms = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response, payload = call()
+        samples.append(time.perf_counter() - started)
+        size = len(payload)
+        match = _SERVER_TIMING_RE.search(response.headers.get("Server-Timing", ""))
+        if match:
+            db_ms.append(float(match.group(1)))
+            queries.append(int(match.group(2)))
+    extra = {"response_bytes": size}
+    if queries:
+        extra["queries_per_request"] = max(queries)
+        extra["db_median_ms"] = round(statistics.median(db_ms), 3)
+    return _summary(name, samples, extra)
+
+
+def bench_calculate_streak(years, repeat):
+    # calculate_streak isolado, sobre datas em memória: histórico completo
+    # com uma sequência de 30 dias terminando hoje
+    rng = random.Random(0)
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=offset) for offset in range(30)]
+    dates += [
+        today - datetime.timedelta(days=offset)
+        for offset in range(31, int(years * 365))
+        if rng.random() < 0.6
+    ]
+    rng.shuffle(dates)
+    as_strings = [d.isoformat() for d in dates]
+    results = []
+    for label, values in (("date", dates), ("str", as_strings)):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            streaks.calculate_streak(values)
+            samples.append(time.perf_counter() - started)
+        results.append(
+            _summary(f"calculate_streak[{label}]", samples, {"dates": len(values)})
+        )
+    return results
+
+
+def python_summary(habit, quantities_by_date, start_date, end_date):
+    # Equivalente em Python puro de analytics.summarize (só os campos
+    # principais), no estilo de calculate_streak: um laço por dia
+    uses_target = streaks.uses_target(habit)
+    day_count = (end_date - start_date).days + 1
+    quantities = []
+    done = []
+    for offset in range(day_count):
+        day = start_date + datetime.timedelta(days=offset)
+        quantity = quantities_by_date.get(day)
+        quantities.append(quantity or 0)
+        if quantity is None:
+            done.append(False)
+        else:
+            done.append(quantity >= habit["target_quantity"] if uses_target else True)
+
+    longest_streak = 0
+    run = 0
+    for is_done in done:
+        run = run + 1 if is_done else 0
+        longest_streak = max(longest_streak, run)
+    current_streak = streaks.calculate_streak(
+        [start_date + datetime.timedelta(days=i) for i, is_done in enumerate(done) if is_done]
+    )
+
+    target_days = habit.get("target_days_per_week") or 7
+    weeks = {}
+    for offset, is_done in enumerate(done):
+        week = (offset + start_date.weekday()) // 7
+        days, completed = weeks.get(week, (0, 0))
+        weeks[week] = (days + 1, completed + is_done)
+    full_weeks = [completed for days, completed in weeks.values() if days == 7]
+    weekly_rate = (
+        round(sum(min(c / target_days, 1.0) for c in full_weeks) / len(full_weeks), 4)
+        if full_weeks
+        else None
+    )
+
+    rolling = {}
+    for window in analytics.ROLLING_WINDOWS:
+        best = None
+        for end in range(window, day_count + 1):
+            average = sum(quantities[end - window : end]) / window
+            best = average if best is None else max(best, average)
+        rolling[str(window)] = round(best, 4) if best is not None else None
+
+    weekday_days = [0] * 7
+    for offset, is_done in enumerate(done):
+        if is_done:
+            weekday_days[(offset + start_date.weekday()) % 7] += 1
+    return {
+        "longest_streak": longest_streak,
+        "current_streak": current_streak,
+        "weekly_completion_rate": weekly_rate,
+        "rolling_max": rolling,
+        "weekday_days_completed": weekday_days,
+    }
+
+
+def _same(expected, actual):
+    # Médias podem diferir no último dígito pela ordem das somas
+    if isinstance(expected, float) and isinstance(actual, float):
+        return abs(expected - actual) <= 1e-3
+    return expected == actual
+
+
+def bench_analytics(years, repeat):
+    # analytics.summarize (NumPy) contra python_summary sobre o mesmo
+    # histórico; os campos em comum precisam bater
+    rng = random.Random(0)
+    end_date = datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=int(years * 365) - 1)
+    habit = {
+        "id": 1,
+        "completion_method": "quantity",
+        "target_quantity": 5,
+        "target_days_per_week": 5,
+    }
+    quantities_by_date = {}
+    for offset in range((end_date - start_date).days + 1):
+        if rng.random() < 0.7:
+            quantities_by_date[start_date + datetime.timedelta(days=offset)] = rng.randint(1, 10)
+    offsets = np.array(
+        [(day - start_date).days for day in sorted(quantities_by_date)], dtype=np.int64
+    )
+    totals = np.array(
+        [quantities_by_date[day] for day in sorted(quantities_by_date)], dtype=np.int64
+    )
+
+    vectorized = analytics.summarize(habit, offsets, totals, start_date, end_date)
+    reference = python_summary(habit, quantities_by_date, start_date, end_date)
+    mismatches = {
+        field: (expected, actual)
+        for field, expected, actual in (
+            ("longest_streak", reference["longest_streak"], vectorized["longest_streak"]),
+            ("current_streak", reference["current_streak"], vectorized["current_streak"]),
+            (
+                "weekly_completion_rate",
+                reference["weekly_completion_rate"],
+                vectorized["weekly"]["completion_rate"],
+            ),
+            (
+                "weekday_days_completed",
+                reference["weekday_days_completed"],
+                vectorized["weekday_distribution"]["days_completed"],
+            ),
+            *(
+                (
+                    f"rolling_max[{window}]",
+                    reference["rolling_max"][str(window)],
+                    vectorized["rolling_average"][str(window)]["max"],
+                )
+                for window in analytics.ROLLING_WINDOWS
+            ),
+        )
+        if not _same(expected, actual)
+    }
+    if mismatches:
+        raise RuntimeError(f"analytics difere da referência em Python: {mismatches}")
+
+    results = []
+    for name, run in (
+        (
+            "analytics.summarize[numpy]",
+            lambda: analytics.summarize(habit, offsets, totals, start_date, end_date),
+        ),
+        (
+            "analytics.summarize[python]",
+            lambda: python_summary(habit, quantities_by_date, start_date, end_date),
+        ),
+    ):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - started)
+        results.append(_summary(name, samples, {"days": len(quantities_by_date)}))
+    return results
+
+
+def bench_record_batch(client, habit_ids, years, repeat, batch_size=140):
+    # Uma semana de check-ins de 20 hábitos: batch_size POSTs individuais
+    # contra um único POST /habit_records/batch com as mesmas operações
+    rng = random.Random(2)
+    today = datetime.date.today()
+    history_days = int(years * 365)
+    results = []
+    single_samples = []
+    batch_samples = []
+    for _ in range(max(1, repeat // 5)):
+        operations = [
+            {
+                "habit_id": rng.choice(habit_ids[:20]),
+                "record_date": (
+                    today - datetime.timedelta(days=rng.randrange(history_days))
+                ).isoformat(),
+                "quantity_completed": 1,
+            }
+            for _ in range(batch_size)
+        ]
+        started = time.perf_counter()
+        for operation in operations:
+            response = client.post("/habit_records", json=operation)
+            if response.status_code >= 400:
+                raise RuntimeError(f"POST /habit_records: HTTP {response.status_code}")
+        single_samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        response = client.post("/habit_records/batch", json={"operations": operations})
+        batch_samples.append(time.perf_counter() - started)
+        if response.status_code >= 400 or response.get_json()["failed"]:
+            raise RuntimeError(f"POST /habit_records/batch: {response.get_data()[:200]!r}")
+    extra = {"operations": batch_size}
+    results.append(_summary("POST /habit_records x N", single_samples, extra))
+    results.append(_summary("POST /habit_records/batch", batch_samples, extra))
+    return results
+
+
+def _today_quantity(connection, habit_id):
+    connection.commit()  # Nova leitura, fora do snapshot anterior
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT quantity_completed FROM habit_records WHERE habit_id = %s AND record_date = %s",
+        (habit_id, datetime.date.today()),
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return row["quantity_completed"] if row else 0
+
+
+def bench_write_buffer(client, connection, habit_ids, repeat, taps=200):
+    # Toques seguidos em um hábito de quantidade: um commit por toque contra
+    # o buffer de escrita (write_buffer.py), incluindo o flush final
+    cursor = connection.cursor()
+    cursor.execute(
+        f"""
+        SELECT id FROM habits
+        WHERE completion_method <> 'boolean' AND id IN ({', '.join(['%s'] * len(habit_ids))})
+        ORDER BY id LIMIT 1
+        """,
+        tuple(habit_ids),
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return []
+    payload = json.dumps(
+        {
+            "habit_id": row["id"],
+            "record_date": datetime.date.today().isoformat(),
+            "quantity_completed": 1,
+        }
+    )
+    previous = write_buffer.enabled
+    results = []
+    try:
+        for enabled in (False, True):
+            write_buffer.enabled = enabled
+            samples = []
+            for _ in range(max(1, repeat // 5)):
+                before = _today_quantity(connection, row["id"])
+                started = time.perf_counter()
+                for _ in range(taps):
+                    response = client.post(
+                        "/habit_records", data=payload, content_type="application/json"
+                    )
+                    if response.status_code >= 400:
+                        raise RuntimeError(f"POST /habit_records: HTTP {response.status_code}")
+                with app.app_context():
+                    write_buffer.flush()
+                samples.append(time.perf_counter() - started)
+                written = _today_quantity(connection, row["id"]) - before
+                if written != taps:
+                    raise RuntimeError(
+                        f"Buffer de escrita: {written} de {taps} toques gravados"
+                    )
+            name = "POST /habit_records x N [write_buffer]" if enabled else "POST /habit_records x N"
+            results.append(
+                _summary(
+                    name,
+                    samples,
+                    {
+                        "taps": taps,
+                        "taps_per_second": round(taps / statistics.median(samples), 1),
+                    },
+                )
+            )
+    finally:
+        write_buffer.enabled = previous
+    return results
+
+
+def run_benchmarks(connection, repeat, years):
+    cursor = connection.cursor()
+    cursor.execute("SELECT MIN(id) AS id FROM categories")
+    category_id = cursor.fetchone()["id"]
+    cursor.execute("SELECT id FROM habits ORDER BY id LIMIT 50")
+    habit_ids = [row["id"] for row in cursor.fetchall()]
+    cursor.close()
+    if not habit_ids:
+        raise SystemExit("Banco vazio: rode 'python benchmark.py seed' antes.")
+
+    today = datetime.date.today()
+    year_ago = (today - datetime.timedelta(days=365)).isoformat()
+    habit_csv = ",".join(str(habit_id) for habit_id in habit_ids)
+    client = app.test_client()
+
+    results = [
+        bench_route(client, "GET /habits", "GET", "/habits", repeat),
+        bench_route(
+            client,
+            "GET /habits?category_id",
+            "GET",
+            f"/habits?category_id={category_id}",
+            repeat,
+        ),
+        bench_route(
+            client,
+            "GET /habits/<id>/records",
+            "GET",
+            f"/habits/{habit_ids[0]}/records?start_date={year_ago}",
+            repeat,
+        ),
+        bench_route(
+            client,
+            "GET /habit_records/batch",
+            "GET",
+            f"/habit_records/batch?habit_ids={habit_csv}&start_date={year_ago}",
+            repeat,
+        ),
+        bench_route(
+            client,
+            "GET /all_habit_records",
+            "GET",
+            f"/all_habit_records?start_date={year_ago}",
+            repeat,
+        ),
+    ]
+
+    # Escritas: cada repetição soma 1 em um dia diferente do passado; a
+    # primeira chamada serve de aquecimento
+    rng = random.Random(1)
+    history_days = int(years * 365)
+    samples = []
+    for i in range(repeat + 1):
+        payload = json.dumps(
+            {
+                "habit_id": rng.choice(habit_ids),
+                "record_date": (today - datetime.timedelta(days=i % history_days)).isoformat(),
+                "quantity_completed": 1,
+            }
+        )
+        started = time.perf_counter()
+        response = client.post("/habit_records", data=payload, content_type="application/json")
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"POST /habit_records: HTTP {response.status_code}")
+    results.append(_summary("POST /habit_records", samples[1:]))
+    results.extend(bench_record_batch(client, habit_ids, years, repeat))
+    results.extend(bench_write_buffer(client, connection, habit_ids, repeat))
+
+    export_repeat = max(1, repeat // 5)
+    results.append(bench_route(client, "GET /export_data", "GET", "/export_data", export_repeat))
+    exported = client.get("/export_data").get_data()
+    results.append(
+        bench_route(
+            client,
+            "POST /import_data?strategy=replace",
+            "POST",
+            "/import_data?strategy=replace",
+            export_repeat,
+            body=exported,
+            content_type="application/json",
+        )
+    )
+    results.append(
+        bench_route(
+            client,
+            "POST /import_data?strategy=merge",
+            "POST",
+            "/import_data?strategy=merge",
+            export_repeat,
+            body=exported,
+            content_type="application/json",
+        )
+    )
+    results.append(
+        bench_route(
+            client,
+            "GET /analytics",
+            "GET",
+            f"/analytics?start_date={year_ago}",
+            repeat,
+        )
+    )
+    results.append(
+        bench_route(
+            client,
+            "GET /analytics?habit_ids",
+            "GET",
+            f"/analytics?habit_ids={habit_csv}&start_date={year_ago}",
+            repeat,
+        )
+    )
+    results.extend(bench_calculate_streak(years, repeat * 10))
+    results.extend(bench_analytics(years, repeat))
+    return results
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engine": ENGINE,
+        "database": os.environ["SQLITE_PATH" if ENGINE == "sqlite" else "MYSQL_DB"],
+    }
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _float_list(value):
+    return [float(item) for item in value.split(",") if item]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks do backend")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed")
+    seed_parser.add_argument("--habits", type=int, default=200)
+    seed_parser.add_argument("--years", type=float, default=3)
+    seed_parser.add_argument("--categories", type=int, default=10)
+    seed_parser.add_argument("--seed", type=int, default=42)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--repeat", type=int, default=20)
+    run_parser.add_argument("--years", type=float, default=3)
+    run_parser.add_argument("--output")
+
+    scaling_parser = subparsers.add_parser("scaling")
+    scaling_parser.add_argument("--habits", type=_int_list, default=[50, 200, 1000])
+    scaling_parser.add_argument("--years", type=_float_list, default=[1, 3])
+    scaling_parser.add_argument("--categories", type=int, default=10)
+    scaling_parser.add_argument("--seed", type=int, default=42)
+    scaling_parser.add_argument("--repeat", type=int, default=10)
+    scaling_parser.add_argument("--output")
+
+    args = parser.parse_args(argv[1:])
+    connection = _ensure_database()
+    try:
+        if args.command == "seed":
+            report = {
+                "environment": _environment(),
+                "dataset": seed_database(
+                    connection, args.habits, args.years, args.categories, args.seed
+                ),
+            }
+        elif args.command == "run":
+            report = {
+                "environment": _environment(),
+                "results": run_benchmarks(connection, args.repeat, args.years),
+            }
+        else:
+            # Uma execução completa por combinação de hábitos x anos de histórico
+            points = []
+            for years in args.years:
+                for habit_count in args.habits:
+                    dataset = seed_database(
+                        connection, habit_count, years, args.categories, args.seed
+                    )
+                    points.append(
+                        {
+                            "dataset": dataset,
+                            "results": run_benchmarks(connection, args.repeat, years),
+                        }
+                    )
+            report = {"environment": _environment(), "scaling": points}
+    finally:
+        connection.close()
+
+    output = json.dumps(report, indent=2, default=str)
+    if getattr(args, "output", None):
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,435 @@
+import codecs
+import datetime
+import json
+import time
+import zlib
+
+import archive
+import changes
+import rollups
+from repository import dialect_of
+
+READ_CHUNK_BYTES = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _StreamReader:
+    # Lê o corpo da requisição em blocos, decodificando UTF-8 (e gzip, se
+    # necessário) sem carregar o documento inteiro na memória.
+    def __init__(self, stream, gzip_encoded=False):
+        self.stream = stream
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.inflater = zlib.decompressobj(31) if gzip_encoded else None
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            self.eof = True
+            tail = self.inflater.flush() if self.inflater else b""
+            self.buffer += self.text_decoder.decode(tail, final=True)
+            return bool(tail)
+        if self.inflater:
+            chunk = self.inflater.decompress(chunk)
+        if self.pos > READ_CHUNK_BYTES:
+            # Descarta o que já foi consumido para o buffer não crescer
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        self.buffer += self.text_decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON inválido: esperado '{char}' na posição {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+            # Um número no fim do buffer pode estar incompleto
+            if end == len(self.buffer) and not self.eof and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+    def lines(self):
+        while True:
+            newline = self.buffer.find("\n", self.pos)
+            if newline >= 0:
+                line = self.buffer[self.pos : newline]
+                self.pos = newline + 1
+                yield line
+            elif not self.read_more():
+                if self.pos < len(self.buffer):
+                    yield self.buffer[self.pos :]
+                    self.pos = len(self.buffer)
+                return
+
+
+def iter_json_sections(stream, gzip_encoded=False):
+    # Percorre o objeto {"categories": [...], "habits": [...], ...} e emite
+    # (seção, item) à medida que cada elemento das listas é lido.
+    reader = _StreamReader(stream, gzip_encoded)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        section = reader.value()
+        reader.expect(":")
+        if reader.peek() == "[":
+            reader.pos += 1
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield section, reader.value()
+                    if reader.peek() == ",":
+                        reader.pos += 1
+                        continue
+                    reader.expect("]")
+                    break
+        else:
+            reader.value()  # Valores que não são listas são ignorados
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
+
+
+def iter_ndjson_sections(stream, gzip_encoded=False):
+    # Formato gerado por /export_data?format=ndjson
+    reader = _StreamReader(stream, gzip_encoded)
+    for line in reader.lines():
+        if line.strip():
+            entry = json.loads(line)
+            yield entry["section"], entry["data"]
+
+
+def parse_created_at(value):
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:  # Tentar apenas parsing de data se datetime falhar, ou deixar null
+        try:
+            return datetime.datetime.combine(
+                datetime.date.fromisoformat(value), datetime.time.min
+            )
+        except ValueError:
+            return None
+
+
+def parse_record_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return None  # Registros com data inválida são ignorados
+
+
+TABLE_COLUMNS = {
+    "categories": ("id", "name"),
+    "habits": (
+        "id",
+        "name",
+        "description",
+        "count_method",
+        "completion_method",
+        "target_quantity",
+        "target_days_per_week",
+        "created_at",
+    ),
+    "habit_categories": ("habit_id", "category_id"),
+    "habit_records": ("habit_id", "record_date", "quantity_completed"),
+}
+
+IMPORT_STRATEGIES = ("replace", "merge")
+
+
+class ReplaceTooLarge(Exception):
+    pass
+
+
+# Ordem de remoção segura para as FKs (filhos antes dos pais) e a primeira
+# coluna da chave primária de cada tabela, usada para cortá-la em faixas
+PURGE_ORDER = (
+    ("habit_records", "id"),
+    ("habit_record_archive", "habit_id"),
+    ("habit_daily_totals", "habit_id"),
+    ("habit_period_totals", "habit_id"),
+    ("habit_streaks", "habit_id"),
+    ("habit_categories", "habit_id"),
+    ("habits", "id"),
+    ("categories", "id"),
+)
+
+
+def insert_statements(dialect, strategy):
+    # replace insere direto em tabelas vazias; merge faz upsert pela chave
+    if strategy == "replace":
+        return {
+            table: f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+            for table, columns in TABLE_COLUMNS.items()
+        }
+    habit_updates = TABLE_COLUMNS["habits"][1:-1]
+    return {
+        "categories": dialect.upsert(
+            "categories", TABLE_COLUMNS["categories"], ("id",), {"name": dialect.new("name")}
+        ),
+        "habits": dialect.upsert(
+            "habits",
+            TABLE_COLUMNS["habits"],
+            ("id",),
+            {column: dialect.new(column) for column in habit_updates},
+        ),
+        "habit_categories": dialect.insert_ignore(
+            "habit_categories", TABLE_COLUMNS["habit_categories"]
+        ),
+        "habit_records": dialect.upsert(
+            "habit_records",
+            TABLE_COLUMNS["habit_records"],
+            ("habit_id", "record_date"),
+            {"quantity_completed": dialect.new("quantity_completed")},
+        ),
+    }
+
+
+def _rows_for(section, item):
+    # Converte um item do arquivo em linhas (tabela, parâmetros). Os IDs do
+    # arquivo são preservados, então registros podem chegar antes dos hábitos.
+    if section == "categories":
+        return [("categories", (item["id_json"], item["name"]))]
+    if section == "habits":
+        rows = [
+            (
+                "habits",
+                (
+                    item["id_json"],
+                    item["name"],
+                    item.get("description"),
+                    item["count_method"],
+                    item["completion_method"],
+                    item.get("target_quantity"),
+                    item.get("target_days_per_week"),
+                    # created_at é NOT NULL no esquema
+                    parse_created_at(item.get("created_at")) or datetime.datetime.now(),
+                ),
+            )
+        ]
+        for json_category_id in item.get("category_ids_json", []):
+            rows.append(("habit_categories", (item["id_json"], json_category_id)))
+        return rows
+    if section == "habit_records":
+        record_date = parse_record_date(item.get("record_date"))
+        if record_date is None:
+            return []
+        return [
+            (
+                "habit_records",
+                (
+                    item["habit_id_json"],
+                    record_date,
+                    item.get("quantity_completed", 1),  # Default para 1 se for booleano
+                ),
+            )
+        ]
+    return []
+
+
+def delete_all_rows(connection, batch_size=1000, report=None, commit=True, max_rows=None):
+    # Apaga as tabelas de dados em lotes de ~batch_size linhas, cada um na
+    # sua transação: os locks e o undo log ficam limitados ao lote, e as
+    # outras requisições continuam sendo atendidas entre eles. Tabelas com
+    # chave composta podem apagar um pouco mais que batch_size por vez (todas
+    # as linhas do último hábito da faixa). Com commit=False nada disso vale:
+    # os lotes ficam todos na transação de quem chamou (o import replace),
+    # que max_rows limita.
+    cursor = connection.cursor()
+    deleted = {table: 0 for table, _ in PURGE_ORDER}
+    try:
+        for table, column in PURGE_ORDER:
+            while True:
+                cursor.execute(
+                    f"SELECT {column} AS bound FROM {table} ORDER BY {column} LIMIT 1 OFFSET %s",
+                    (batch_size - 1,),
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    deleted[table] += cursor.execute(f"DELETE FROM {table}")
+                else:
+                    deleted[table] += cursor.execute(
+                        f"DELETE FROM {table} WHERE {column} <= %s", (row["bound"],)
+                    )
+                if report:
+                    report({"phase": "delete", "table": table, "deleted": deleted})
+                if max_rows is not None and sum(deleted.values()) > max_rows:
+                    raise ReplaceTooLarge(
+                        f"A base atual passa de {max_rows} linhas; use strategy=merge"
+                    )
+                if commit:
+                    connection.commit()
+                if row is None:
+                    break
+    finally:
+        cursor.close()
+    return deleted
+
+
+def run_import(
+    connection,
+    items,
+    strategy="replace",
+    batch_size=1000,
+    logger=None,
+    report=None,
+    max_replace_rows=None,
+):
+    # O replace não é em lotes: apagar a base e carregar o arquivo é uma
+    # transação só, e o undo log e os locks crescem com o tamanho dos dados.
+    # max_replace_rows limita essa transação (linhas apagadas + inseridas,
+    # sem contar os totais recalculados); acima disso ela é desfeita com
+    # ReplaceTooLarge. O merge confirma cada lote de batch_size linhas.
+    if strategy not in IMPORT_STRATEGIES:
+        raise ValueError(f"Estratégia de importação inválida: {strategy}")
+    cursor = connection.cursor()
+    dialect = dialect_of(cursor)
+    statements = insert_statements(dialect, strategy)
+    started = time.perf_counter()
+    counts = {table: 0 for table in statements}
+    pending = {table: [] for table in statements}
+    touched_habit_ids = set()
+    touched_years = set()
+    deleted = {}
+
+    def flush(table):
+        rows = pending[table]
+        if not rows:
+            return
+        if strategy == "replace" and max_replace_rows is not None:
+            if sum(deleted.values()) + sum(counts.values()) + len(rows) > max_replace_rows:
+                raise ReplaceTooLarge(
+                    f"O replace passa de {max_replace_rows} linhas; use strategy=merge"
+                )
+        cursor.executemany(statements[table], rows)
+        counts[table] += len(rows)
+        pending[table] = []
+        if report:
+            report({"phase": "insert", "counts": counts})
+        # No merge cada lote é confirmado para liberar os locks cedo (uma
+        # falha no meio mantém o que já foi mesclado). O replace é uma
+        # transação só: ou a base inteira é trocada, ou nada muda.
+        if strategy == "merge":
+            connection.commit()
+        if logger:
+            total = sum(counts.values())
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "import_data: %d linhas (%s), %.0f linhas/s",
+                total,
+                table,
+                total / elapsed if elapsed else 0,
+            )
+
+    try:
+        # As checagens de FK ficam desligadas durante a carga porque a ordem
+        # do arquivo (ordem alfabética do export) traz registros antes dos
+        # hábitos; órfãos são removidos no final.
+        dialect.set_foreign_key_checks(cursor, False)
+        if strategy == "replace":
+            deleted = delete_all_rows(
+                connection, batch_size, report, commit=False, max_rows=max_replace_rows
+            )
+
+        for section, item in items:
+            for table, row in _rows_for(section, item):
+                pending[table].append(row)
+                if table == "habit_records":
+                    touched_habit_ids.add(row[0])
+                    touched_years.add((row[0], row[1].year))
+                if len(pending[table]) >= batch_size:
+                    flush(table)
+        for table in ("categories", "habits", "habit_categories", "habit_records"):
+            flush(table)
+
+        # Mesma regra do import antigo: relações e registros que apontam para
+        # hábitos ou categorias inexistentes são descartados
+        cursor.execute(
+            """DELETE FROM habit_records
+               WHERE NOT EXISTS (SELECT 1 FROM habits h WHERE h.id = habit_records.habit_id)"""
+        )
+        counts["habit_records"] -= cursor.rowcount
+        cursor.execute(
+            """DELETE FROM habit_categories
+               WHERE NOT EXISTS (SELECT 1 FROM habits h WHERE h.id = habit_categories.habit_id)
+                  OR NOT EXISTS (
+                      SELECT 1 FROM categories c WHERE c.id = habit_categories.category_id
+                  )"""
+        )
+        counts["habit_categories"] -= cursor.rowcount
+
+        # Anos arquivados que receberam registros voltam à camada quente
+        # (as linhas importadas prevalecem), para nenhum dia ficar nas duas
+        if strategy == "merge":
+            archive.thaw_years(cursor, touched_years, batch_size)
+
+        # Totais agregados: tudo de novo no replace, só os hábitos tocados no
+        # merge (rollups.rebuild soma os anos que continuam arquivados)
+        if strategy == "replace":
+            rollups.rebuild(cursor)
+        elif touched_habit_ids:
+            rollups.rebuild(cursor, touched_habit_ids, batch_size)
+
+        if strategy == "merge" and touched_habit_ids:
+            # Streaks dos hábitos alterados são recalculadas na próxima leitura
+            touched = sorted(touched_habit_ids)
+            for start in range(0, len(touched), batch_size):
+                chunk = touched[start : start + batch_size]
+                cursor.execute(
+                    "DELETE FROM habit_streaks WHERE habit_id IN ("
+                    + ", ".join(["%s"] * len(chunk))
+                    + ")",
+                    tuple(chunk),
+                )
+        # Clientes do /sync recebem uma troca completa dos dados
+        changes.log(cursor, [changes.reset_change(f"import_{strategy}")])
+        connection.commit()
+        dialect.set_foreign_key_checks(cursor, True)
+    except Exception:
+        connection.rollback()
+        dialect.set_foreign_key_checks(cursor, True)
+        raise
+    finally:
+        cursor.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        "strategy": strategy,
+        "counts": counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed else None,
+    }
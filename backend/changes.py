@@ -0,0 +1,123 @@
+# Registro de alterações usado pelo GET /sync (tabelas da migração 0004).
+#
+# Toda rota que escreve chama log() antes do commit, com as entidades que
+# mudaram. Cada transação recebe uma versão nova de change_clock; o cliente
+# guarda a versão devolvida pelo /sync e na próxima chamada recebe só o que
+# mudou depois dela. Remoções aparecem como tombstones (op "delete"), e
+# trocas completas dos dados (import_data, delete_all_data) como "reset".
+#
+#   python changes.py prune [dias]   # apaga entradas mais antigas (padrão: 90)
+from repository import dialect_of
+
+UPSERT = "upsert"
+DELETE = "delete"
+RESET = "reset"
+
+INSERT_SQL = """
+    INSERT INTO change_log (version, entity, op, entity_id, record_date)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+def habit_change(habit_id, op=UPSERT):
+    return ("habit", op, habit_id, None)
+
+
+def record_change(habit_id, record_date, op=UPSERT):
+    return ("record", op, habit_id, record_date)
+
+
+def reset_change(reason):
+    return (RESET, reason, None, None)
+
+
+def log(cursor, entries):
+    # O UPDATE bloqueia a linha do relógio até o commit: transações que
+    # escrevem recebem versões na ordem em que confirmam
+    if not entries:
+        return None
+    version = dialect_of(cursor).next_version(cursor, "change_clock")
+    cursor.executemany(INSERT_SQL, [(version, *entry) for entry in entries])
+    return version
+
+
+# As consultas ficam separadas da execução para o async_app.py (aiomysql)
+CURRENT_VERSION_SQL = "SELECT version FROM change_clock WHERE id = 1"
+OLDEST_VERSION_SQL = "SELECT MIN(version) AS version FROM change_log"
+CHANGES_BETWEEN_SQL = """
+    SELECT entity, op, entity_id, record_date FROM change_log
+    WHERE version > %s AND version <= %s
+    ORDER BY version, id
+"""
+
+
+def current_version(cursor):
+    cursor.execute(CURRENT_VERSION_SQL)
+    row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+def oldest_version(cursor):
+    cursor.execute(OLDEST_VERSION_SQL)
+    return cursor.fetchone()["version"]
+
+
+def log_covers(since, oldest):
+    # O log ainda tem tudo o que mudou depois de since?
+    return oldest is None or since >= oldest - 1
+
+
+def changes_between(cursor, since, until):
+    cursor.execute(CHANGES_BETWEEN_SQL, (since, until))
+    return reduce_changes(cursor.fetchall())
+
+
+def reduce_changes(rows):
+    # Reduz o log ao último estado de cada entidade
+    delta = {"reset": False, "habits": {}, "records": {}}
+    for row in rows:
+        if row["entity"] == RESET:
+            delta["reset"] = True
+        elif row["entity"] == "habit":
+            delta["habits"][row["entity_id"]] = row["op"]
+        elif row["entity"] == "record":
+            delta["records"][(row["entity_id"], row["record_date"])] = row["op"]
+    return delta
+
+
+def prune(cursor, keep_days):
+    # Apaga versões inteiras, e nunca a mais recente: o /sync usa a menor
+    # versão restante para saber até onde o log ainda está completo
+    cursor.execute(
+        f"""
+        SELECT MAX(version) AS version FROM change_log
+        WHERE changed_at < {dialect_of(cursor).days_ago("%s")}
+        """,
+        (keep_days,),
+    )
+    cutoff = cursor.fetchone()["version"]
+    cursor.execute("SELECT MAX(version) AS version FROM change_log")
+    newest = cursor.fetchone()["version"]
+    if cutoff is None or newest is None:
+        return 0
+    cursor.execute(
+        "DELETE FROM change_log WHERE version <= %s", (min(cutoff, newest - 1),)
+    )
+    return cursor.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app import app, db
+
+    if len(sys.argv) < 2 or sys.argv[1] != "prune":
+        print("Uso: python changes.py prune [dias]")
+        sys.exit(2)
+    keep_days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    with app.app_context():
+        cursor = db.connection.cursor()
+        removed = prune(cursor, keep_days)
+        db.connection.commit()
+        cursor.close()
+    print(f"{removed} entradas removidas.")
@@ -0,0 +1,313 @@
+import collections
+import datetime
+import threading
+
+import archive
+import changes
+import streaks
+from repository import dialect_of
+
+# Índice em memória dos dias que qualificam de cada hábito, como um bitmap
+# (int do Python): o bit i é o dia base + i. Streak atual, maior streak e "feito
+# hoje" saem de operações sobre o inteiro inteiro (em C, palavra a palavra),
+# sem listas de datas.
+#
+# As entradas são montadas sob demanda a partir de habit_daily_totals. Antes
+# de cada leitura, sync() aplica o que o registro de alterações (changes.py)
+# trouxe desde a última versão vista pelo processo: registros alterados viram
+# bits ligados/desligados, hábitos alterados e resets descartam entradas.
+# Assim o índice de cada worker acompanha as escritas de todos os outros.
+#
+#   python completion_index.py check [casos]   # compara com calculate_streak
+
+EPOCH = datetime.date(2000, 1, 1)
+
+
+def day_number(day):
+    return (day - EPOCH).days
+
+
+def longest_run(bits):
+    # levels[i]: posições onde termina uma sequência de pelo menos 2**i dias.
+    # Sobe dobrando o tamanho e desce somando as potências que ainda cabem.
+    if not bits:
+        return 0
+    levels = [bits]
+    while True:
+        step = 1 << (len(levels) - 1)
+        longer = levels[-1] & (levels[-1] << step)
+        if not longer:
+            break
+        levels.append(longer)
+    length = 1 << (len(levels) - 1)
+    ends = levels[-1]
+    for level in range(len(levels) - 2, -1, -1):
+        candidate = ends & (levels[level] << length)
+        if candidate:
+            ends = candidate
+            length += 1 << level
+    return length
+
+
+class Entry:
+    __slots__ = ("base", "bits", "target")
+
+    def __init__(self, target=None):
+        self.base = 0
+        self.bits = 0
+        # None: qualquer registro conta; senão o total do dia precisa chegar ao alvo
+        self.target = target
+
+    def qualifies(self, total_quantity):
+        return self.target is None or total_quantity >= self.target
+
+    def set_day(self, day, completed):
+        position = day_number(day)
+        if not self.bits:
+            if completed:
+                self.base, self.bits = position, 1
+            return
+        if position < self.base:
+            if not completed:
+                return
+            self.bits <<= self.base - position
+            self.base = position
+        offset = position - self.base
+        if completed:
+            self.bits |= 1 << offset
+        else:
+            self.bits &= ~(1 << offset)
+
+    def completed_on(self, day):
+        offset = day_number(day) - self.base
+        return offset >= 0 and bool(self.bits >> offset & 1)
+
+    def current_streak(self, today):
+        # Mesma regra de calculate_streak: a sequência termina hoje ou ontem,
+        # e um dia cumprido depois de hoje zera a streak
+        end = day_number(today) - self.base
+        if self.bits.bit_length() > end + 1:
+            return 0
+        if end < 0 or not self.bits >> end & 1:
+            end -= 1
+            if end < 0 or not self.bits >> end & 1:
+                return 0
+        # Zeros até o fim da sequência; o mais alto marca onde ela começa
+        gaps = ~self.bits & ((1 << (end + 1)) - 1)
+        return end + 1 - gaps.bit_length()
+
+    def longest_streak(self):
+        return longest_run(self.bits)
+
+
+def entry_for(habit, rows):
+    # rows: (record_date, total_quantity) de habit_daily_totals
+    entry = Entry(habit["target_quantity"] if streaks.uses_target(habit) else None)
+    days = [day_number(day) for day, total in rows if entry.qualifies(total)]
+    if days:
+        entry.base = min(days)
+        bits = 0
+        for day in days:
+            bits |= 1 << (day - entry.base)
+        entry.bits = bits
+    return entry
+
+
+class CompletionIndex:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_habits = 100000
+        self.entries = collections.OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPLETION_INDEX_ENABLED", True)
+        app.config.setdefault("COMPLETION_INDEX_MAX_HABITS", 100000)
+        self.enabled = app.config["COMPLETION_INDEX_ENABLED"]
+        self.max_habits = app.config["COMPLETION_INDEX_MAX_HABITS"]
+
+    def sync(self, cursor):
+        # Devolve a versão do registro de alterações que a transação atual
+        # enxerga, já aplicada ao índice
+        current = changes.current_version(cursor)
+        with self.lock:
+            since = self.version
+        if since is None or current <= since:
+            with self.lock:
+                if self.version is None:
+                    self.version = current
+            return current
+
+        oldest = changes.oldest_version(cursor)
+        if oldest is None or oldest > since + 1:
+            # O log foi podado além do que o índice viu: recomeça do zero
+            delta = {"reset": True, "habits": {}, "records": {}}
+        else:
+            delta = changes.changes_between(cursor, since, current)
+        record_days = {}
+        if not delta["reset"]:
+            with self.lock:
+                for habit_id, record_date in delta["records"]:
+                    if habit_id in self.entries and habit_id not in delta["habits"]:
+                        record_days.setdefault(habit_id, set()).add(record_date)
+        totals = self._load_totals(cursor, record_days)
+
+        with self.lock:
+            if self.version != since:
+                # Outro thread aplicou o mesmo trecho antes
+                return current
+            if delta["reset"]:
+                self.entries.clear()
+                self.counters["resets"] += 1
+            else:
+                for habit_id in delta["habits"]:
+                    self.entries.pop(habit_id, None)
+                for habit_id, _ in delta["records"]:
+                    if habit_id not in record_days:
+                        # Montada por outro thread depois da leitura acima
+                        self.entries.pop(habit_id, None)
+                for habit_id, days in record_days.items():
+                    entry = self.entries.get(habit_id)
+                    if entry is None:
+                        continue
+                    for day in days:
+                        total = totals.get((habit_id, day))
+                        entry.set_day(day, total is not None and entry.qualifies(total))
+            self.version = current
+            self.counters["synced_versions"] += current - since
+        return current
+
+    def _load_totals(self, cursor, record_days, chunk_size=500):
+        keys = sorted((habit_id, day) for habit_id, days in record_days.items() for day in days)
+        totals = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start : start + chunk_size]
+            cursor.execute(
+                "SELECT habit_id, record_date, total_quantity FROM habit_daily_totals WHERE "
+                + dialect_of(cursor).row_in(("habit_id", "record_date"), len(chunk)),
+                tuple(value for key in chunk for value in key),
+            )
+            for row in cursor.fetchall():
+                totals[(row["habit_id"], row["record_date"])] = row["total_quantity"]
+        return totals
+
+    def get_many(self, cursor, habits, version):
+        # {habit_id: Entry}; monta numa consulta só as entradas que faltam.
+        # version é o valor devolvido por sync() nesta mesma transação.
+        found = {}
+        missing = []
+        with self.lock:
+            for habit in habits:
+                entry = self.entries.get(habit["id"])
+                if entry is None:
+                    missing.append(habit)
+                else:
+                    self.entries.move_to_end(habit["id"])
+                    found[habit["id"]] = entry
+            self.counters["hits"] += len(found)
+            self.counters["misses"] += len(missing)
+        if not missing:
+            return found
+
+        missing_ids = [habit["id"] for habit in missing]
+        cursor.execute(
+            f"""
+            SELECT habit_id, record_date, total_quantity FROM habit_daily_totals
+            WHERE habit_id IN ({', '.join(['%s'] * len(missing_ids))})
+            """,
+            tuple(missing_ids),
+        )
+        rows = {habit_id: [] for habit_id in missing_ids}
+        for row in cursor.fetchall():
+            rows[row["habit_id"]].append((row["record_date"], row["total_quantity"]))
+        # Anos arquivados: um registro por dia, a quantidade é o total
+        for habit_id, days in archive.archived_days(cursor, missing_ids).items():
+            rows[habit_id].extend(days)
+        built = {habit["id"]: entry_for(habit, rows[habit["id"]]) for habit in missing}
+        found.update(built)
+
+        with self.lock:
+            # Só guarda o que foi lido na versão que o índice tem agora
+            if self.version == version:
+                self.entries.update(built)
+                while len(self.entries) > self.max_habits:
+                    self.entries.popitem(last=False)
+        return found
+
+    def stats(self):
+        with self.lock:
+            entries = list(self.entries.values())
+            return {
+                "enabled": self.enabled,
+                "habits": len(entries),
+                "bitmap_bytes": sum((entry.bits.bit_length() + 7) // 8 for entry in entries),
+                "version": self.version,
+                **self.counters,
+            }
+
+
+def check(cases=2000, seed=1):
+    # Propriedades contra as implementações de referência (streaks.py), em
+    # históricos aleatórios que podem ter dias depois de hoje: streak atual
+    # (calculate_streak e o estado persistido), maior streak e bits
+    # ligados/desligados fora de ordem
+    import random
+
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        # calculate_streak usa a data do sistema
+        today = datetime.date.today()
+        span = rng.randrange(1, 400)
+        density = rng.random()
+        dates = sorted(
+            {
+                today - datetime.timedelta(days=offset)
+                for offset in range(-3, span)
+                if rng.random() < density
+            }
+        )
+        entry = Entry()
+        shuffled = list(dates)
+        rng.shuffle(shuffled)
+        for day in shuffled:
+            entry.set_day(day, True)
+        # Liga e desliga dias extras: o resultado não pode mudar
+        for _ in range(rng.randrange(5)):
+            extra = today - datetime.timedelta(days=rng.randrange(span + 30))
+            if extra not in dates:
+                entry.set_day(extra, True)
+                entry.set_day(extra, False)
+
+        state = streaks.state_from_dates(0, dates)
+        expected = {
+            "current": streaks.calculate_streak(dates),
+            "current_from_state": streaks.calculate_streak(dates),
+            "longest": state["longest_streak"],
+            "today": today in dates,
+        }
+        got = {
+            "current": entry.current_streak(today),
+            "current_from_state": streaks.current_streak_from_state(state, today),
+            "longest": entry.longest_streak(),
+            "today": entry.completed_on(today),
+        }
+        if got != expected:
+            failures.append({"case": case, "today": today.isoformat(), "expected": expected, "got": got})
+    return failures
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "check":
+        print("Uso: python completion_index.py check [casos]")
+        sys.exit(2)
+    failures = check(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+    print(json.dumps(failures[:10], indent=2))
+    sys.exit(1 if failures else 0)
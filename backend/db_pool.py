@@ -0,0 +1,282 @@
+import collections
+import os
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    # Pool de conexões MySQL seguro para threads. Mantém min_size conexões
+    # abertas, cresce até max_size e faz quem chegar depois esperar até
+    # wait_timeout segundos por uma conexão livre.
+    def __init__(
+        self,
+        connect_kwargs,
+        min_size=1,
+        max_size=10,
+        wait_timeout=5.0,
+        recycle_seconds=3600,
+        health_check_interval=30.0,
+    ):
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.recycle_seconds = recycle_seconds
+        self.health_check_interval = health_check_interval
+        self.idle = collections.deque()  # (conexão, criada_em, usada_em)
+        self.in_use = {}  # id(conexão) -> criada_em
+        self.condition = threading.Condition()
+        self.counters = collections.Counter()
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        for _ in range(min_size):
+            self.idle.append(self._connect())
+
+    def _connect(self):
+        connection = MySQLdb.connect(**self.connect_kwargs)
+        self.counters["created"] += 1
+        now = time.monotonic()
+        return connection, now, now
+
+    def _close(self, connection):
+        self.counters["discarded"] += 1
+        try:
+            connection.close()
+        except MySQLdb.Error:
+            pass
+
+    def _healthy(self, connection, last_used):
+        # Conexões paradas há algum tempo podem ter caído (wait_timeout do
+        # servidor); um ping barato evita entregar uma conexão morta
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            connection.ping()
+            return True
+        except MySQLdb.Error:
+            self.counters["failed_health_checks"] += 1
+            return False
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.wait_timeout
+        with self.condition:
+            while True:
+                while self.idle:
+                    connection, created_at, last_used = self.idle.pop()
+                    if self._healthy(connection, last_used):
+                        self.in_use[id(connection)] = created_at
+                        self._record_wait(started)
+                        return connection
+                    self._close(connection)
+                if len(self.in_use) < self.max_size:
+                    # Reserva a vaga antes de conectar fora do lock
+                    placeholder = object()
+                    self.in_use[id(placeholder)] = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Nenhuma conexão livre após {self.wait_timeout:.1f}s "
+                        f"({self.max_size} em uso)"
+                    )
+                self.counters["waits"] += 1
+                self.condition.wait(remaining)
+
+        try:
+            connection, created_at, _ = self._connect()
+        except Exception:
+            with self.condition:
+                del self.in_use[id(placeholder)]
+                self.condition.notify()
+            raise
+        with self.condition:
+            del self.in_use[id(placeholder)]
+            self.in_use[id(connection)] = created_at
+            self._record_wait(started)
+        return connection
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        self.counters["acquired"] += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def release(self, connection, discard=False):
+        # Devolve False se a conexão falhou na checagem da devolução
+        healthy = True
+        if not discard:
+            # Encerra qualquer transação aberta (inclusive de leituras). O
+            # ROLLBACK vai até o servidor, então também serve de checagem: a
+            # conexão que não responde (caiu, ficou com resultado pendente de
+            # um cursor não lido até o fim) não volta para o pool, seja qual
+            # for o erro que a requisição teve.
+            try:
+                connection.rollback()
+            except MySQLdb.Error:
+                healthy = False
+        with self.condition:
+            created_at = self.in_use.pop(id(connection), None)
+            expired = (
+                created_at is None
+                or time.monotonic() - created_at > self.recycle_seconds
+            )
+            if discard or not healthy or expired:
+                self._close(connection)
+                if discard:
+                    self.counters["recycled_on_error"] += 1
+                elif not healthy:
+                    self.counters["failed_release_checks"] += 1
+            else:
+                self.idle.append((connection, created_at, time.monotonic()))
+            self.condition.notify()
+        return healthy
+
+    def stats(self):
+        with self.condition:
+            acquired = self.counters["acquired"]
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": len(self.in_use),
+                "idle": len(self.idle),
+                "acquired": acquired,
+                "created": self.counters["created"],
+                "discarded": self.counters["discarded"],
+                "recycled_on_error": self.counters["recycled_on_error"],
+                "failed_health_checks": self.counters["failed_health_checks"],
+                "failed_release_checks": self.counters["failed_release_checks"],
+                "waits": self.counters["waits"],
+                "timeouts": self.counters["timeouts"],
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / acquired, 6)
+                if acquired
+                else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class CursorWrappingConnection:
+    # Repassa tudo à conexão real, mas entrega cursores envolvidos pelo
+    # cursor_wrapper (ex.: instrumentação de consultas)
+    def __init__(self, connection, cursor_wrapper):
+        self._connection = connection
+        self._cursor_wrapper = cursor_wrapper
+
+    def cursor(self, *args, **kwargs):
+        return self._cursor_wrapper(self._connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class PooledMySQL:
+    # Substitui o Flask-MySQLdb mantendo a mesma interface: mysql.connection
+    # devolve a conexão da requisição atual, emprestada do pool e devolvida
+    # no fim do contexto da aplicação.
+    def __init__(self, app=None, cursor_wrapper=None):
+        self.app = app
+        self.cursor_wrapper = cursor_wrapper
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("MYSQL_HOST", "localhost")
+        app.config.setdefault("MYSQL_USER", None)
+        app.config.setdefault("MYSQL_PASSWORD", None)
+        app.config.setdefault("MYSQL_DB", None)
+        app.config.setdefault("MYSQL_PORT", 3306)
+        app.config.setdefault("MYSQL_CHARSET", "utf8")
+        app.config.setdefault("MYSQL_CURSORCLASS", None)
+        app.config.setdefault("MYSQL_POOL_MIN_SIZE", 1)
+        app.config.setdefault("MYSQL_POOL_MAX_SIZE", 10)
+        app.config.setdefault("MYSQL_POOL_TIMEOUT", 5.0)
+        app.config.setdefault("MYSQL_POOL_RECYCLE", 3600)
+        app.config.setdefault("MYSQL_POOL_HEALTH_CHECK_INTERVAL", 30.0)
+        app.teardown_appcontext(self.teardown)
+
+    def _connect_kwargs(self):
+        config = self.app.config
+        kwargs = {
+            "host": config["MYSQL_HOST"],
+            "port": config["MYSQL_PORT"],
+            "charset": config["MYSQL_CHARSET"],
+            "autocommit": False,
+        }
+        if config["MYSQL_USER"]:
+            kwargs["user"] = config["MYSQL_USER"]
+        if config["MYSQL_PASSWORD"]:
+            kwargs["passwd"] = config["MYSQL_PASSWORD"]
+        if config["MYSQL_DB"]:
+            kwargs["db"] = config["MYSQL_DB"]
+        if config["MYSQL_CURSORCLASS"]:
+            kwargs["cursorclass"] = getattr(
+                MySQLdb.cursors, config["MYSQL_CURSORCLASS"]
+            )
+        return kwargs
+
+    @property
+    def pool(self):
+        # O pool é criado no primeiro uso em cada processo: workers
+        # forkados pelo gunicorn não herdam sockets do processo mestre
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    config = self.app.config
+                    self._pool = ConnectionPool(
+                        self._connect_kwargs(),
+                        min_size=config["MYSQL_POOL_MIN_SIZE"],
+                        max_size=config["MYSQL_POOL_MAX_SIZE"],
+                        wait_timeout=config["MYSQL_POOL_TIMEOUT"],
+                        recycle_seconds=config["MYSQL_POOL_RECYCLE"],
+                        health_check_interval=config[
+                            "MYSQL_POOL_HEALTH_CHECK_INTERVAL"
+                        ],
+                    )
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    @property
+    def connection(self):
+        if "mysql_connection" not in g:
+            connection = self.pool.acquire()
+            g.mysql_connection = connection
+            if self.cursor_wrapper is not None:
+                connection = CursorWrappingConnection(connection, self.cursor_wrapper)
+            g.mysql_connection_view = connection
+        return g.mysql_connection_view
+
+    def teardown(self, exception):
+        g.pop("mysql_connection_view", None)
+        connection = g.pop("mysql_connection", None)
+        if connection is None:
+            return
+        # release() faz o ROLLBACK e descarta a conexão se ele falhar
+        self.pool.release(connection)
+
+    # Sem réplicas: tudo no primário (veja ReplicatedMySQL em replicas.py)
+    using_replica = False
+
+    def read_only(self, view):
+        return view
+
+    def add_read_floor(self, floor):
+        pass
+
+    def stats(self):
+        if self._pool is None or self._pool_pid != os.getpid():
+            return {"initialized": False}
+        return {"initialized": True, **self._pool.stats()}
@@ -0,0 +1,118 @@
+import asyncio
+import traceback
+
+# Distribuição em processo das notificações do GET /events (async_app.py).
+#
+# Um único laço por processo lê o registro de alterações (changes.py) a cada
+# EVENTS_POLL_MS e, quando a versão avança, monta o evento uma vez e o coloca
+# na fila de cada assinante. Conexões ociosas custam só uma fila e uma
+# corrotina parada no await, sem thread. Como o registro é gravado na mesma
+# transação de cada escrita, o evento sai depois do commit e vale para
+# escritas feitas em qualquer worker.
+#
+# Um assinante lento cuja fila enche não trava os outros: os eventos dele
+# são descartados e a próxima mensagem é um reset, que manda o cliente
+# buscar tudo de novo.
+
+# Devolvido por Subscriber.next quando eventos foram descartados
+LAGGED = "lagged"
+
+
+class Subscriber:
+    def __init__(self, since, queue_size):
+        # Versão a partir da qual a fila recebe eventos
+        self.since = since
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+    def publish(self, version, event):
+        # False se o evento foi descartado
+        if self.lagged:
+            return False
+        try:
+            self.queue.put_nowait((version, event))
+        except asyncio.QueueFull:
+            self.lagged = True
+            return False
+        return True
+
+    async def next(self, timeout):
+        # (versão, evento); None se nada chegou dentro do timeout e LAGGED
+        # depois de eventos descartados
+        if self.lagged:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = False
+            return LAGGED
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventHub:
+    def __init__(self, poll, interval=0.5, max_subscribers=10000, queue_size=64):
+        # poll(since) -> (versão atual, evento com as mudanças desde since ou None)
+        self.poll = poll
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.version = None
+        self._task = None
+        self._lock = None
+        self.counters = {"events": 0, "deliveries": 0, "dropped": 0, "poll_errors": 0}
+
+    async def subscribe(self):
+        # None quando o limite de conexões do processo foi atingido
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._task is None or self._task.done():
+                self.version, _ = await self.poll(None)
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            subscriber = Subscriber(self.version, self.queue_size)
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        # Para sozinho quando o último assinante sai; o próximo reinicia
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                version, event = await self.poll(self.version)
+            except Exception:
+                traceback.print_exc()
+                self.counters["poll_errors"] += 1
+                continue
+            if event is None:
+                continue
+            self.version = version
+            self.counters["events"] += 1
+            for subscriber in list(self.subscribers):
+                if subscriber.publish(version, event):
+                    self.counters["deliveries"] += 1
+                else:
+                    self.counters["dropped"] += 1
+        self._task = None
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "version": self.version,
+            **self.counters,
+        }
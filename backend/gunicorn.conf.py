@@ -0,0 +1,21 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+# Reinicia workers periodicamente para conter vazamentos de memória
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = 500
+# O app não pode ser pré-carregado no mestre: o pool é por processo
+preload_app = False
+
+# Sem isso o pool pode ficar menor que o número de threads e as requisições
+# passariam a esperar por conexão; as tarefas em segundo plano (jobs.py) usam
+# conexões do mesmo pool
+os.environ.setdefault(
+    "MYSQL_POOL_MAX_SIZE", str(threads + int(os.environ.get("JOBS_MAX_WORKERS", "2")))
+)
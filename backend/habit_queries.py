@@ -0,0 +1,171 @@
+import datetime
+
+import rollups
+from pagination import decode_key_token, encode_page_token
+
+# SQL e formatação do GET /habits, compartilhados pelo app síncrono (app.py)
+# e pela variante assíncrona (async_app.py): as duas montam as mesmas
+# consultas e formatam as linhas do mesmo jeito, então devolvem o mesmo JSON.
+
+HABITS_SELECT = """
+    SELECT
+        h.id, h.name, h.description, h.count_method, h.completion_method,
+        h.target_quantity, h.target_days_per_week, h.created_at,
+        today_dt.habit_id IS NOT NULL AS is_completed_today,
+        CASE h.count_method
+            WHEN 'daily' THEN COALESCE(today_dt.total_quantity, 0)
+            WHEN 'monthly' THEN COALESCE(month_pt.total_quantity, 0)
+            ELSE COALESCE(week_pt.total_quantity, 0)
+        END AS current_period_quantity,
+        CASE h.count_method
+            WHEN 'daily' THEN today_dt.habit_id IS NOT NULL
+            WHEN 'monthly' THEN COALESCE(month_pt.days_completed, 0)
+            ELSE COALESCE(week_pt.days_completed, 0)
+        END AS current_period_days_completed
+    FROM habits h
+"""
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def parse_page_token(page_token):
+    # (created_at, id) do último hábito da página anterior; ValueError se
+    # inválido. O SQLite compara created_at como texto: volta a ser datetime.
+    last_created_at, last_id = decode_key_token(
+        page_token, datetime.datetime.fromisoformat, int
+    )
+    return last_created_at, last_id
+
+
+def _period_joins(today):
+    # O período atual depende do count_method: o próprio dia (daily), a
+    # semana a partir de segunda-feira (weekly) ou o mês (monthly). Os
+    # totais vêm das tabelas de rollup (rollups.py), uma linha por hábito.
+    start_of_week, _ = rollups.period_bounds("week", today)
+    start_of_month, _ = rollups.period_bounds("month", today)
+    joins = """
+        LEFT JOIN habit_daily_totals today_dt
+               ON today_dt.habit_id = h.id AND today_dt.record_date = %s
+        LEFT JOIN habit_period_totals week_pt
+               ON week_pt.habit_id = h.id AND week_pt.period_type = 'week'
+              AND week_pt.period_start = %s
+        LEFT JOIN habit_period_totals month_pt
+               ON month_pt.habit_id = h.id AND month_pt.period_type = 'month'
+              AND month_pt.period_start = %s
+    """
+    return joins, [today.isoformat(), start_of_week.isoformat(), start_of_month.isoformat()]
+
+
+def habits_query(today, page_size, category_id=None, after=None, offset=0):
+    # A página de hábitos é escolhida primeiro (keyset sobre
+    # created_at DESC, id DESC) e só ela entra na junção agregada. Uma linha a
+    # mais indica que existe próxima página (split_page). page_size None: todos.
+    page_query = "SELECT h0.id FROM habits h0"
+    page_where = []
+    page_params = []
+    if category_id:
+        page_query += " JOIN habit_categories hc ON h0.id = hc.habit_id"
+        page_where.append("hc.category_id = %s")
+        page_params.append(category_id)
+    if after is not None:
+        last_created_at, last_id = after
+        page_where.append("(h0.created_at < %s OR (h0.created_at = %s AND h0.id < %s))")
+        page_params.extend([last_created_at, last_created_at, last_id])
+    if page_where:
+        page_query += " WHERE " + " AND ".join(page_where)
+    page_query += " ORDER BY h0.created_at DESC, h0.id DESC"
+    if page_size is not None:
+        page_query += " LIMIT %s OFFSET %s"
+        page_params.extend([page_size + 1, offset])
+
+    joins, join_params = _period_joins(today)
+    query = (
+        HABITS_SELECT
+        + f" JOIN ({page_query}) page ON page.id = h.id"
+        + joins
+        + " ORDER BY h.created_at DESC, h.id DESC"
+    )
+    # Os parâmetros da página (subconsulta) vêm antes dos das junções
+    return query, tuple(page_params + join_params)
+
+
+def habits_by_id_query(today, habit_ids):
+    # As mesmas colunas do GET /habits para hábitos escolhidos (/events)
+    joins, join_params = _period_joins(today)
+    query = (
+        HABITS_SELECT + joins + f" WHERE h.id IN ({_placeholders(habit_ids)}) ORDER BY h.id"
+    )
+    return query, tuple(join_params + list(habit_ids))
+
+
+def split_page(habits, page_size):
+    # (hábitos da página, token da próxima ou None)
+    if page_size is None or len(habits) <= page_size:
+        return habits, None
+    habits = habits[:page_size]
+    last_habit = habits[-1]
+    return habits, encode_page_token([last_habit["created_at"], last_habit["id"]])
+
+
+def categories_query(habit_ids):
+    # Categorias de todos os hábitos retornados em um só lote
+    return (
+        f"""
+        SELECT hc.habit_id, c.id, c.name FROM categories c
+        JOIN habit_categories hc ON c.id = hc.category_id
+        WHERE hc.habit_id IN ({_placeholders(habit_ids)})
+        """,
+        tuple(habit_ids),
+    )
+
+
+def categories_by_habit(habit_ids, rows):
+    by_habit = {habit_id: [] for habit_id in habit_ids}
+    for row in rows:
+        by_habit[row["habit_id"]].append({"id": row["id"], "name": row["name"]})
+    return by_habit
+
+
+def last_completed_query(habit_ids):
+    # Último dia com registro, a partir dos totais diários e do último dia
+    # de cada ano arquivado (archive.py)
+    placeholders = _placeholders(habit_ids)
+    return (
+        f"""
+        SELECT habit_id, MAX(last_date) AS last_completed_date
+        FROM (
+            SELECT habit_id, MAX(record_date) AS last_date
+            FROM habit_daily_totals
+            WHERE habit_id IN ({placeholders})
+            GROUP BY habit_id
+            UNION ALL
+            SELECT habit_id, MAX(last_date) AS last_date
+            FROM habit_record_archive
+            WHERE habit_id IN ({placeholders})
+            GROUP BY habit_id
+        ) last_dates
+        GROUP BY habit_id
+        """,
+        (*habit_ids, *habit_ids),
+    )
+
+
+def format_habit(habit, categories, last_completed, current_streak, longest_streak):
+    habit["categories"] = categories
+    habit["last_completed_date"] = last_completed
+    habit["current_streak"] = current_streak
+    habit["longest_streak"] = longest_streak
+
+    habit["is_completed_today"] = bool(habit["is_completed_today"])
+    # total_quantity é DECIMAL no MySQL: sem int() sairia como string no JSON
+    habit["current_period_quantity"] = int(habit["current_period_quantity"])
+    habit["current_period_days_completed"] = int(habit["current_period_days_completed"])
+    if isinstance(habit.get("last_completed_date"), datetime.date):
+        habit["last_completed_date"] = habit["last_completed_date"].isoformat()
+    if isinstance(
+        habit.get("created_at"), datetime.datetime
+    ):  # Assegura que created_at seja string
+        habit["created_at"] = habit["created_at"].isoformat()
+    return habit
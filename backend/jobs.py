@@ -0,0 +1,192 @@
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Tarefas em segundo plano para operações longas (tabela jobs, migração
+# 0005). A rota grava a tarefa como "queued", devolve o id na hora e um
+# thread do pool a executa com a sua própria conexão. A função da tarefa
+# recebe (connection, report): report(progress) grava o progresso na
+# transação corrente, então ele fica visível junto com cada lote confirmado.
+# owner (host:pid) diz qual processo tem a tarefa; as de processos que
+# morreram são marcadas como falhas no primeiro uso de cada processo.
+#
+#   GET /jobs/<id>   # status, progresso, resultado ou erro
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOB_COLUMNS = (
+    "id, kind, status, params, progress, result, error, owner, "
+    "created_at, started_at, finished_at, updated_at"
+)
+
+
+def _dumps(value):
+    return json.dumps(value, default=str) if value is not None else None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, mas é de outro usuário
+    return True
+
+
+class JobRunner:
+    def __init__(self, app=None, repository=None):
+        self.app = app
+        self.repository = repository
+        self.max_workers = 2
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.owner = None
+        if app is not None:
+            self.init_app(app, repository)
+
+    def init_app(self, app, repository):
+        self.app = app
+        self.repository = repository
+        app.config.setdefault("JOBS_MAX_WORKERS", 2)
+        self.max_workers = app.config["JOBS_MAX_WORKERS"]
+
+    def _pool(self, connection):
+        # Threads não atravessam fork: cada worker do gunicorn cria o seu pool.
+        # As tarefas órfãs são recolhidas antes, ainda com o lock, para não
+        # pegar uma tarefa que este processo acabou de enfileirar.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                owner = f"{socket.gethostname()}:{os.getpid()}"
+                self.fail_orphaned(connection, owner)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="job"
+                )
+                self._executor_pid = os.getpid()
+                self.owner = owner
+            return self._executor
+
+    def fail_orphaned(self, connection, owner):
+        # Tarefas "queued" ou "running" de um processo que morreu (deploy,
+        # OOM, worker reciclado pelo max_requests) nunca terminariam. Só dá
+        # para checar os pids deste host; as de owner igual ao deste processo
+        # também são órfãs (pid reaproveitado, ex.: contêiner reiniciado), já
+        # que ele ainda não executou nenhuma.
+        host = owner.rpartition(":")[0]
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT id, owner FROM jobs WHERE status IN (%s, %s) AND owner LIKE %s",
+            (QUEUED, RUNNING, f"{host}:%"),
+        )
+        orphaned = []
+        for job in cursor.fetchall():
+            job_host, _, pid = job["owner"].rpartition(":")
+            if job_host != host or not pid.isdigit():
+                continue
+            if job["owner"] == owner or not _pid_alive(int(pid)):
+                orphaned.append(job["id"])
+        cursor.close()
+        for job_id in orphaned:
+            self._update(
+                connection,
+                job_id,
+                "status = %s, error = %s, finished_at = CURRENT_TIMESTAMP",
+                (FAILED, "Processo que executava a tarefa terminou antes dela"),
+            )
+        connection.commit()
+        return orphaned
+
+    def submit(self, kind, target, params=None, cleanup=None):
+        # Chamado dentro da requisição; cleanup roda no fim da tarefa, com
+        # sucesso ou erro (ex.: fechar o arquivo temporário de um upload)
+        job_id = uuid.uuid4().hex
+        connection = self.repository.connection
+        pool = self._pool(connection)
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO jobs (id, kind, status, params, owner) VALUES (%s, %s, %s, %s, %s)",
+            (job_id, kind, QUEUED, _dumps(params), self.owner),
+        )
+        connection.commit()
+        cursor.close()
+        try:
+            pool.submit(self._run, job_id, target, cleanup)
+        except Exception:
+            if cleanup is not None:
+                cleanup()
+            raise
+        return job_id
+
+    def _update(self, connection, job_id, assignments, params):
+        cursor = connection.cursor()
+        cursor.execute(
+            f"UPDATE jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (*params, job_id),
+        )
+        cursor.close()
+
+    def _run(self, job_id, target, cleanup):
+        try:
+            with self.app.app_context():
+                connection = self.repository.connection
+                self._update(
+                    connection,
+                    job_id,
+                    "status = %s, owner = %s, started_at = CURRENT_TIMESTAMP",
+                    (RUNNING, self.owner),
+                )
+                connection.commit()
+
+                def report(progress):
+                    self._update(connection, job_id, "progress = %s", (_dumps(progress),))
+
+                try:
+                    result = target(connection, report)
+                except Exception as e:
+                    traceback.print_exc()
+                    connection.rollback()
+                    self._update(
+                        connection,
+                        job_id,
+                        "status = %s, error = %s, finished_at = CURRENT_TIMESTAMP",
+                        (FAILED, str(e)),
+                    )
+                else:
+                    self._update(
+                        connection,
+                        job_id,
+                        "status = %s, result = %s, finished_at = CURRENT_TIMESTAMP",
+                        (SUCCEEDED, _dumps(result)),
+                    )
+                connection.commit()
+        except Exception:
+            # Falha ao gravar o próprio status: fica no log do worker
+            traceback.print_exc()
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def get(self, job_id):
+        connection = self.repository.connection
+        self._pool(connection)
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s", (job_id,))
+        job = cursor.fetchone()
+        cursor.close()
+        if job is None:
+            return None
+        for column in ("params", "progress", "result"):
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        for column in ("created_at", "started_at", "finished_at", "updated_at"):
+            if job[column] is not None:
+                job[column] = job[column].isoformat()
+        return job
@@ -0,0 +1,387 @@
+# Teste de carga local para comparar modos de execução, por exemplo:
+#
+#   python app.py                                   # servidor de desenvolvimento
+#   gunicorn -c gunicorn.conf.py wsgi:application   # workers + pool
+#   python loadtest.py --url http://localhost:5000 --habit-id 1
+#
+# Mede requisições por segundo e latências de GET /habits, GET /export_data e
+# POST /habit_records.
+#
+# Para comparar o app síncrono com a variante assíncrona (asgi.py), suba os
+# dois sobre o mesmo banco e passe --check-against: antes da carga, as
+# respostas das rotas em PARITY_PATHS são comparadas (o JSON decodificado e
+# o token de próxima página) e qualquer diferença encerra com erro. Depois
+# os cenários rodam nos dois endereços, por exemplo:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#   uvicorn asgi:application --port 5001 --workers 4
+#   python loadtest.py --habit-id 1 --check-against http://localhost:5001 \
+#       --concurrency 256
+#
+# --soak-events N abre N conexões ociosas no GET /events da variante
+# assíncrona, grava um registro a cada --soak-interval segundos durante
+# --soak-seconds e mede quantas conexões receberam cada evento e em quanto
+# tempo depois do commit:
+#
+#   python loadtest.py --url http://localhost:5001 --habit-id 1 --soak-events 5000
+#
+# (aumente o limite de arquivos abertos antes, ex.: ulimit -n 20000)
+#
+# --burst N dispara rajadas de N GETs idênticos ao mesmo tempo (GET /habits e
+# GET /all_habit_records, com um argumento novo a cada rajada para não cair no
+# cache) e compara, por /metrics e /cache/stats, quantas consultas SQL cada
+# requisição custou e quantas foram coalescidas. Rode com o servidor em
+# RESPONSE_COALESCING_ENABLED=1 e =0 para comparar:
+#
+#   python loadtest.py --habit-id 1 --burst 64 --burst-rounds 20
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import gzip
+import json
+import re
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+PARITY_PATHS = (
+    "/categories",
+    "/habits",
+    "/habits?limit=3",
+    "/habits?limit=3&page=2",
+    "/export_data",
+    "/export_data?format=ndjson",
+    "/export_data?gzip=1",
+)
+
+
+def _request(url, payload=None):
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    started = time.perf_counter()
+    with urllib.request.urlopen(
+        urllib.request.Request(url, data=data, headers=headers)
+    ) as response:
+        response.read()
+        status = response.status
+    return status, time.perf_counter() - started
+
+
+def run_scenario(name, make_call, total_requests, concurrency):
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(make_call, i) for i in range(total_requests)]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                status, latency = future.result()
+                latencies.append(latency)
+                if status >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(total_requests / elapsed, 1),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 2)
+        if latencies
+        else None,
+        "latency_ms_p99": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+        if latencies
+        else None,
+    }
+
+
+def _fetch_decoded(url):
+    # (status, corpo decodificado, token da próxima página)
+    with urllib.request.urlopen(url) as response:
+        body = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        text = body.decode("utf-8")
+        if response.headers.get_content_type() == "application/x-ndjson":
+            decoded = [json.loads(line) for line in text.splitlines() if line]
+        else:
+            decoded = json.loads(text)
+        return response.status, decoded, response.headers.get("X-Next-Page-Token")
+
+
+def check_parity(url, other_url):
+    mismatches = []
+    for path in PARITY_PATHS:
+        expected = _fetch_decoded(url + path)
+        got = _fetch_decoded(other_url + path)
+        if expected != got:
+            mismatches.append(path)
+    return mismatches
+
+
+def run_scenarios(url, habit_id, total_requests, concurrency):
+    today = datetime.date.today()
+    return [
+        run_scenario(
+            "GET /habits",
+            # Argumento único por requisição: ignora o cache de respostas
+            lambda i: _request(f"{url}/habits?nocache={i}"),
+            total_requests,
+            concurrency,
+        ),
+        run_scenario(
+            "GET /export_data",
+            lambda i: _request(f"{url}/export_data?nocache={i}"),
+            max(total_requests // 20, 1),
+            concurrency,
+        ),
+        run_scenario(
+            "POST /habit_records",
+            lambda i: _request(
+                f"{url}/habit_records",
+                {
+                    "habit_id": habit_id,
+                    # Espalha as datas para não disputar sempre a mesma linha
+                    "record_date": (today - datetime.timedelta(days=i % 365)).isoformat(),
+                    "quantity_completed": 1,
+                },
+            ),
+            total_requests,
+            concurrency,
+        ),
+    ]
+
+
+def _queries_by_route(url):
+    # {rota: (soma de consultas, requisições)} do histograma de /metrics
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        text = response.read().decode("utf-8")
+    totals = {}
+    for kind, route, value in re.findall(
+        r'^db_queries_per_request_(sum|count)\{route="([^"]*)"\} (\S+)$', text, re.M
+    ):
+        total, count = totals.get(route, (0, 0))
+        if kind == "sum":
+            total = float(value)
+        else:
+            count = int(value)
+        totals[route] = (total, count)
+    return totals
+
+
+def _cache_stats(url):
+    with urllib.request.urlopen(f"{url}/cache/stats") as response:
+        return json.loads(response.read())
+
+
+def run_bursts(url, size, rounds):
+    # Cada rodada solta `size` requisições idênticas juntas (barreira) e espera
+    # todas terminarem antes da próxima
+    today = datetime.date.today()
+    paths = {
+        "/habits": "/habits?burst={}",
+        "/all_habit_records": "/all_habit_records?start_date={}&end_date={}&burst={{}}".format(
+            (today - datetime.timedelta(days=365)).isoformat(), today.isoformat()
+        ),
+    }
+    results = []
+    for route, template in paths.items():
+        queries_before = _queries_by_route(url).get(route, (0, 0))
+        cache_before = _cache_stats(url)
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for burst in range(rounds):
+            nonce = f"{time.time_ns()}-{burst}"
+            barrier = threading.Barrier(size)
+
+            def call():
+                barrier.wait()
+                return _request(url + template.format(nonce))
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=size) as executor:
+                for future in [executor.submit(call) for _ in range(size)]:
+                    try:
+                        status, latency = future.result()
+                        latencies.append(latency)
+                        if status >= 400:
+                            errors += 1
+                    except Exception:
+                        errors += 1
+        elapsed = time.perf_counter() - started
+        queries_after = _queries_by_route(url).get(route, (0, 0))
+        cache_after = _cache_stats(url)
+        requests = queries_after[1] - queries_before[1]
+        queries = queries_after[0] - queries_before[0]
+        latencies.sort()
+        results.append(
+            {
+                "scenario": f"GET {route} em rajadas",
+                "burst_size": size,
+                "rounds": rounds,
+                "errors": errors,
+                "elapsed_seconds": round(elapsed, 3),
+                "db_queries": queries,
+                "db_queries_per_request": round(queries / requests, 3) if requests else None,
+                "coalesced": cache_after.get("coalesced", 0) - cache_before.get("coalesced", 0),
+                "latency_ms_p50": round(statistics.median(latencies) * 1000, 2)
+                if latencies
+                else None,
+                "latency_ms_p99": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+                if latencies
+                else None,
+            }
+        )
+    return results
+
+
+async def _sse_client(host, port, path, ready, arrivals):
+    # Cliente HTTP mínimo: milhares de conexões sem um thread para cada
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        request_head = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n"
+        writer.write(request_head.encode("ascii"))
+        await writer.drain()
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(status.decode().strip())
+        event = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            line = line.decode("utf-8").strip()
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "ready":
+                    ready.append(time.perf_counter())
+                elif event == "changes":
+                    arrivals.append(time.perf_counter())
+                event = None
+    finally:
+        writer.close()
+
+
+async def soak_events(url, habit_id, connections, seconds, interval):
+    parsed = urllib.parse.urlsplit(url)
+    ready = []
+    arrivals = [[] for _ in range(connections)]
+    clients = []
+    for index in range(connections):
+        clients.append(
+            asyncio.ensure_future(
+                _sse_client(parsed.hostname, parsed.port or 80, "/events", ready, arrivals[index])
+            )
+        )
+        if index % 500 == 499:
+            await asyncio.sleep(0.1)
+    deadline = time.perf_counter() + 30
+    while len(ready) + sum(client.done() for client in clients) < connections:
+        if time.perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.1)
+    failed = sum(1 for client in clients if client.done())
+
+    loop = asyncio.get_running_loop()
+    today = datetime.date.today()
+    commits = []
+    for index in range(int(seconds / interval)):
+        record_date = (today - datetime.timedelta(days=index % 365)).isoformat()
+        await loop.run_in_executor(
+            None,
+            _request,
+            f"{url}/habit_records",
+            {"habit_id": habit_id, "record_date": record_date, "quantity_completed": 1},
+        )
+        commits.append(time.perf_counter())
+        await asyncio.sleep(interval)
+    await asyncio.sleep(max(interval, 2))
+
+    latencies = []
+    missing = 0
+    for received in arrivals:
+        # Escritas espaçadas por mais que EVENTS_POLL_MS: um evento por commit
+        missing += max(len(commits) - len(received), 0)
+        latencies.extend(
+            arrival - commit for arrival, commit in zip(received, commits)
+        )
+    stats = json.loads(urllib.request.urlopen(f"{url}/events/stats").read())
+    for client in clients:
+        client.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+    latencies.sort()
+    return {
+        "scenario": "GET /events (soak)",
+        "connections": connections,
+        "connections_failed": failed,
+        "writes": len(commits),
+        "events_missing": missing,
+        "delivery_ms_p50": round(statistics.median(latencies) * 1000, 2)
+        if latencies
+        else None,
+        "delivery_ms_p99": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+        if latencies
+        else None,
+        "server": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--habit-id", type=int, required=True)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--check-against",
+        help="segundo servidor (ex.: a variante assíncrona) para comparar respostas e carga",
+    )
+    parser.add_argument("--soak-events", type=int, help="conexões abertas no GET /events")
+    parser.add_argument("--soak-seconds", type=float, default=60)
+    parser.add_argument("--soak-interval", type=float, default=2)
+    parser.add_argument("--burst", type=int, help="GETs idênticos simultâneos por rajada")
+    parser.add_argument("--burst-rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.burst:
+        print(json.dumps(run_bursts(args.url, args.burst, args.burst_rounds), indent=2))
+        return
+
+    if args.soak_events:
+        result = asyncio.run(
+            soak_events(
+                args.url, args.habit_id, args.soak_events, args.soak_seconds, args.soak_interval
+            )
+        )
+        print(json.dumps(result, indent=2))
+        sys.exit(1 if result["events_missing"] or result["connections_failed"] else 0)
+
+    urls = [args.url]
+    if args.check_against:
+        mismatches = check_parity(args.url, args.check_against)
+        if mismatches:
+            print(json.dumps({"parity_mismatches": mismatches}, indent=2))
+            sys.exit(1)
+        urls.append(args.check_against)
+
+    results = {
+        url: run_scenarios(url, args.habit_id, args.requests, args.concurrency)
+        for url in urls
+    }
+    print(json.dumps(results if args.check_against else results[args.url], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import bisect
+import collections
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, request
+
+# Limites (em segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites do histograma de consultas SQL por requisição
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+SLOW_QUERY_LOG_CHARS = 500
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # O último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class TimedCursor:
+    # Envolve um cursor do MySQLdb contando e cronometrando cada execute.
+    # Em cursores do servidor (SSCursor) o tempo das buscas posteriores
+    # (fetchmany) não entra na conta, só o do execute.
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            self._metrics.record_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            self._metrics.record_query(query, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Metrics:
+    # Métricas em memória do processo, no formato texto do Prometheus. Com o
+    # gunicorn cada worker tem as suas; o Prometheus deve somar as séries.
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.enabled = True
+        self.slow_query_seconds = 0.2
+        self.logger = None
+        self.requests = collections.Counter()  # (método, rota, status) -> total
+        self.request_latency = {}  # (método, rota) -> _Histogram
+        self.request_queries = {}  # rota -> _Histogram
+        self.request_db_seconds = collections.Counter()  # rota -> segundos
+        self.query_latency = _Histogram(LATENCY_BUCKETS)
+        self.slow_queries = collections.Counter()  # rota -> total
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("SLOW_QUERY_THRESHOLD_MS", 200)
+        self.enabled = app.config["METRICS_ENABLED"]
+        self.slow_query_seconds = app.config["SLOW_QUERY_THRESHOLD_MS"] / 1000.0
+        self.logger = app.logger
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+            # O teardown roda depois que respostas em streaming terminam de
+            # ser enviadas, então a latência inclui a geração do corpo
+            app.teardown_request(self._teardown_request)
+
+    def wrap_cursor(self, cursor):
+        return TimedCursor(cursor, self)
+
+    def _route(self):
+        if has_request_context() and request.url_rule is not None:
+            return request.url_rule.rule
+        return "<sem rota>"
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_db_seconds = 0.0
+
+    def _after_request(self, response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        g.metrics_status = response.status_code
+        # Separa o tempo do MySQL do resto (montagem e serialização do JSON)
+        # para quem olha a requisição no navegador ou num proxy
+        if not response.is_streamed:
+            total_ms = (time.perf_counter() - started) * 1000
+            db_ms = g.metrics_db_seconds * 1000
+            response.headers["Server-Timing"] = (
+                f'db;dur={db_ms:.1f};desc="{g.metrics_queries} queries", '
+                f"app;dur={total_ms - db_ms:.1f}"
+            )
+        return response
+
+    def _teardown_request(self, exception):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        status = g.pop("metrics_status", 500)
+        route = self._route()
+        method = request.method
+        with self.lock:
+            self.requests[(method, route, status)] += 1
+            histogram = self.request_latency.get((method, route))
+            if histogram is None:
+                histogram = self.request_latency[(method, route)] = _Histogram(
+                    LATENCY_BUCKETS
+                )
+            histogram.observe(elapsed)
+            histogram = self.request_queries.get(route)
+            if histogram is None:
+                histogram = self.request_queries[route] = _Histogram(QUERY_COUNT_BUCKETS)
+            histogram.observe(g.metrics_queries)
+            self.request_db_seconds[route] += g.metrics_db_seconds
+
+    def record_query(self, query, seconds):
+        if has_app_context() and "metrics_queries" in g:
+            g.metrics_queries += 1
+            g.metrics_db_seconds += seconds
+        with self.lock:
+            self.query_latency.observe(seconds)
+        if seconds >= self.slow_query_seconds:
+            route = self._route()
+            with self.lock:
+                self.slow_queries[route] += 1
+            if self.logger:
+                self.logger.warning(
+                    "Consulta lenta (%.1f ms) em %s: %s",
+                    seconds * 1000,
+                    route,
+                    " ".join(str(query).split())[:SLOW_QUERY_LOG_CHARS],
+                )
+
+    def render(self, gauges=None):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram_lines(name, names, values, histogram):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                labels = _labels((*names, "le"), (*values, _number(float(bound))))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels((*names, "le"), (*values, "+Inf"))
+            lines.append(f"{name}_bucket{labels} {histogram.count}")
+            labels = _labels(names, values)
+            lines.append(f"{name}_sum{labels} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{labels} {histogram.count}")
+
+        with self.lock:
+            header("http_requests_total", "counter", "Requisições atendidas.")
+            for (method, route, status), total in sorted(self.requests.items()):
+                labels = _labels(("method", "route", "status"), (method, route, status))
+                lines.append(f"http_requests_total{labels} {total}")
+
+            header(
+                "http_request_duration_seconds", "histogram", "Latência das requisições."
+            )
+            for (method, route), histogram in sorted(self.request_latency.items()):
+                histogram_lines(
+                    "http_request_duration_seconds",
+                    ("method", "route"),
+                    (method, route),
+                    histogram,
+                )
+
+            header(
+                "db_queries_per_request", "histogram", "Comandos SQL por requisição."
+            )
+            for route, histogram in sorted(self.request_queries.items()):
+                histogram_lines("db_queries_per_request", ("route",), (route,), histogram)
+
+            header(
+                "db_request_seconds_total", "counter", "Tempo gasto no MySQL por rota."
+            )
+            for route, seconds in sorted(self.request_db_seconds.items()):
+                labels = _labels(("route",), (route,))
+                lines.append(f"db_request_seconds_total{labels} {_number(seconds)}")
+
+            header("db_query_duration_seconds", "histogram", "Latência de cada comando SQL.")
+            histogram_lines("db_query_duration_seconds", (), (), self.query_latency)
+
+            header(
+                "db_slow_queries_total",
+                "counter",
+                "Comandos SQL acima de SLOW_QUERY_THRESHOLD_MS.",
+            )
+            for route, total in sorted(self.slow_queries.items()):
+                labels = _labels(("route",), (route,))
+                lines.append(f"db_slow_queries_total{labels} {total}")
+
+        for name, (help_text, value) in (gauges or {}).items():
+            header(name, "gauge", help_text)
+            lines.append(f"{name} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
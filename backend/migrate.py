@@ -0,0 +1,242 @@
+# Migrações versionadas do esquema.
+#
+#   python migrate.py status     # lista migrações aplicadas e pendentes
+#   python migrate.py upgrade    # aplica as pendentes, em ordem
+#   python migrate.py explain    # falha se uma consulta quente fizer full scan
+#
+# DATABASE_ENGINE=sqlite usa migrations/sqlite/ e o arquivo SQLITE_PATH; os
+# números de versão são os mesmos nos dois diretórios (um motor pode pular
+# um número). explain usa EXPLAIN QUERY PLAN no SQLite.
+#
+# Rode o explain contra um banco com dados (ex.: gerados pelo benchmark): com
+# tabelas vazias o otimizador pode preferir varrer a tabela inteira.
+#
+# Cada arquivo em migrations/ é NNNN_descricao.sql. DDL no MySQL faz commit
+# implícito, então uma migração que falhe no meio precisa ser corrigida à mão
+# antes de rodar de novo; por isso cada arquivo usa IF NOT EXISTS onde dá, ou
+# confere o information_schema antes de cada ALTER TABLE (ex.: 0007).
+import datetime
+import json
+import os
+import re
+import sys
+
+import MySQLdb
+import MySQLdb.cursors
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATIONS_DIRS = {"mysql": MIGRATIONS_DIR, "sqlite": os.path.join(MIGRATIONS_DIR, "sqlite")}
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def hot_queries(dialect=None, today=None):
+    # Consultas das rotas mais usadas, com parâmetros de exemplo, montadas
+    # pelos mesmos construtores que as rotas usam: mudar o SQL de uma rota
+    # muda o que o explain confere.
+    import analytics
+    import archive
+    import changes
+    import habit_queries
+    import rollups
+    import store
+    import streaks
+    from repository import MYSQL
+
+    dialect = dialect or MYSQL
+    today = today or datetime.date.today()
+    week_start, week_end = rollups.period_bounds("week", today)
+    year_ago = today - datetime.timedelta(days=366)
+    page_token = (datetime.datetime.combine(today, datetime.time()), 10)
+    target_habit = {"id": 1, "completion_method": "quantity", "target_quantity": 1}
+    return [
+        ("get_all_categories", *store.categories_query()),
+        ("get_habits", *habit_queries.habits_query(today, 100)),
+        ("get_habits (lista inteira)", *habit_queries.habits_query(today, None)),
+        (
+            "get_habits (página por categoria)",
+            *habit_queries.habits_query(today, 100, category_id=1),
+        ),
+        ("get_habits (página seguinte)", *habit_queries.habits_query(today, 100, after=page_token)),
+        ("get_habits (categorias em lote)", *habit_queries.categories_query([1, 2])),
+        ("get_habits (último registro em lote)", *habit_queries.last_completed_query([1, 2])),
+        (
+            "get_habits (pendentes com total)",
+            *store.days_with_totals_query(dialect, [(1, today), (2, today)]),
+        ),
+        ("streaks (datas que qualificam)", *streaks.qualifying_dates_query(target_habit, order="DESC")),
+        ("rollups (totais do período)", *rollups.period_totals_query(1, week_start, week_end)),
+        (
+            "get_habit_analytics",
+            *analytics.daily_totals_query(dialect, [1, 2], year_ago, today),
+        ),
+        ("sync (alterações desde a versão)", changes.CHANGES_BETWEEN_SQL, (100, 110)),
+        (
+            "get_habit_records_for_heatmap",
+            *store.habit_records_query(1, year_ago, today, limit=5001),
+        ),
+        (
+            "get_habit_records_batch_for_heatmap",
+            *store.records_by_habit_query([1, 2], year_ago, today),
+        ),
+        (
+            "get_all_habit_records_for_heatmap",
+            *store.all_records_query(year_ago, today, after=(year_ago, 0), limit=5001),
+        ),
+        (
+            "archive (segmentos por hábito)",
+            *archive.segments_query([1, 2], year_ago.replace(year=year_ago.year - 3), year_ago),
+        ),
+        (
+            "archive (anos arquivados)",
+            *archive.archived_years_query(year_ago.replace(year=year_ago.year - 3), year_ago),
+        ),
+        (
+            "archive (segmentos por ano)",
+            *archive.segments_query(None, year_ago.replace(year=year_ago.year - 3), year_ago),
+        ),
+    ]
+
+
+# Tabelas derivadas (a página de ids do GET /habits) e resultados de UNION
+# são pequenos por construção
+FULL_SCAN_ALLOWED = {"page", "last_dates"}
+
+
+def _full_scan_allowed(table):
+    # <derived2>, <union1,2> no MySQL; (subquery-1) no SQLite
+    return table is None or table in FULL_SCAN_ALLOWED or table.startswith(("<", "("))
+
+
+def connect(engine="mysql"):
+    if engine == "sqlite":
+        import repository
+
+        return repository.connect_sqlite(os.environ.get("SQLITE_PATH", "habit_tracker.db"))
+    return MySQLdb.connect(
+        host=os.environ.get("MYSQL_HOST", "localhost"),
+        user=os.environ.get("MYSQL_USER", "root"),
+        passwd=os.environ.get("MYSQL_PASSWORD", "admin"),
+        db=os.environ.get("MYSQL_DB", "habit_tracker"),
+        charset="utf8mb4",
+        cursorclass=MySQLdb.cursors.DictCursor,
+    )
+
+
+def available_migrations(engine="mysql"):
+    directory = MIGRATIONS_DIRS[engine]
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append(
+                (int(match.group(1)), match.group(2), os.path.join(directory, filename))
+            )
+    return migrations
+
+
+def split_statements(sql):
+    # Remove comentários de linha e separa por ';' no fim da linha
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    statements = re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def applied_versions(cursor):
+    cursor.execute(SCHEMA_MIGRATIONS_DDL)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row["version"] for row in cursor.fetchall()}
+
+
+def upgrade(connection, target=None, engine="mysql"):
+    cursor = connection.cursor()
+    applied = applied_versions(cursor)
+    performed = []
+    for version, name, path in available_migrations(engine):
+        if version in applied or (target is not None and version > target):
+            continue
+        with open(path, encoding="utf-8") as migration_file:
+            for statement in split_statements(migration_file.read()):
+                cursor.execute(statement)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+            (version, name),
+        )
+        connection.commit()
+        performed.append(f"{version:04d}_{name}")
+    cursor.close()
+    return performed
+
+
+def status(connection, engine="mysql"):
+    cursor = connection.cursor()
+    applied = applied_versions(cursor)
+    cursor.close()
+    return [
+        {"version": version, "name": name, "applied": version in applied}
+        for version, name, _ in available_migrations(engine)
+    ]
+
+
+def explain_hot_queries(connection, engine="mysql"):
+    # Consultas quentes que fazem full scan de alguma tabela. No MySQL, linhas
+    # do EXPLAIN com type ALL; no SQLite, passos "SCAN tabela" sem índice.
+    from repository import MYSQL, SQLITE
+
+    cursor = connection.cursor()
+    problems = []
+    for name, sql, params in hot_queries(SQLITE if engine == "sqlite" else MYSQL):
+        if engine == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            for row in cursor.fetchall():
+                detail = row["detail"].split()
+                if detail[0] == "SCAN" and "USING" not in detail and "CONSTANT" not in detail:
+                    if not _full_scan_allowed(detail[1]):
+                        problems.append({"query": name, "table": detail[1], "rows": None})
+            continue
+        cursor.execute("EXPLAIN " + sql, params)
+        for row in cursor.fetchall():
+            if row.get("type") == "ALL" and not _full_scan_allowed(row.get("table")):
+                problems.append(
+                    {"query": name, "table": row.get("table"), "rows": row.get("rows")}
+                )
+    cursor.close()
+    return problems
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "status"
+    engine = os.environ.get("DATABASE_ENGINE", "mysql")
+    connection = connect(engine)
+    try:
+        if command == "upgrade":
+            target = int(argv[2]) if len(argv) > 2 else None
+            performed = upgrade(connection, target, engine)
+            print("Aplicadas: " + (", ".join(performed) if performed else "nenhuma"))
+        elif command == "status":
+            for migration in status(connection, engine):
+                mark = "x" if migration["applied"] else " "
+                print(f"[{mark}] {migration['version']:04d}_{migration['name']}")
+        elif command == "explain":
+            problems = explain_hot_queries(connection, engine)
+            if problems:
+                print(json.dumps(problems, indent=2))
+                return 1
+            print(f"{len(hot_queries())} consultas verificadas, nenhuma faz full scan.")
+        else:
+            print("Uso: python migrate.py [status|upgrade [versão]|explain]")
+            return 2
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,54 @@
+-- Esquema base usado pelo backend. Os índices foram pensados para as
+-- consultas das rotas:
+--   * habit_records é agrupada fisicamente por (habit_id, record_date): as
+--     leituras por hábito (streak, heatmap, totais do período, upsert do
+--     ON DUPLICATE KEY UPDATE) viram varreduras de intervalo na chave
+--     primária, que já contém todas as colunas.
+--   * idx_habit_records_date_habit cobre /all_habit_records e a paginação
+--     por (record_date, habit_id) sem tocar a tabela.
+--   * idx_habits_created_at_id atende ORDER BY created_at DESC, id DESC.
+--   * idx_habit_categories_category cobre o filtro por category_id.
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(100) NOT NULL,
+    PRIMARY KEY (id),
+    KEY idx_categories_name (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS habits (
+    id INT NOT NULL AUTO_INCREMENT,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NULL,
+    count_method VARCHAR(20) NOT NULL,
+    completion_method VARCHAR(20) NOT NULL,
+    target_quantity INT NULL,
+    target_days_per_week INT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    KEY idx_habits_created_at_id (created_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS habit_categories (
+    habit_id INT NOT NULL,
+    category_id INT NOT NULL,
+    PRIMARY KEY (habit_id, category_id),
+    KEY idx_habit_categories_category (category_id, habit_id),
+    CONSTRAINT fk_habit_categories_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE,
+    CONSTRAINT fk_habit_categories_category FOREIGN KEY (category_id)
+        REFERENCES categories (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS habit_records (
+    id INT NOT NULL AUTO_INCREMENT,
+    habit_id INT NOT NULL,
+    record_date DATE NOT NULL,
+    quantity_completed INT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (habit_id, record_date),
+    UNIQUE KEY uq_habit_records_id (id),
+    KEY idx_habit_records_date_habit (record_date, habit_id, quantity_completed),
+    CONSTRAINT fk_habit_records_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,14 @@
+-- Estado persistido das streaks (veja streaks.py). current_streak é o
+-- tamanho da sequência que termina em last_qualifying_date.
+
+CREATE TABLE IF NOT EXISTS habit_streaks (
+    habit_id INT NOT NULL,
+    current_streak INT NOT NULL DEFAULT 0,
+    run_start_date DATE NULL,
+    last_qualifying_date DATE NULL,
+    longest_streak INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (habit_id),
+    CONSTRAINT fk_habit_streaks_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,44 @@
+-- Totais pré-agregados mantidos pelas rotas de escrita (veja rollups.py).
+-- total_quantity usa DECIMAL para manter o mesmo tipo que SUM() devolvia
+-- nas consultas antigas.
+
+CREATE TABLE IF NOT EXISTS habit_daily_totals (
+    habit_id INT NOT NULL,
+    record_date DATE NOT NULL,
+    total_quantity DECIMAL(20, 0) NOT NULL DEFAULT 0,
+    record_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, record_date),
+    CONSTRAINT fk_habit_daily_totals_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- period_type: 'week' (começa na segunda-feira) ou 'month' (começa no dia 1)
+CREATE TABLE IF NOT EXISTS habit_period_totals (
+    habit_id INT NOT NULL,
+    period_type VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    total_quantity DECIMAL(20, 0) NOT NULL DEFAULT 0,
+    days_completed INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, period_type, period_start),
+    CONSTRAINT fk_habit_period_totals_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO habit_daily_totals (habit_id, record_date, total_quantity, record_count)
+SELECT habit_id, record_date, SUM(quantity_completed), COUNT(*)
+FROM habit_records
+GROUP BY habit_id, record_date;
+
+INSERT IGNORE INTO habit_period_totals
+    (habit_id, period_type, period_start, total_quantity, days_completed)
+SELECT habit_id, 'week', DATE_SUB(record_date, INTERVAL WEEKDAY(record_date) DAY),
+       SUM(total_quantity), COUNT(*)
+FROM habit_daily_totals
+GROUP BY habit_id, DATE_SUB(record_date, INTERVAL WEEKDAY(record_date) DAY);
+
+INSERT IGNORE INTO habit_period_totals
+    (habit_id, period_type, period_start, total_quantity, days_completed)
+SELECT habit_id, 'month', DATE_SUB(record_date, INTERVAL DAYOFMONTH(record_date) - 1 DAY),
+       SUM(total_quantity), COUNT(*)
+FROM habit_daily_totals
+GROUP BY habit_id, DATE_SUB(record_date, INTERVAL DAYOFMONTH(record_date) - 1 DAY);
@@ -0,0 +1,26 @@
+-- Registro de alterações para o /sync (veja changes.py).
+--
+-- change_clock tem uma única linha com a última versão emitida. Cada
+-- transação que escreve incrementa a linha e a mantém bloqueada até o
+-- commit, então as versões ficam visíveis na mesma ordem em que foram
+-- emitidas e um cliente nunca pula uma alteração ainda não confirmada.
+
+CREATE TABLE IF NOT EXISTS change_clock (
+    id TINYINT NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO change_clock (id, version) VALUES (1, 0);
+
+-- entity: 'habit' (entity_id = id do hábito), 'record' (entity_id =
+-- habit_id, com record_date) ou 'reset' (todos os dados foram trocados)
+CREATE TABLE IF NOT EXISTS change_log (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    entity VARCHAR(10) NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    entity_id INT NULL,
+    record_date DATE NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_change_log_version (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,22 @@
+-- Tarefas em segundo plano (veja jobs.py).
+--
+-- Cada linha é uma operação longa disparada por uma rota (ex.:
+-- delete_all_data?async=1). O worker que a executa atualiza status e
+-- progress a cada lote confirmado, então qualquer processo consegue
+-- responder ao GET /jobs/<id>. owner é host:pid de quem está executando.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    kind VARCHAR(32) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    params TEXT NULL,
+    progress TEXT NULL,
+    result TEXT NULL,
+    error TEXT NULL,
+    owner VARCHAR(128) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    KEY idx_jobs_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
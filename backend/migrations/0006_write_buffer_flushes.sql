@@ -0,0 +1,9 @@
+-- Segmentos do diário do buffer de escrita já gravados (veja
+-- write_buffer.py). A linha é inserida na mesma transação que aplica o
+-- segmento; ao reaplicar diários depois de uma queda, segmentos com linha
+-- aqui são pulados. Cada processo mantém só a marca do último segmento.
+
+CREATE TABLE IF NOT EXISTS write_buffer_flushes (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
@@ -0,0 +1,71 @@
+-- Índices da 0001 em bancos criados antes das migrações. Nesses bancos as
+-- tabelas já existiam, então os CREATE TABLE IF NOT EXISTS da 0001 não
+-- fizeram nada e os índices das consultas quentes nunca foram criados.
+--
+-- Cada passo confere information_schema antes e só roda o ALTER TABLE que
+-- falta, então a migração também passa em bancos criados pela 0001.
+--   * habit_records com chave primária só em id passa a ser agrupada por
+--     (habit_id, record_date), como na 0001; id continua único. Falha se
+--     houver dias repetidos para o mesmo hábito: junte-os antes.
+--   * Os índices secundários são criados pelo nome usado na 0001.
+
+SET @ddl = IF(
+    (SELECT GROUP_CONCAT(column_name ORDER BY seq_in_index)
+     FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'habit_records'
+       AND index_name = 'PRIMARY') = 'id',
+    'ALTER TABLE habit_records
+         DROP PRIMARY KEY,
+         ADD PRIMARY KEY (habit_id, record_date),
+         ADD UNIQUE KEY uq_habit_records_id (id)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'habit_records'
+       AND index_name = 'idx_habit_records_date_habit') = 0,
+    'ALTER TABLE habit_records
+         ADD INDEX idx_habit_records_date_habit (record_date, habit_id, quantity_completed)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'habits'
+       AND index_name = 'idx_habits_created_at_id') = 0,
+    'ALTER TABLE habits ADD INDEX idx_habits_created_at_id (created_at, id)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'habit_categories'
+       AND index_name = 'idx_habit_categories_category') = 0,
+    'ALTER TABLE habit_categories
+         ADD INDEX idx_habit_categories_category (category_id, habit_id)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @ddl = IF(
+    (SELECT COUNT(*) FROM information_schema.statistics
+     WHERE table_schema = DATABASE() AND table_name = 'categories'
+       AND index_name = 'idx_categories_name') = 0,
+    'ALTER TABLE categories ADD INDEX idx_categories_name (name)',
+    'DO 0'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
@@ -0,0 +1,70 @@
+-- Histórico frio de habit_records (veja archive.py).
+--
+--   * habit_records passa a ser particionada por ano de record_date. As
+--     leituras por janela de datas (heatmaps, /all_habit_records) e a
+--     varredura do arquivamento só tocam as partições do intervalo. O
+--     MySQL não aceita chaves estrangeiras em tabelas particionadas, então
+--     as chaves estrangeiras de habit_records saem (o nome vem de
+--     information_schema: em bancos antigos ele foi gerado pelo MySQL):
+--     DELETE /habits/<id> e o import com substituição apagam os registros
+--     explicitamente. Toda chave única precisa conter record_date, daí
+--     uq_habit_records_id (id, record_date).
+--     As partições anuais vão do ano anterior ao da migração até dois anos
+--     à frente; archive.py run (ensure_partitions) cria as seguintes a
+--     partir de p_future, então precisa rodar periodicamente. Partições
+--     esvaziadas não são removidas: conferir que estão vazias e DROP
+--     PARTITION não acontecem de forma atômica.
+--   * habit_record_archive guarda um segmento por hábito e ano arquivado:
+--     day_bitmap (bit i = 1º de janeiro + i, little-endian, até 46 bytes) e
+--     quantities (int32 little-endian, um por bit ligado, em ordem).
+--     first_date/last_date evitam decodificar o segmento para o último
+--     registro do hábito.
+
+SET @ddl = (
+    SELECT IFNULL(
+        CONCAT(
+            'ALTER TABLE habit_records ',
+            GROUP_CONCAT(CONCAT('DROP FOREIGN KEY `', constraint_name, '`') SEPARATOR ', ')
+        ),
+        'DO 0'
+    )
+    FROM information_schema.referential_constraints
+    WHERE constraint_schema = DATABASE() AND table_name = 'habit_records'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+ALTER TABLE habit_records
+    DROP INDEX uq_habit_records_id,
+    ADD UNIQUE KEY uq_habit_records_id (id, record_date);
+
+SET @year = YEAR(CURDATE());
+SET @ddl = CONCAT(
+    'ALTER TABLE habit_records PARTITION BY RANGE COLUMNS (record_date) (',
+    'PARTITION p_history VALUES LESS THAN (''', @year - 1, '-01-01''), ',
+    'PARTITION p', @year - 1, ' VALUES LESS THAN (''', @year, '-01-01''), ',
+    'PARTITION p', @year, ' VALUES LESS THAN (''', @year + 1, '-01-01''), ',
+    'PARTITION p', @year + 1, ' VALUES LESS THAN (''', @year + 2, '-01-01''), ',
+    'PARTITION p', @year + 2, ' VALUES LESS THAN (''', @year + 3, '-01-01''), ',
+    'PARTITION p_future VALUES LESS THAN (MAXVALUE))'
+);
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+CREATE TABLE IF NOT EXISTS habit_record_archive (
+    habit_id INT NOT NULL,
+    year SMALLINT NOT NULL,
+    day_bitmap VARBINARY(46) NOT NULL,
+    quantities BLOB NOT NULL,
+    record_count INT NOT NULL,
+    first_date DATE NOT NULL,
+    last_date DATE NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (habit_id, year),
+    KEY idx_habit_record_archive_year (year, habit_id),
+    CONSTRAINT fk_habit_record_archive_habit FOREIGN KEY (habit_id)
+        REFERENCES habits (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,10 @@
+-- Marcas de flush do buffer de escrita (veja write_buffer.py) com a versão
+-- do registro de alterações confirmada no flush. Um worker que recebe o
+-- segmento de outro (cookie write_buffer_segment) espera a marca aparecer e
+-- usa a versão como piso das réplicas. As marcas não são mais apagadas uma
+-- a uma: as mais antigas que WRITE_BUFFER_FLUSH_RETENTION_DAYS saem pela
+-- data, daí o índice.
+
+ALTER TABLE write_buffer_flushes
+    ADD COLUMN version BIGINT NULL,
+    ADD KEY idx_write_buffer_flushes_flushed_at (flushed_at);
@@ -0,0 +1,86 @@
+-- Esquema do motor SQLite (repository.py), equivalente às migrações
+-- 0001-0004 do MySQL. Novas migrações usam o mesmo número nos dois
+-- diretórios. Datas ficam como texto ISO (AAAA-MM-DD), então a ordem e as
+-- comparações de texto batem com as de data.
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_categories_name ON categories (name);
+
+CREATE TABLE IF NOT EXISTS habits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NULL,
+    count_method VARCHAR(20) NOT NULL,
+    completion_method VARCHAR(20) NOT NULL,
+    target_quantity INT NULL,
+    target_days_per_week INT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_habits_created_at_id ON habits (created_at, id);
+
+CREATE TABLE IF NOT EXISTS habit_categories (
+    habit_id INT NOT NULL REFERENCES habits (id) ON DELETE CASCADE,
+    category_id INT NOT NULL REFERENCES categories (id) ON DELETE CASCADE,
+    PRIMARY KEY (habit_id, category_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_habit_categories_category
+    ON habit_categories (category_id, habit_id);
+
+-- A chave (habit_id, record_date) é a do upsert; id continua existindo
+-- para a resposta de POST /habit_records
+CREATE TABLE IF NOT EXISTS habit_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    habit_id INT NOT NULL REFERENCES habits (id) ON DELETE CASCADE,
+    record_date DATE NOT NULL,
+    quantity_completed INT NOT NULL DEFAULT 1,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (habit_id, record_date)
+);
+CREATE INDEX IF NOT EXISTS idx_habit_records_date_habit
+    ON habit_records (record_date, habit_id, quantity_completed);
+
+CREATE TABLE IF NOT EXISTS habit_streaks (
+    habit_id INT NOT NULL PRIMARY KEY REFERENCES habits (id) ON DELETE CASCADE,
+    current_streak INT NOT NULL DEFAULT 0,
+    run_start_date DATE NULL,
+    last_qualifying_date DATE NULL,
+    longest_streak INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS habit_daily_totals (
+    habit_id INT NOT NULL REFERENCES habits (id) ON DELETE CASCADE,
+    record_date DATE NOT NULL,
+    total_quantity INT NOT NULL DEFAULT 0,
+    record_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, record_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS habit_period_totals (
+    habit_id INT NOT NULL REFERENCES habits (id) ON DELETE CASCADE,
+    period_type VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    total_quantity INT NOT NULL DEFAULT 0,
+    days_completed INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, period_type, period_start)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS change_clock (
+    id INT NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+INSERT OR IGNORE INTO change_clock (id, version) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version BIGINT NOT NULL,
+    entity VARCHAR(10) NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    entity_id INT NULL,
+    record_date DATE NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_version ON change_log (version);
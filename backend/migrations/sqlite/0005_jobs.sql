@@ -0,0 +1,18 @@
+-- Tarefas em segundo plano (veja migrations/0005_jobs.sql e jobs.py).
+-- Sem ON UPDATE no SQLite: jobs.py grava updated_at explicitamente.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    kind VARCHAR(32) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    params TEXT NULL,
+    progress TEXT NULL,
+    result TEXT NULL,
+    error TEXT NULL,
+    owner VARCHAR(128) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
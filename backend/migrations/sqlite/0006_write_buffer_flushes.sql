@@ -0,0 +1,7 @@
+-- Segmentos do diário do buffer de escrita já gravados (veja
+-- migrations/0006_write_buffer_flushes.sql e write_buffer.py).
+
+CREATE TABLE IF NOT EXISTS write_buffer_flushes (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    flushed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
@@ -0,0 +1,17 @@
+-- Histórico frio de habit_records (veja
+-- migrations/0008_habit_record_archive.sql e archive.py). O SQLite não tem
+-- particionamento: só a tabela dos segmentos arquivados.
+
+CREATE TABLE IF NOT EXISTS habit_record_archive (
+    habit_id INT NOT NULL REFERENCES habits (id) ON DELETE CASCADE,
+    year INT NOT NULL,
+    day_bitmap BLOB NOT NULL,
+    quantities BLOB NOT NULL,
+    record_count INT NOT NULL,
+    first_date DATE NOT NULL,
+    last_date DATE NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (habit_id, year)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_habit_record_archive_year
+    ON habit_record_archive (year, habit_id);
@@ -0,0 +1,6 @@
+-- Versão do flush e índice por data nas marcas do buffer de escrita (veja
+-- migrations/0009_write_buffer_flush_versions.sql e write_buffer.py).
+
+ALTER TABLE write_buffer_flushes ADD COLUMN version BIGINT NULL;
+CREATE INDEX IF NOT EXISTS idx_write_buffer_flushes_flushed_at
+    ON write_buffer_flushes (flushed_at);
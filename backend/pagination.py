@@ -0,0 +1,90 @@
+import base64
+import datetime
+import json
+import urllib.parse
+
+from flask import request
+
+# Paginação por chave (keyset): o token carrega os valores de ordenação da
+# última linha devolvida, então a página N custa o mesmo que a primeira.
+
+
+def encode_page_token(values):
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime.date) else value for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(token, size):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("page_token inválido") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("page_token inválido")
+    return values
+
+
+def decode_key_token(token, *converters):
+    # Token com uma conversão por posição (ex.: datetime.date.fromisoformat,
+    # int); ValueError se algum valor não converte
+    values = decode_page_token(token, len(converters))
+    try:
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (TypeError, ValueError) as e:
+        raise ValueError("page_token inválido") from e
+
+
+# Parâmetros que pedem paginação; sem nenhum deles o GET /habits devolve a
+# lista inteira, como antes da paginação
+PAGINATION_ARGS = ("limit", "per_page", "page", "page_token")
+
+
+def wants_pagination(args=None):
+    if args is None:
+        args = request.args
+    return any(name in args for name in PAGINATION_ARGS)
+
+
+def requested_page_size(default, maximum, args=None):
+    # per_page é aceito como sinônimo de limit (usado pelo app Flutter). args
+    # é o request.args de quem não roda no Flask (async_app.py)
+    if args is None:
+        args = request.args
+    limit = args.get("limit", type=int) or args.get("per_page", type=int)
+    if not limit or limit <= 0:
+        return default
+    return min(limit, maximum)
+
+
+def bounded_date_range(start_date_str, end_date_str, default_window_days):
+    # Sem start_date, a consulta fica limitada a uma janela padrão que
+    # termina em end_date (ou hoje)
+    end_date = (
+        datetime.date.fromisoformat(end_date_str)
+        if end_date_str
+        else datetime.date.today()
+    )
+    if start_date_str:
+        start_date = datetime.date.fromisoformat(start_date_str)
+    else:
+        start_date = end_date - datetime.timedelta(days=default_window_days)
+    return start_date, end_date
+
+
+def next_page_headers(token, args=None, base_url=None):
+    if token is None:
+        return {}
+    if args is None:
+        args, base_url = request.args, request.base_url
+    args = args.to_dict()
+    args.pop("page", None)
+    args["page_token"] = token
+    query = urllib.parse.urlencode(sorted(args.items()))
+    return {
+        "X-Next-Page-Token": token,
+        "Link": f'<{base_url}?{query}>; rel="next"',
+    }
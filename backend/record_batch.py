@@ -0,0 +1,142 @@
+import datetime
+
+import archive
+import changes
+import rollups
+import streaks
+from repository import dialect_of
+
+# Escrita de vários registros em uma requisição (sincronização offline).
+# Operações aceitas, aplicadas na ordem em que chegam:
+#   add    - mesma regra de POST /habit_records: hábitos booleanos ficam com
+#            1, os de quantidade/minutos somam quantity_completed
+#   set    - grava o valor final do dia (booleanos: marca como feito)
+#   delete - apaga o registro do dia
+# Operações sobre o mesmo (habit_id, record_date) são combinadas em um único
+# efeito final antes de ir ao banco.
+
+OPERATIONS = ("add", "set", "delete")
+
+RECORD_COLUMNS = ("habit_id", "record_date", "quantity_completed")
+RECORD_KEY = ("habit_id", "record_date")
+
+
+def add_sql(dialect):
+    return dialect.upsert(
+        "habit_records",
+        RECORD_COLUMNS,
+        RECORD_KEY,
+        {
+            "quantity_completed": "habit_records.quantity_completed + "
+            + dialect.new("quantity_completed"),
+            "created_at": "CURRENT_TIMESTAMP",
+        },
+    )
+
+
+def set_sql(dialect):
+    return dialect.upsert(
+        "habit_records",
+        RECORD_COLUMNS,
+        RECORD_KEY,
+        {
+            "quantity_completed": dialect.new("quantity_completed"),
+            "created_at": "CURRENT_TIMESTAMP",
+        },
+    )
+
+
+def parse_operation(item):
+    # Devolve (operação, habit_id, data, quantidade) ou levanta ValueError
+    if not isinstance(item, dict):
+        raise ValueError("Cada operação deve ser um objeto.")
+    op = item.get("op", "add")
+    if op not in OPERATIONS:
+        raise ValueError(f"op inválida: {op}")
+    habit_id = item.get("habit_id")
+    if not isinstance(habit_id, int) or isinstance(habit_id, bool) or habit_id <= 0:
+        raise ValueError("habit_id deve ser um inteiro positivo.")
+    try:
+        record_date = datetime.date.fromisoformat(str(item.get("record_date")))
+    except ValueError:
+        raise ValueError("record_date deve estar no formato AAAA-MM-DD.")
+    quantity = item.get("quantity_completed", 1)
+    if op != "delete" and (
+        not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0
+    ):
+        raise ValueError("quantity_completed deve ser um inteiro não negativo.")
+    return op, habit_id, record_date, quantity
+
+
+def combine(effect, op, quantity, boolean):
+    # effect: None (sem mudança), ("add", n), ("set", n) ou ("delete",)
+    if op == "delete":
+        return ("delete",)
+    if boolean:
+        return ("set", 1)
+    if op == "set":
+        # Zerar um hábito de quantidade equivale a apagar o dia
+        return ("set", quantity) if quantity > 0 else ("delete",)
+    if effect is None:
+        return ("add", quantity)
+    if effect[0] == "delete":
+        return ("set", quantity)
+    return (effect[0], effect[1] + quantity)
+
+
+def apply_effects(cursor, effects, chunk_size=500):
+    # Um executemany por tipo de efeito; como cada chave aparece uma vez, a
+    # ordem entre os grupos não importa
+    adds, sets, deletes = [], [], []
+    for (habit_id, day), effect in effects.items():
+        if effect[0] == "add":
+            adds.append((habit_id, day, effect[1]))
+        elif effect[0] == "set":
+            sets.append((habit_id, day, effect[1]))
+        else:
+            deletes.append((habit_id, day))
+    dialect = dialect_of(cursor)
+    for start in range(0, len(adds), chunk_size):
+        cursor.executemany(add_sql(dialect), adds[start : start + chunk_size])
+    for start in range(0, len(sets), chunk_size):
+        cursor.executemany(set_sql(dialect), sets[start : start + chunk_size])
+    for start in range(0, len(deletes), chunk_size):
+        chunk = deletes[start : start + chunk_size]
+        cursor.execute(
+            "DELETE FROM habit_records WHERE " + dialect.row_in(RECORD_KEY, len(chunk)),
+            tuple(value for key in chunk for value in key),
+        )
+
+
+def write_effects(cursor, habits, effects):
+    # Aplica os efeitos e mantém em dia, na mesma transação, os totais, as
+    # streaks e o registro de alterações. habits: {id: linha de habits}.
+    # Devolve os ids dos hábitos alterados.
+    if not effects:
+        return []
+    # Dias em anos arquivados voltam antes para a camada quente
+    archive.thaw(cursor, effects)
+    apply_effects(cursor, effects)
+    rollups.refresh_days(cursor, effects)
+    days_by_habit = {}
+    for habit_id, record_date in effects:
+        days_by_habit.setdefault(habit_id, []).append(record_date)
+    for habit_id, days in days_by_habit.items():
+        if len(days) == 1:
+            streaks.on_day_changed(cursor, habits[habit_id], days[0])
+        else:
+            # Vários dias do mesmo hábito: uma releitura completa sai mais
+            # barata que uma atualização incremental por dia
+            streaks.recompute_state(cursor, habits[habit_id])
+    changes.log(
+        cursor,
+        [
+            changes.record_change(
+                habit_id,
+                record_date,
+                changes.DELETE if effect[0] == "delete" else changes.UPSERT,
+            )
+            for (habit_id, record_date), effect in effects.items()
+        ],
+    )
+    return sorted(days_by_habit)
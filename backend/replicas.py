@@ -0,0 +1,341 @@
+import functools
+import itertools
+import os
+import threading
+import time
+
+import MySQLdb
+from flask import g, request
+
+import changes
+from db_pool import ConnectionPool, CursorWrappingConnection, PoolTimeout, PooledMySQL
+
+# Separação de leituras e escritas (MYSQL_REPLICAS). Rotas marcadas com
+# @db.read_only leem de uma réplica; todo o resto, inclusive as escritas,
+# usa o primário como antes.
+#
+# Leitura das próprias escritas: toda resposta de escrita bem-sucedida leva a
+# versão do registro de alterações (changes.py) no primário, no cookie
+# last_write_version e no cabeçalho X-Last-Write-Version (que clientes sem
+# cookies podem devolver como cabeçalho). Uma réplica só atende a sessão se
+# já aplicou essa versão (change_clock replicado); senão a leitura vai para o
+# primário. Leituras sem sessão aceitam qualquer réplica saudável.
+#
+# Saúde: cada réplica é checada no máximo a cada REPLICA_HEALTH_CHECK_SECONDS
+# (versão aplicada e, se o usuário puder ver, SHOW REPLICA STATUS). Réplica
+# fora do ar, com a replicação parada ou atrasada mais que
+# REPLICA_MAX_LAG_SECONDS sai da rotação até a próxima checagem boa; sem
+# réplica utilizável, a leitura vai para o primário.
+#
+# Para testar sem replicação de verdade, "mirror" mantém uma cópia do banco
+# no mesmo servidor, atualizada a cada N segundos (uma réplica com atraso
+# de até N segundos):
+#
+#   python replicas.py mirror habit_tracker_replica --every 5
+#   MYSQL_REPLICAS=localhost/habit_tracker_replica python app.py
+#   python replicas.py status
+
+SESSION_COOKIE = "last_write_version"
+SESSION_HEADER = "X-Last-Write-Version"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Intervalo mínimo entre checagens forçadas por uma sessão à frente da réplica
+FORCED_CHECK_SECONDS = 0.05
+
+
+def parse_replicas(value, default_port=3306, default_db=None):
+    # "host[:porta][/banco], ..." -> [(host, porta, banco)]
+    replicas = []
+    for spec in (part.strip() for part in value.split(",")):
+        if not spec:
+            continue
+        address, _, db = spec.partition("/")
+        host, _, port = address.partition(":")
+        replicas.append((host, int(port) if port else default_port, db or default_db))
+    return replicas
+
+
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.version = None
+        self.lag_seconds = None
+        self.checked_at = None
+        self.check_lock = threading.Lock()
+        self.reads = 0
+        self.behind = 0
+        self.failed_checks = 0
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "version": self.version,
+            "lag_seconds": self.lag_seconds,
+            "reads": self.reads,
+            "behind": self.behind,
+            "failed_checks": self.failed_checks,
+            "pool": self.pool.stats(),
+        }
+
+
+class ReplicatedMySQL(PooledMySQL):
+    def __init__(self, app=None, cursor_wrapper=None):
+        self._replicas = []
+        self._replicas_pid = None
+        self._rotation = itertools.count()
+        self._read_floors = []
+        # Maior versão escrita por este processo: leituras de réplicas mais
+        # atrasadas que ela não vão para o cache de respostas
+        self.last_write_version = 0
+        self.primary_fallbacks = 0
+        super().__init__(app, cursor_wrapper)
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.config.setdefault("MYSQL_REPLICAS", "")
+        app.config.setdefault("REPLICA_HEALTH_CHECK_SECONDS", 2.0)
+        app.config.setdefault("REPLICA_MAX_LAG_SECONDS", 30.0)
+        app.config.setdefault("REPLICA_POOL_MAX_SIZE", app.config["MYSQL_POOL_MAX_SIZE"])
+        app.after_request(self._remember_write)
+
+    def replicas(self):
+        # Como o pool do primário, os das réplicas são criados por processo
+        if self._replicas_pid != os.getpid():
+            with self._lock:
+                if self._replicas_pid != os.getpid():
+                    self._replicas = [
+                        self._open_replica(host, port, db)
+                        for host, port, db in parse_replicas(
+                            self.app.config["MYSQL_REPLICAS"],
+                            self.app.config["MYSQL_PORT"],
+                            self.app.config["MYSQL_DB"],
+                        )
+                    ]
+                    self._replicas_pid = os.getpid()
+        return self._replicas
+
+    def _open_replica(self, host, port, db):
+        config = self.app.config
+        kwargs = {**self._connect_kwargs(), "host": host, "port": port}
+        if db:
+            kwargs["db"] = db
+        pool = ConnectionPool(
+            kwargs,
+            # Sem conexões abertas no início: uma réplica fora do ar não
+            # impede o processo de subir
+            min_size=0,
+            max_size=config["REPLICA_POOL_MAX_SIZE"],
+            wait_timeout=config["MYSQL_POOL_TIMEOUT"],
+            recycle_seconds=config["MYSQL_POOL_RECYCLE"],
+            health_check_interval=config["MYSQL_POOL_HEALTH_CHECK_INTERVAL"],
+        )
+        return Replica(f"{host}:{port}/{db or ''}", pool)
+
+    def add_read_floor(self, floor):
+        # floor() -> versão mínima que uma réplica precisa ter para qualquer
+        # leitura deste processo (ex.: o último flush do buffer de escrita)
+        self._read_floors.append(floor)
+
+    def _session_version(self):
+        value = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+        try:
+            return int(value) if value else 0
+        except ValueError:
+            return 0
+
+    def _check(self, replica, max_age):
+        now = time.monotonic()
+        if replica.checked_at is not None and now - replica.checked_at < max_age:
+            return
+        if not replica.check_lock.acquire(blocking=False):
+            # Outro thread já está checando esta réplica
+            return
+        try:
+            connection = replica.pool.acquire()
+            discard = False
+            try:
+                cursor = connection.cursor()
+                version = changes.current_version(cursor)
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                    status = cursor.fetchone()
+                except MySQLdb.Error:
+                    # Servidor antigo ou usuário sem REPLICATION CLIENT: só a versão
+                    status = None
+                cursor.close()
+                lag = status.get("Seconds_Behind_Source") if status else None
+                replica.version = version
+                replica.lag_seconds = lag
+                if status is not None and lag is None:
+                    # Replicação parada
+                    replica.healthy = False
+                else:
+                    replica.healthy = (
+                        lag is None or lag <= self.app.config["REPLICA_MAX_LAG_SECONDS"]
+                    )
+            except MySQLdb.Error:
+                discard = True
+                raise
+            finally:
+                replica.pool.release(connection, discard=discard)
+        except (MySQLdb.Error, PoolTimeout):
+            replica.healthy = False
+            replica.failed_checks += 1
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.check_lock.release()
+
+    def choose_replica(self):
+        replicas = self.replicas()
+        if not replicas:
+            return None
+        required = max(
+            [self._session_version(), *((floor() or 0) for floor in self._read_floors)]
+        )
+        start = next(self._rotation)
+        for offset in range(len(replicas)):
+            replica = replicas[(start + offset) % len(replicas)]
+            self._check(replica, self.app.config["REPLICA_HEALTH_CHECK_SECONDS"])
+            if replica.healthy and (replica.version or 0) < required:
+                self._check(replica, FORCED_CHECK_SECONDS)
+            if not replica.healthy:
+                continue
+            if (replica.version or 0) < required:
+                replica.behind += 1
+                continue
+            replica.reads += 1
+            return replica
+        self.primary_fallbacks += 1
+        return None
+
+    def read_only(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            replica = self.choose_replica()
+            if replica is not None:
+                g.replica = replica
+                if (replica.version or 0) < self.last_write_version:
+                    # Escritas deste processo já invalidaram o cache e a
+                    # réplica ainda não as tem: não guarda esta resposta
+                    g.uncacheable_response = True
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def using_replica(self):
+        return g.get("replica") is not None
+
+    @property
+    def connection(self):
+        replica = g.get("replica")
+        if replica is None:
+            return super().connection
+        if "replica_connection" not in g:
+            try:
+                connection = replica.pool.acquire()
+            except (MySQLdb.Error, PoolTimeout):
+                # Caiu depois da checagem: esta requisição segue no primário
+                replica.healthy = False
+                g.replica = None
+                return super().connection
+            g.replica_connection = connection
+            if self.cursor_wrapper is not None:
+                connection = CursorWrappingConnection(connection, self.cursor_wrapper)
+            g.replica_connection_view = connection
+        return g.replica_connection_view
+
+    def _remember_write(self, response):
+        if (
+            request.method not in WRITE_METHODS
+            or response.status_code >= 400
+            or "mysql_connection" not in g
+        ):
+            return response
+        cursor = g.mysql_connection.cursor()
+        version = changes.current_version(cursor)
+        cursor.close()
+        self.last_write_version = max(self.last_write_version, version)
+        response.headers[SESSION_HEADER] = str(version)
+        response.set_cookie(SESSION_COOKIE, str(version), httponly=True, samesite="Lax")
+        return response
+
+    def teardown(self, exception):
+        g.pop("replica_connection_view", None)
+        connection = g.pop("replica_connection", None)
+        replica = g.pop("replica", None)
+        if connection is not None and not replica.pool.release(connection):
+            # A conexão não respondeu ao ROLLBACK: a réplica pode ter caído
+            replica.healthy = False
+        super().teardown(exception)
+
+    def stats(self):
+        stats = super().stats()
+        stats["primary_fallbacks"] = self.primary_fallbacks
+        stats["last_write_version"] = self.last_write_version
+        if self._replicas_pid == os.getpid():
+            stats["replicas"] = [replica.stats() for replica in self._replicas]
+        return stats
+
+
+def mirror(replica_db, every):
+    # Réplica simulada: copia as tabelas de MYSQL_DB para replica_db, no mesmo
+    # servidor, a cada `every` segundos, cada cópia em uma transação
+    import migrate
+
+    connection = migrate.connect()
+    source_db = connection.db.decode() if isinstance(connection.db, bytes) else connection.db
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{replica_db}`")
+    connection.select_db(replica_db)
+    migrate.upgrade(connection)
+    cursor = connection.cursor()
+    cursor.execute(
+        """
+        SELECT table_name AS name FROM information_schema.tables
+        WHERE table_schema = %s AND table_type = 'BASE TABLE'
+          AND table_name <> 'schema_migrations'
+        """,
+        (source_db,),
+    )
+    tables = [row["name"] for row in cursor.fetchall()]
+    while True:
+        started = time.monotonic()
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        for table in tables:
+            cursor.execute(f"DELETE FROM `{replica_db}`.`{table}`")
+            cursor.execute(
+                f"INSERT INTO `{replica_db}`.`{table}` SELECT * FROM `{source_db}`.`{table}`"
+            )
+        connection.commit()
+        cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+        print(f"{len(tables)} tabelas copiadas em {time.monotonic() - started:.2f}s", flush=True)
+        time.sleep(every)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    mirror_parser = commands.add_parser("mirror", help="réplica simulada com atraso")
+    mirror_parser.add_argument("replica_db")
+    mirror_parser.add_argument("--every", type=float, default=5.0)
+    commands.add_parser("status", help="checa as réplicas de MYSQL_REPLICAS")
+    args = parser.parse_args()
+
+    if args.command == "mirror":
+        mirror(args.replica_db, args.every)
+    else:
+        from app import app, db
+
+        if not isinstance(db, ReplicatedMySQL):
+            print("MYSQL_REPLICAS não configurado.")
+            raise SystemExit(2)
+        with app.app_context():
+            for replica in db.replicas():
+                db._check(replica, 0)
+            print(json.dumps(db.stats(), indent=2, default=str))
@@ -0,0 +1,375 @@
+# Camada de acesso a dados com dois motores, escolhidos por DATABASE_ENGINE:
+#
+#   mysql  - PooledMySQL (db_pool.py), o padrão
+#   sqlite - SQLiteRepository, um arquivo local em modo WAL, para instalações
+#            de um nó só e para rodar benchmarks e checagens no mesmo processo
+#
+# Os dois entregam uma conexão DB-API com a mesma cara (cursor(), execute com
+# %s, linhas como dict, commit/rollback). O SQL comum fica onde está; o que é
+# específico de cada banco (upsert, INSERT IGNORE, funções de data, checagem
+# de FK) é gerado pelo dialeto, obtido com dialect_of(cursor).
+import datetime
+import decimal
+import functools
+import os
+import re
+import sqlite3
+import threading
+
+import MySQLdb.cursors
+from flask import g
+
+from db_pool import CursorWrappingConnection, PooledMySQL
+
+
+class MySQLDialect:
+    name = "mysql"
+
+    def new(self, column):
+        # Valor que a linha teria recebido no INSERT, dentro do upsert
+        return f"VALUES({column})"
+
+    def upsert(self, table, columns, conflict_columns, updates):
+        assignments = ", ".join(f"{column} = {value}" for column, value in updates.items())
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {assignments}"
+        )
+
+    def insert_ignore(self, table, columns):
+        return (
+            f"INSERT IGNORE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+
+    def row_in(self, columns, count):
+        row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        return f"({', '.join(columns)}) IN ({', '.join([row] * count)})"
+
+    def week_start(self, column):
+        return f"DATE_SUB({column}, INTERVAL WEEKDAY({column}) DAY)"
+
+    def month_start(self, column):
+        return f"DATE_SUB({column}, INTERVAL DAYOFMONTH({column}) - 1 DAY)"
+
+    def days_between(self, later, earlier):
+        return f"DATEDIFF({later}, {earlier})"
+
+    def cast_int(self, expression):
+        return f"CAST({expression} AS SIGNED)"
+
+    def days_ago(self, placeholder):
+        return f"NOW() - INTERVAL {placeholder} DAY"
+
+    def for_update(self):
+        return " FOR UPDATE"
+
+    def set_foreign_key_checks(self, cursor, enabled):
+        cursor.execute(f"SET FOREIGN_KEY_CHECKS={1 if enabled else 0}")
+
+    def next_version(self, cursor, table):
+        # LAST_INSERT_ID(expr) devolve o novo valor sem outro SELECT
+        cursor.execute(f"UPDATE {table} SET version = LAST_INSERT_ID(version + 1) WHERE id = 1")
+        return cursor.lastrowid
+
+
+class SQLiteDialect(MySQLDialect):
+    name = "sqlite"
+
+    def new(self, column):
+        return f"excluded.{column}"
+
+    def upsert(self, table, columns, conflict_columns, updates):
+        assignments = ", ".join(f"{column} = {value}" for column, value in updates.items())
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {assignments}"
+        )
+
+    def insert_ignore(self, table, columns):
+        return (
+            f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+
+    def row_in(self, columns, count):
+        # O SQLite só aceita valores de linha no IN vindos de uma subconsulta.
+        # Com IN (VALUES ...) direto ele varre a tabela; lendo as colunas
+        # (column1, column2, ...) de um SELECT sobre o VALUES, usa o índice.
+        row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        value_columns = ", ".join(f"column{i}" for i in range(1, len(columns) + 1))
+        return (
+            f"({', '.join(columns)}) IN "
+            f"(SELECT {value_columns} FROM (VALUES {', '.join([row] * count)}))"
+        )
+
+    def week_start(self, column):
+        # Próximo domingo (ou o próprio dia) menos seis dias: a segunda-feira
+        return f"date({column}, 'weekday 0', '-6 days')"
+
+    def month_start(self, column):
+        return f"date({column}, 'start of month')"
+
+    def days_between(self, later, earlier):
+        return f"CAST(julianday({later}) - julianday({earlier}) AS INTEGER)"
+
+    def cast_int(self, expression):
+        return f"CAST({expression} AS INTEGER)"
+
+    def days_ago(self, placeholder):
+        # CURRENT_TIMESTAMP do SQLite é UTC, como datetime('now')
+        return f"datetime('now', '-' || {placeholder} || ' days')"
+
+    def for_update(self):
+        # Escritas no SQLite já são serializadas pelo lock do banco
+        return ""
+
+    def set_foreign_key_checks(self, cursor, enabled):
+        # PRAGMA foreign_keys só muda fora de uma transação; dentro de uma,
+        # desligar vira adiar a checagem para o commit. O repositório religa
+        # as checagens ao devolver a conexão.
+        if enabled:
+            cursor.execute("PRAGMA foreign_keys = ON")
+        elif cursor.in_transaction:
+            cursor.execute("PRAGMA defer_foreign_keys = ON")
+        else:
+            cursor.execute("PRAGMA foreign_keys = OFF")
+
+    def next_version(self, cursor, table):
+        # O SQLite tem um único escritor por vez: a transação que fez o
+        # UPDATE é dona do valor até o commit
+        cursor.execute(f"UPDATE {table} SET version = version + 1 WHERE id = 1")
+        cursor.execute(f"SELECT version FROM {table} WHERE id = 1")
+        row = cursor.fetchone()
+        return row["version"] if isinstance(row, dict) else row[0]
+
+
+MYSQL = MySQLDialect()
+SQLITE = SQLiteDialect()
+
+
+def dialect_of(connection_or_cursor):
+    # Cursores e conexões do MySQLdb não têm o atributo: o padrão é MySQL
+    return getattr(connection_or_cursor, "dialect", MYSQL)
+
+
+def open_cursor(connection, dict_rows=True, server_side=False):
+    # Cursor com linhas como dict ou tupla, lidas de uma vez ou sob demanda
+    # (cursor do servidor), sem que quem chama dependa das classes do MySQLdb.
+    # O SQLiteConnection usa a classe só como dica de formato.
+    name = ("SS" if server_side else "") + ("DictCursor" if dict_rows else "Cursor")
+    return connection.cursor(getattr(MySQLdb.cursors, name))
+
+
+# Tipos de data: gravados como texto ISO e lidos de volta como date/datetime
+# pelas colunas declaradas DATE/TIMESTAMP
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(decimal.Decimal, lambda value: str(value))
+sqlite3.register_converter("DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+sqlite3.register_converter(
+    "TIMESTAMP", lambda value: datetime.datetime.fromisoformat(value.decode())
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _sqlite_sql(query):
+    # Parâmetros no estilo do MySQLdb (%s, com %% para um % literal) viram ?
+    return re.sub(r"%([s%])", lambda match: "?" if match.group(1) == "s" else "%", query)
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor, dict_rows):
+        self._cursor = cursor
+        self._dict_rows = dict_rows
+        self.dialect = SQLITE
+
+    def execute(self, query, args=None):
+        self._cursor.execute(_sqlite_sql(query), tuple(args or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        self._cursor.executemany(_sqlite_sql(query), [tuple(row) for row in args])
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def in_transaction(self):
+        return self._cursor.connection.in_transaction
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, connection):
+        self._connection = connection
+        self.dialect = SQLITE
+
+    def cursor(self, cursorclass=None):
+        # Aceita as classes de cursor do MySQLdb como dica de formato: as de
+        # nome *DictCursor (e o padrão) devolvem dicts, as outras tuplas. No
+        # SQLite todo cursor já lê as linhas sob demanda.
+        dict_rows = cursorclass is None or "Dict" in cursorclass.__name__
+        return _SQLiteCursor(self._connection.cursor(), dict_rows)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+
+def connect_sqlite(path, busy_timeout_ms=5000, cache_size_kb=65536, mmap_size_mb=256):
+    connection = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+        # Cache de comandos preparados por conexão
+        cached_statements=256,
+        timeout=busy_timeout_ms / 1000.0,
+    )
+    connection.execute("PRAGMA journal_mode = WAL")
+    # Com WAL, NORMAL só perde as últimas transações numa queda de energia,
+    # nunca corrompe o banco
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    connection.execute(f"PRAGMA cache_size = -{int(cache_size_kb)}")
+    connection.execute(f"PRAGMA mmap_size = {int(mmap_size_mb) * 1024 * 1024}")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    return SQLiteConnection(connection)
+
+
+class SQLiteRepository:
+    # Mesma interface do PooledMySQL: db.connection devolve a conexão do
+    # contexto atual. Cada thread reaproveita a sua conexão com o arquivo.
+    def __init__(self, app=None, cursor_wrapper=None):
+        self.app = app
+        self.cursor_wrapper = cursor_wrapper
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._migrated_pid = None
+        self.counters = {"opened": 0, "acquired": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("SQLITE_PATH", "habit_tracker.db")
+        app.config.setdefault("SQLITE_BUSY_TIMEOUT_MS", 5000)
+        app.config.setdefault("SQLITE_CACHE_SIZE_KB", 65536)
+        app.config.setdefault("SQLITE_MMAP_SIZE_MB", 256)
+        app.config.setdefault("SQLITE_AUTO_MIGRATE", True)
+        app.teardown_appcontext(self.teardown)
+
+    def _open(self):
+        config = self.app.config
+        connection = connect_sqlite(
+            config["SQLITE_PATH"],
+            busy_timeout_ms=config["SQLITE_BUSY_TIMEOUT_MS"],
+            cache_size_kb=config["SQLITE_CACHE_SIZE_KB"],
+            mmap_size_mb=config["SQLITE_MMAP_SIZE_MB"],
+        )
+        with self._lock:
+            self.counters["opened"] += 1
+            if config["SQLITE_AUTO_MIGRATE"] and self._migrated_pid != os.getpid():
+                import migrate
+
+                migrate.upgrade(connection, engine="sqlite")
+                self._migrated_pid = os.getpid()
+        return connection
+
+    @property
+    def connection(self):
+        if "sqlite_connection" not in g:
+            # Conexões não atravessam fork: workers do gunicorn abrem as suas
+            cached = getattr(self._local, "connection", None)
+            if cached is None or self._local.pid != os.getpid():
+                cached = self._local.connection = self._open()
+                self._local.pid = os.getpid()
+            with self._lock:
+                self.counters["acquired"] += 1
+            g.sqlite_connection = cached
+            connection = cached
+            if self.cursor_wrapper is not None:
+                connection = CursorWrappingConnection(cached, self.cursor_wrapper)
+            g.sqlite_connection_view = connection
+        return g.sqlite_connection_view
+
+    def teardown(self, exception):
+        g.pop("sqlite_connection_view", None)
+        connection = g.pop("sqlite_connection", None)
+        if connection is not None:
+            # Encerra qualquer transação aberta antes de a thread reutilizar
+            connection.rollback()
+            connection.cursor().execute("PRAGMA foreign_keys = ON")
+
+    # Sem réplicas: mesma interface do ReplicatedMySQL (replicas.py)
+    using_replica = False
+
+    def read_only(self, view):
+        return view
+
+    def add_read_floor(self, floor):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "engine": "sqlite",
+                "path": self.app.config["SQLITE_PATH"],
+                "connections_opened": self.counters["opened"],
+                "acquired": self.counters["acquired"],
+            }
+
+
+def create_repository(app, cursor_wrapper=None):
+    app.config.setdefault("DATABASE_ENGINE", "mysql")
+    engine = app.config["DATABASE_ENGINE"]
+    if engine == "sqlite":
+        return SQLiteRepository(app, cursor_wrapper)
+    if engine == "mysql":
+        if app.config.get("MYSQL_REPLICAS"):
+            from replicas import ReplicatedMySQL
+
+            return ReplicatedMySQL(app, cursor_wrapper)
+        return PooledMySQL(app, cursor_wrapper)
+    raise ValueError(f"DATABASE_ENGINE desconhecido: {engine}")
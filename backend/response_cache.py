@@ -0,0 +1,324 @@
+import collections
+import datetime
+import functools
+import hashlib
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+import changes
+
+# Cabeçalhos da resposta original que fazem parte do conteúdo em cache
+CACHED_HEADERS = ("Link", "X-Next-Page-Token")
+
+
+class Flight:
+    # Uma resposta sendo calculada; requisições iguais que chegam enquanto
+    # isso esperam por ela em vez de repetir as consultas
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.waiters = 0
+
+
+class ResponseCache:
+    # Cache LRU em memória, com TTL e limite de entradas. Cada entrada tem
+    # etiquetas (ex.: "habit:3") que permitem invalidar só o que uma escrita
+    # afetou.
+    #
+    # Cada worker do gunicorn tem o seu cache, e invalidate() só limpa o do
+    # processo que escreveu. Por isso, antes de cada consulta ao cache,
+    # sync() lê a versão do registro de alterações (changes.py) e invalida as
+    # etiquetas do que os outros processos mudaram desde a última versão
+    # vista, como o completion_index.py faz com o índice. Cada entrada guarda
+    # a versão com que foi calculada.
+    #
+    # Coalescência (RESPONSE_COALESCING_ENABLED): na falta, a primeira
+    # requisição de uma chave calcula a resposta e as idênticas que chegam
+    # durante o cálculo recebem os mesmos bytes. Qualquer invalidação solta
+    # os cálculos em andamento: quem chegar depois da escrita não se junta a
+    # eles e calcula de novo.
+    def __init__(self, app=None, repository=None):
+        self.entries = collections.OrderedDict()
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.repository = None
+        # Última versão do registro de alterações aplicada ao cache
+        self.version = None
+        self.max_entries = 512
+        self.ttl_seconds = 30.0
+        self.enabled = True
+        self.coalescing = True
+        self.coalescing_timeout = 10.0
+        self.counters = collections.Counter()
+        if app is not None:
+            self.init_app(app, repository)
+
+    def init_app(self, app, repository=None):
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", True)
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 512)
+        app.config.setdefault("RESPONSE_CACHE_TTL", 30.0)
+        app.config.setdefault("RESPONSE_COALESCING_ENABLED", True)
+        app.config.setdefault("RESPONSE_COALESCING_TIMEOUT", 10.0)
+        self.enabled = app.config["RESPONSE_CACHE_ENABLED"]
+        self.max_entries = app.config["RESPONSE_CACHE_MAX_ENTRIES"]
+        self.ttl_seconds = app.config["RESPONSE_CACHE_TTL"]
+        self.coalescing = app.config["RESPONSE_COALESCING_ENABLED"]
+        self.coalescing_timeout = app.config["RESPONSE_COALESCING_TIMEOUT"]
+        self.repository = repository
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            if time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                del self.entries[key]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry
+
+    def set(self, key, entry, generation):
+        with self.lock:
+            # Uma escrita aconteceu enquanto a resposta era calculada: o
+            # resultado pode estar velho, então não é guardado
+            if generation != self.generation or (
+                self.version is not None and entry["version"] < self.version
+            ):
+                self.counters["skipped_stale"] += 1
+                return
+            entry["stored_at"] = time.monotonic()
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def join(self, key):
+        # (flight, True) para quem vai calcular; (flight, False) para quem espera
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                return flight, False
+            flight = self.flights[key] = Flight()
+            self.counters["flights"] += 1
+            return flight, True
+
+    def wait(self, flight):
+        # Entrada calculada pelo líder; None se ele falhou, demorou demais ou
+        # a resposta não pode ser compartilhada
+        if not flight.done.wait(self.coalescing_timeout):
+            with self.lock:
+                self.counters["coalescing_timeouts"] += 1
+            return None
+        with self.lock:
+            if flight.entry is None:
+                self.counters["coalescing_fallbacks"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        return flight.entry
+
+    def land(self, key, flight, entry):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.entry = entry
+        flight.done.set()
+
+    def invalidate(self, *tags):
+        with self.lock:
+            self._drop(set(tags))
+
+    def clear(self):
+        with self.lock:
+            self._drop(None)
+
+    def _drop(self, tags):
+        # tags None: tudo. Chamado com o lock.
+        self.generation += 1
+        self.flights.clear()
+        if tags is None:
+            stale = list(self.entries)
+        else:
+            stale = [key for key, entry in self.entries.items() if entry["tags"] & tags]
+        for key in stale:
+            del self.entries[key]
+        self.counters["invalidated"] += len(stale)
+
+    def sync(self, cursor):
+        # Invalida o que mudou no banco desde a última versão vista por este
+        # processo e devolve a versão atual
+        current = changes.current_version(cursor)
+        with self.lock:
+            since = self.version
+            if since is None:
+                self.version = current
+                return current
+            if current <= since:
+                return since
+
+        oldest = changes.oldest_version(cursor)
+        if not changes.log_covers(since, oldest):
+            # O log foi podado além do que o cache viu: descarta tudo
+            delta = {"reset": True, "habits": {}, "records": {}}
+        else:
+            delta = changes.changes_between(cursor, since, current)
+        tags = set()
+        for habit_id in delta["habits"]:
+            # Criar, apagar ou trocar categorias muda as listas de hábitos
+            tags.update((f"habit:{habit_id}", f"records:{habit_id}", "habits", "records"))
+        for habit_id, _ in delta["records"]:
+            tags.update((f"habit:{habit_id}", f"records:{habit_id}", "records"))
+
+        with self.lock:
+            if self.version != since:
+                # Outro thread aplicou o mesmo trecho (ou um maior) antes
+                return max(self.version, current)
+            self._drop(None if delta["reset"] else tags)
+            self.version = current
+            self.counters["syncs"] += 1
+        return current
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.counters["hits"],
+                "misses": self.counters["misses"],
+                "expired": self.counters["expired"],
+                "evictions": self.counters["evictions"],
+                "invalidated": self.counters["invalidated"],
+                "skipped_stale": self.counters["skipped_stale"],
+                "version": self.version,
+                "syncs": self.counters["syncs"],
+                "coalescing_enabled": self.coalescing,
+                "in_flight": len(self.flights),
+                "flights": self.counters["flights"],
+                "coalesced": self.counters["coalesced"],
+                "coalescing_fallbacks": self.counters["coalescing_fallbacks"],
+                "coalescing_timeouts": self.counters["coalescing_timeouts"],
+            }
+
+
+def make_cache_key():
+    # Endpoint + argumentos normalizados; a data de hoje entra na chave
+    # porque streaks e totais do período dependem dela, e o Accept porque
+    # alguns endpoints negociam o formato por ele
+    args = tuple(sorted(request.args.items(multi=True)))
+    return (
+        request.endpoint,
+        request.path,
+        args,
+        request.headers.get("Accept", ""),
+        datetime.date.today().isoformat(),
+    )
+
+
+def add_cache_tags(*tags):
+    if "cache_tags" in g:
+        g.cache_tags.update(tags)
+
+
+def _finish(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
+def _entry_from(response, tags, version):
+    body = response.get_data()
+    return {
+        "body": body,
+        "mimetype": response.mimetype,
+        "headers": {
+            name: response.headers[name] for name in CACHED_HEADERS if name in response.headers
+        },
+        "etag": hashlib.sha1(body).hexdigest(),
+        "last_modified": datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0),
+        "tags": tags,
+        "version": version,
+    }
+
+
+def _response_from(entry, source):
+    response = Response(
+        entry["body"],
+        status=200,
+        mimetype=entry["mimetype"],
+        headers=entry["headers"],
+    )
+    response.headers["X-Cache"] = source
+    return _finish(response, entry["etag"], entry["last_modified"])
+
+
+def cached_response(cache, *static_tags):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not cache.enabled and not cache.coalescing:
+                return view(*args, **kwargs)
+
+            key = make_cache_key()
+            version = 0
+            if cache.enabled and cache.repository is not None:
+                connection = cache.repository.connection
+                cursor = connection.cursor()
+                version = cache.sync(cursor)
+                cursor.close()
+                # Encerra a transação de leitura: a view precisa enxergar o
+                # que for confirmado depois daqui (ex.: flush do buffer)
+                connection.rollback()
+            if cache.enabled:
+                entry = cache.get(key)
+                if entry is not None:
+                    return _response_from(entry, "HIT")
+
+            flight = None
+            if cache.coalescing:
+                flight, leader = cache.join(key)
+                if not leader:
+                    entry = cache.wait(flight)
+                    if entry is not None:
+                        return _response_from(entry, "COALESCED")
+                    # Sem resposta para compartilhar: calcula aqui mesmo
+                    flight = None
+
+            entry = None
+            try:
+                generation = cache.generation
+                g.cache_tags = set(static_tags)
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                if g.get("uncacheable_response"):
+                    # Lida de uma réplica que ainda não tem escritas já
+                    # invalidadas neste processo (replicas.py)
+                    return response
+                replica = g.get("replica")
+                if replica is not None and (replica.version or 0) < version:
+                    # Réplica atrás da versão que o cache já aplicou
+                    return response
+                entry = _entry_from(response, set(g.cache_tags), version)
+            finally:
+                if flight is not None:
+                    cache.land(key, flight, entry)
+
+            if cache.enabled:
+                cache.set(key, entry, generation)
+            response.headers["X-Cache"] = "MISS"
+            return _finish(response, entry["etag"], entry["last_modified"])
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,281 @@
+import datetime
+
+import archive
+from repository import dialect_of
+
+# Totais pré-agregados por hábito: um por dia (habit_daily_totals) e um por
+# semana e por mês (habit_period_totals). As rotas de escrita chamam
+# refresh_day na mesma transação que altera habit_records; cada chamada
+# relê só o dia alterado e os períodos que o contêm (mais os dias deles que
+# já estão no arquivo, archive.py), então os totais nunca acumulam erro.
+
+# Hábitos "weekly" leem o total da semana e "monthly" o do mês; "daily" usa
+# direto o total do dia
+PERIOD_TYPES = ("week", "month")
+
+
+def _period_start_sql(dialect, period_type):
+    # Início do período de record_date, calculado no banco
+    if period_type == "week":
+        return dialect.week_start("record_date")
+    return dialect.month_start("record_date")
+
+
+def period_bounds(period_type, day):
+    if period_type == "day":
+        return day, day
+    if period_type == "week":
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=6)
+    if period_type == "month":
+        start = day.replace(day=1)
+        next_month = (start + datetime.timedelta(days=32)).replace(day=1)
+        return start, next_month - datetime.timedelta(days=1)
+    raise ValueError(f"Período desconhecido: {period_type}")
+
+
+def _as_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def period_totals_query(habit_id, period_start, period_end):
+    return (
+        """
+        SELECT COALESCE(SUM(total_quantity), 0) AS total_quantity, COUNT(*) AS days_completed
+        FROM habit_daily_totals
+        WHERE habit_id = %s AND record_date >= %s AND record_date <= %s
+        """,
+        (habit_id, period_start, period_end),
+    )
+
+
+def refresh_day(cursor, habit_id, record_date):
+    record_date = _as_date(record_date)
+
+    cursor.execute(
+        "DELETE FROM habit_daily_totals WHERE habit_id = %s AND record_date = %s",
+        (habit_id, record_date),
+    )
+    cursor.execute(
+        """
+        INSERT INTO habit_daily_totals (habit_id, record_date, total_quantity, record_count)
+        SELECT habit_id, record_date, SUM(quantity_completed), COUNT(*)
+        FROM habit_records
+        WHERE habit_id = %s AND record_date = %s
+        GROUP BY habit_id, record_date
+        """,
+        (habit_id, record_date),
+    )
+
+    for period_type in PERIOD_TYPES:
+        period_start, period_end = period_bounds(period_type, record_date)
+        cursor.execute(*period_totals_query(habit_id, period_start, period_end))
+        totals = cursor.fetchone()
+        # A semana da virada do ano pode ter dias já arquivados
+        archived = archive.archived_days(cursor, [habit_id], period_start, period_end).get(
+            habit_id, []
+        )
+        total_quantity = totals["total_quantity"] + sum(quantity for _, quantity in archived)
+        days_completed = totals["days_completed"] + len(archived)
+        if days_completed:
+            dialect = dialect_of(cursor)
+            cursor.execute(
+                dialect.upsert(
+                    "habit_period_totals",
+                    ("habit_id", "period_type", "period_start", "total_quantity", "days_completed"),
+                    ("habit_id", "period_type", "period_start"),
+                    {
+                        "total_quantity": dialect.new("total_quantity"),
+                        "days_completed": dialect.new("days_completed"),
+                    },
+                ),
+                (habit_id, period_type, period_start, total_quantity, days_completed),
+            )
+        else:
+            cursor.execute(
+                """
+                DELETE FROM habit_period_totals
+                WHERE habit_id = %s AND period_type = %s AND period_start = %s
+                """,
+                (habit_id, period_type, period_start),
+            )
+
+
+def _row_in(cursor, columns, rows):
+    # "(a, b) IN ((%s, %s), ...)" com os parâmetros achatados
+    clause = dialect_of(cursor).row_in(columns, len(rows))
+    return clause, tuple(value for values in rows for value in values)
+
+
+def refresh_days(cursor, habit_days, chunk_size=500):
+    # Versão em lote de refresh_day para vários (habit_id, record_date): um
+    # punhado de comandos por lote em vez de seis por dia alterado
+    habit_days = sorted({(habit_id, _as_date(day)) for habit_id, day in habit_days})
+    for start in range(0, len(habit_days), chunk_size):
+        chunk = habit_days[start : start + chunk_size]
+        where, params = _row_in(cursor, ("habit_id", "record_date"), chunk)
+        cursor.execute("DELETE FROM habit_daily_totals WHERE " + where, params)
+        cursor.execute(
+            f"""
+            INSERT INTO habit_daily_totals (habit_id, record_date, total_quantity, record_count)
+            SELECT habit_id, record_date, SUM(quantity_completed), COUNT(*)
+            FROM habit_records
+            WHERE {where}
+            GROUP BY habit_id, record_date
+            """,
+            params,
+        )
+
+    dialect = dialect_of(cursor)
+    for period_type in PERIOD_TYPES:
+        period_start_sql = _period_start_sql(dialect, period_type)
+        periods = sorted(
+            {(habit_id, *period_bounds(period_type, day)) for habit_id, day in habit_days}
+        )
+        for start in range(0, len(periods), chunk_size):
+            chunk = periods[start : start + chunk_size]
+            where, params = _row_in(
+                cursor,
+                ("habit_id", "period_start"),
+                [(habit_id, period_start) for habit_id, period_start, _ in chunk],
+            )
+            cursor.execute(
+                "DELETE FROM habit_period_totals WHERE period_type = %s AND " + where,
+                (period_type, *params),
+            )
+            ranges = " OR ".join(
+                ["(habit_id = %s AND record_date >= %s AND record_date <= %s)"] * len(chunk)
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO habit_period_totals
+                    (habit_id, period_type, period_start, total_quantity, days_completed)
+                SELECT habit_id, %s, {period_start_sql},
+                       SUM(total_quantity), COUNT(*)
+                FROM habit_daily_totals
+                WHERE {ranges}
+                GROUP BY habit_id, {period_start_sql}
+                """,
+                (period_type, *(value for period in chunk for value in period)),
+            )
+            _add_archived_days(cursor, period_type, chunk)
+
+
+def _add_archived_days(cursor, period_type, periods):
+    # Soma aos períodos [(habit_id, início, fim)] recalculados os dias deles
+    # que estão no arquivo; só os que começam num ano arquivável consultam
+    totals = {}
+    for habit_id, period_start, period_end in periods:
+        days = archive.archived_days(cursor, [habit_id], period_start, period_end).get(habit_id)
+        if days:
+            totals[(habit_id, period_type, period_start)] = (
+                sum(quantity for _, quantity in days),
+                len(days),
+            )
+    _add_to_periods(cursor, totals)
+
+
+def _habit_filter(column, habit_ids):
+    if habit_ids is None:
+        return "", ()
+    return f" WHERE {column} IN ({', '.join(['%s'] * len(habit_ids))})", tuple(habit_ids)
+
+
+def rebuild(cursor, habit_ids=None, chunk_size=500):
+    # Reconstrói os totais a partir de habit_records, de forma agregada no
+    # próprio banco. Sem habit_ids, reconstrói tudo. Os anos arquivados
+    # (archive.py) ficam no arquivo: os totais diários têm só os dias
+    # quentes, e os dias dos segmentos são somados aos períodos.
+    if habit_ids is not None:
+        habit_ids = sorted(habit_ids)
+        for start in range(0, len(habit_ids), chunk_size):
+            chunk = habit_ids[start : start + chunk_size]
+            _rebuild_chunk(cursor, chunk)
+            _add_archived_periods(cursor, chunk)
+        return
+    _rebuild_chunk(cursor, None)
+    cursor.execute("SELECT DISTINCT habit_id FROM habit_record_archive ORDER BY habit_id")
+    archived_ids = [row["habit_id"] for row in cursor.fetchall()]
+    for start in range(0, len(archived_ids), chunk_size):
+        _add_archived_periods(cursor, archived_ids[start : start + chunk_size])
+
+
+def _rebuild_chunk(cursor, habit_ids):
+    where, params = _habit_filter("habit_id", habit_ids)
+    cursor.execute("DELETE FROM habit_daily_totals" + where, params)
+    cursor.execute("DELETE FROM habit_period_totals" + where, params)
+    cursor.execute(
+        f"""
+        INSERT INTO habit_daily_totals (habit_id, record_date, total_quantity, record_count)
+        SELECT habit_id, record_date, SUM(quantity_completed), COUNT(*)
+        FROM habit_records{where}
+        GROUP BY habit_id, record_date
+        """,
+        params,
+    )
+    for period_type in PERIOD_TYPES:
+        period_start_sql = _period_start_sql(dialect_of(cursor), period_type)
+        cursor.execute(
+            f"""
+            INSERT INTO habit_period_totals
+                (habit_id, period_type, period_start, total_quantity, days_completed)
+            SELECT habit_id, %s, {period_start_sql}, SUM(total_quantity), COUNT(*)
+            FROM habit_daily_totals{where}
+            GROUP BY habit_id, {period_start_sql}
+            """,
+            (period_type, *params),
+        )
+
+
+def _add_archived_periods(cursor, habit_ids):
+    # Soma os dias arquivados aos períodos. A semana da virada do ano pode ter
+    # dias nas duas camadas, então o upsert soma ao total já calculado.
+    cursor.execute(*archive.segments_query(habit_ids))
+    totals = {}
+    for habit_id, days in archive.days_by_habit(cursor.fetchall()).items():
+        for day, quantity in days:
+            for period_type in PERIOD_TYPES:
+                key = (habit_id, period_type, period_bounds(period_type, day)[0])
+                total_quantity, days_completed = totals.get(key, (0, 0))
+                totals[key] = (total_quantity + quantity, days_completed + 1)
+    _add_to_periods(cursor, totals)
+
+
+def _add_to_periods(cursor, totals):
+    # {(habit_id, period_type, period_start): (quantidade, dias)} somados ao
+    # que já estiver em habit_period_totals
+    if not totals:
+        return
+    dialect = dialect_of(cursor)
+    cursor.executemany(
+        dialect.upsert(
+            "habit_period_totals",
+            ("habit_id", "period_type", "period_start", "total_quantity", "days_completed"),
+            ("habit_id", "period_type", "period_start"),
+            {
+                "total_quantity": "total_quantity + " + dialect.new("total_quantity"),
+                "days_completed": "days_completed + " + dialect.new("days_completed"),
+            },
+        ),
+        [(*key, *values) for key, values in totals.items()],
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    from app import app, db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command != "rebuild":
+        print("Uso: python rollups.py rebuild [habit_id ...]")
+        sys.exit(2)
+    habit_ids = [int(value) for value in sys.argv[2:]] or None
+    with app.app_context():
+        cursor = db.connection.cursor()
+        rebuild(cursor, habit_ids)
+        db.connection.commit()
+        cursor.close()
+    print("Totais reconstruídos.")
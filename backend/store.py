@@ -0,0 +1,380 @@
+import heapq
+
+import archive
+import record_batch
+from repository import dialect_of, open_cursor
+
+# Acesso a dados das rotas do app.py: uma função por operação, que recebe o
+# cursor (ou a conexão, quando abre um cursor do servidor) e funciona nos dois
+# motores de repository.py. O que muda entre MySQL e SQLite vem do dialeto;
+# as rotas não montam SQL nem conhecem as classes de cursor do MySQLdb.
+#
+# As consultas quentes têm um construtor *_query que devolve (sql,
+# parâmetros) sem executar, usado também pelo "python migrate.py explain". O
+# SQL do GET /habits fica em habit_queries.py, compartilhado com o
+# async_app.py. Registros de anos arquivados (archive.py) já vêm somados.
+
+# Campos do hábito que as rotas aceitam gravar
+HABIT_FIELDS = (
+    "name",
+    "description",
+    "count_method",
+    "completion_method",
+    "target_quantity",
+    "target_days_per_week",
+)
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def categories_query():
+    return "SELECT id, name FROM categories ORDER BY name ASC", ()
+
+
+def list_categories(cursor):
+    cursor.execute(*categories_query())
+    return cursor.fetchall()
+
+
+def insert_habit(cursor, fields):
+    columns = [field for field in HABIT_FIELDS if field in fields]
+    cursor.execute(
+        f"INSERT INTO habits ({', '.join(columns)}) VALUES ({_placeholders(columns)})",
+        tuple(fields[column] for column in columns),
+    )
+    return cursor.lastrowid
+
+
+def update_habit(cursor, habit_id, fields):
+    columns = [field for field in HABIT_FIELDS if field in fields]
+    if not columns:
+        return
+    cursor.execute(
+        "UPDATE habits SET "
+        + ", ".join(f"{column} = %s" for column in columns)
+        + " WHERE id = %s",
+        (*(fields[column] for column in columns), habit_id),
+    )
+
+
+def delete_habit(cursor, habit_id):
+    # habit_records é particionada no MySQL e não tem chave estrangeira com
+    # ON DELETE CASCADE (migração 0008): os registros saem antes. Devolve
+    # quantos hábitos foram apagados.
+    cursor.execute("DELETE FROM habit_records WHERE habit_id = %s", (habit_id,))
+    return cursor.execute("DELETE FROM habits WHERE id = %s", (habit_id,))
+
+
+def add_habit_categories(cursor, habit_id, category_ids):
+    for category_id in category_ids:
+        cursor.execute(
+            "INSERT INTO habit_categories (habit_id, category_id) VALUES (%s, %s)",
+            (habit_id, category_id),
+        )
+
+
+def replace_habit_categories(cursor, habit_id, category_ids):
+    cursor.execute("DELETE FROM habit_categories WHERE habit_id = %s", (habit_id,))
+    add_habit_categories(cursor, habit_id, category_ids)
+
+
+def habit_info(cursor, habit_id):
+    # Campos de que as escritas de registros precisam (regra de conclusão)
+    cursor.execute(
+        "SELECT id, completion_method, target_quantity FROM habits WHERE id = %s",
+        (habit_id,),
+    )
+    return cursor.fetchone()
+
+
+def habit_infos(cursor, habit_ids):
+    # {id: habit_info} de vários hábitos com uma consulta
+    if not habit_ids:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT id, completion_method, target_quantity FROM habits
+        WHERE id IN ({_placeholders(habit_ids)})
+        """,
+        tuple(habit_ids),
+    )
+    return {habit["id"]: habit for habit in cursor.fetchall()}
+
+
+def write_record(cursor, habit, record_date, quantity):
+    # Mesmas regras do POST /habit_records/batch: booleanos ficam com 1, os
+    # demais somam a quantidade ao registro do dia. Devolve o id da linha.
+    dialect = dialect_of(cursor)
+    if habit["completion_method"] == "boolean":
+        cursor.execute(record_batch.set_sql(dialect), (habit["id"], record_date, 1))
+    else:
+        cursor.execute(record_batch.add_sql(dialect), (habit["id"], record_date, quantity))
+    return cursor.lastrowid
+
+
+def delete_record(cursor, habit_id, record_date):
+    return cursor.execute(
+        "DELETE FROM habit_records WHERE habit_id = %s AND record_date = %s",
+        (habit_id, record_date),
+    )
+
+
+def days_with_totals_query(dialect, keys):
+    return (
+        "SELECT habit_id, record_date FROM habit_daily_totals WHERE "
+        + dialect.row_in(("habit_id", "record_date"), len(keys)),
+        tuple(value for key in keys for value in key),
+    )
+
+
+def days_with_totals(cursor, keys):
+    # Quais pares (habit_id, data) já têm total diário
+    if not keys:
+        return set()
+    cursor.execute(*days_with_totals_query(dialect_of(cursor), keys))
+    return {(row["habit_id"], row["record_date"]) for row in cursor.fetchall()}
+
+
+def habit_records_query(habit_id, start_date, end_date, after=None, limit=None):
+    query = """
+        SELECT record_date, quantity_completed FROM habit_records
+        WHERE habit_id = %s AND record_date >= %s AND record_date <= %s
+    """
+    params = [habit_id, start_date, end_date]
+    if after is not None:
+        query += " AND record_date > %s"
+        params.append(after)
+    query += " ORDER BY record_date ASC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def habit_records_page(cursor, habit_id, start_date, end_date, after=None, limit=None):
+    # [(data, quantidade)] do hábito em [start_date, end_date], depois de after
+    cursor.execute(*habit_records_query(habit_id, start_date, end_date, after, limit))
+    records = [
+        (record["record_date"], record["quantity_completed"]) for record in cursor.fetchall()
+    ]
+    archived = archive.archived_days(
+        cursor, [habit_id], max(start_date, after or start_date), end_date
+    ).get(habit_id)
+    if archived:
+        records = archive.merge_rows(
+            records, [day for day in archived if after is None or day[0] > after]
+        )[:limit]
+    return records
+
+
+def records_by_habit_query(habit_ids, start_date, end_date):
+    # Uma única varredura pelo índice (habit_id, record_date)
+    return (
+        f"""
+        SELECT habit_id, record_date, quantity_completed FROM habit_records
+        WHERE habit_id IN ({_placeholders(habit_ids)})
+          AND record_date >= %s AND record_date <= %s
+        ORDER BY habit_id, record_date
+        """,
+        (*habit_ids, start_date, end_date),
+    )
+
+
+def records_by_habit(cursor, habit_ids, start_date, end_date):
+    # {habit_id: [(data, quantidade)]} de cada hábito pedido, mesmo sem registros
+    cursor.execute(*records_by_habit_query(habit_ids, start_date, end_date))
+    rows_by_habit = {habit_id: [] for habit_id in habit_ids}
+    for record in cursor.fetchall():
+        rows_by_habit[record["habit_id"]].append(
+            (record["record_date"], record["quantity_completed"])
+        )
+    for habit_id, days in archive.archived_days(cursor, habit_ids, start_date, end_date).items():
+        rows_by_habit[habit_id] = archive.merge_rows(rows_by_habit[habit_id], days)
+    return rows_by_habit
+
+
+def analytics_habits_query(habit_ids=None):
+    query = """
+        SELECT id, completion_method, target_quantity, target_days_per_week
+        FROM habits
+    """
+    if habit_ids:
+        query += f" WHERE id IN ({_placeholders(habit_ids)})"
+    return query + " ORDER BY id", tuple(habit_ids or ())
+
+
+def analytics_habits(cursor, habit_ids=None):
+    cursor.execute(*analytics_habits_query(habit_ids))
+    return cursor.fetchall()
+
+
+def all_records_query(start_date, end_date, after=None, limit=None):
+    # Todos os hábitos em ordem de (record_date, habit_id), depois da chave after
+    query = """
+        SELECT habit_id, record_date, quantity_completed FROM habit_records
+        WHERE record_date >= %s AND record_date <= %s
+    """
+    params = [start_date, end_date]
+    if after is not None:
+        last_date, last_habit_id = after
+        query += " AND (record_date > %s OR (record_date = %s AND habit_id > %s))"
+        params.extend([last_date, last_date, last_habit_id])
+    query += " ORDER BY record_date ASC, habit_id ASC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def all_records_page(cursor, start_date, end_date, after=None, limit=None):
+    # Registros (dicts) de todos os hábitos, até limit linhas
+    archived = archive.archived_records(cursor, start_date, end_date, after, limit)
+    cursor.execute(*all_records_query(start_date, end_date, after, limit))
+    records = cursor.fetchall()
+    if archived:
+        records = list(
+            heapq.merge(
+                records,
+                (
+                    {"habit_id": habit_id, "record_date": day, "quantity_completed": quantity}
+                    for day, habit_id, quantity in archived
+                ),
+                key=lambda record: (record["record_date"], record["habit_id"]),
+            )
+        )[:limit]
+    return records
+
+
+def _fetched_rows(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def iter_all_records_rows(connection, start_date, end_date, after, limit, fetch_size):
+    # Mesmas linhas de all_records_page como tuplas (habit_id, record_date,
+    # quantidade), lidas do servidor em blocos de fetch_size. Feche o gerador
+    # (contextlib.closing) se parar antes do fim.
+    cursor = connection.cursor()
+    try:
+        archived = archive.archived_records(cursor, start_date, end_date, after, limit)
+    finally:
+        cursor.close()
+    ss_cursor = open_cursor(connection, dict_rows=False, server_side=True)
+    try:
+        ss_cursor.execute(*all_records_query(start_date, end_date, after, limit))
+        yield from heapq.merge(
+            _fetched_rows(ss_cursor, fetch_size),
+            ((habit_id, day, quantity) for day, habit_id, quantity in archived),
+            key=lambda row: (row[1], row[0]),
+        )
+    finally:
+        ss_cursor.close()
+
+
+def recent_records(cursor, start_date):
+    # Snapshot do /sync; o histórico mais antigo (e o arquivo) fica no
+    # /all_habit_records
+    cursor.execute(
+        """
+        SELECT habit_id, record_date, quantity_completed FROM habit_records
+        WHERE record_date >= %s ORDER BY record_date, habit_id
+        """,
+        (start_date,),
+    )
+    return cursor.fetchall()
+
+
+def records_for_keys(cursor, keys, chunk_size=500):
+    # Registros existentes dos pares (habit_id, data), quentes ou arquivados
+    records = []
+    keys = sorted(keys)
+    for start in range(0, len(keys), chunk_size):
+        chunk = keys[start : start + chunk_size]
+        cursor.execute(
+            "SELECT habit_id, record_date, quantity_completed FROM habit_records WHERE "
+            + dialect_of(cursor).row_in(("habit_id", "record_date"), len(chunk)),
+            tuple(value for key in chunk for value in key),
+        )
+        records.extend(cursor.fetchall())
+    # Dias que o arquivamento moveu depois da escrita
+    for (habit_id, record_date), quantity in sorted(
+        archive.records_for_keys(cursor, keys).items()
+    ):
+        records.append(
+            {"habit_id": habit_id, "record_date": record_date, "quantity_completed": quantity}
+        )
+    return records
+
+
+def habit_fields_query(habit_ids=None):
+    # Todos os campos dos hábitos, em ordem de id
+    query = """
+        SELECT id, name, description, count_method, completion_method,
+               target_quantity, target_days_per_week, created_at
+        FROM habits
+    """
+    params = ()
+    if habit_ids is not None:
+        query += f" WHERE id IN ({_placeholders(habit_ids)})"
+        params = tuple(habit_ids)
+    return query + " ORDER BY id", params
+
+
+def habits_with_category_ids(cursor, habit_ids=None):
+    # Todos os campos do hábito e os ids das suas categorias, em ordem de id
+    if habit_ids is not None and not habit_ids:
+        return []
+    cursor.execute(*habit_fields_query(habit_ids))
+    habits = cursor.fetchall()
+    if not habits:
+        return []
+    category_ids = category_ids_by_habit(cursor, [habit["id"] for habit in habits])
+    for habit in habits:
+        habit["category_ids"] = category_ids.get(habit["id"], [])
+    return habits
+
+
+def category_ids_query(habit_ids=None):
+    # Pares (habit_id, category_id) em ordem, a da chave primária
+    query = "SELECT habit_id, category_id FROM habit_categories"
+    params = ()
+    if habit_ids is not None:
+        query += f" WHERE habit_id IN ({_placeholders(habit_ids)})"
+        params = tuple(habit_ids)
+    return query + " ORDER BY habit_id, category_id", params
+
+
+def group_category_ids(rows):
+    # Linhas de category_ids_query -> {habit_id: [category_id]}
+    by_habit = {}
+    for row in rows:
+        by_habit.setdefault(row["habit_id"], []).append(row["category_id"])
+    return by_habit
+
+
+def category_ids_by_habit(cursor, habit_ids=None):
+    # {habit_id: [category_id]}; sem habit_ids, de todos os hábitos
+    cursor.execute(*category_ids_query(habit_ids))
+    return group_category_ids(cursor.fetchall())
+
+
+def iter_all_records(connection, fetch_size):
+    # Todos os registros (export): os quentes com cursor do servidor, em
+    # blocos de fetch_size e sem fetchall(), e depois os anos arquivados, um
+    # segmento por vez
+    ss_cursor = open_cursor(connection, server_side=True)
+    try:
+        ss_cursor.execute("SELECT habit_id, record_date, quantity_completed FROM habit_records")
+        yield from _fetched_rows(ss_cursor, fetch_size)
+    finally:
+        ss_cursor.close()
+    ss_cursor = open_cursor(connection, server_side=True)
+    try:
+        yield from archive.iter_archived_records(ss_cursor, fetch_size)
+    finally:
+        ss_cursor.close()
@@ -0,0 +1,395 @@
+import datetime
+
+import archive
+from repository import dialect_of
+
+# Estado persistido da streak de cada hábito (tabela habit_streaks, criada
+# pela migração 0002). current_streak é o tamanho da sequência que termina em
+# last_qualifying_date; a leitura só precisa checar se essa data é hoje ou
+# ontem, sem percorrer o histórico.
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def calculate_streak(completed_dates_raw):
+    if not completed_dates_raw:
+        return 0
+    completed_dates = sorted(
+        [
+            d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d))
+            for d in completed_dates_raw
+        ],
+        reverse=True,
+    )
+    current_streak = 0
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+
+    if not completed_dates:
+        return 0
+
+    # Verifica se o hábito foi completado hoje ou ontem para iniciar a contagem
+    if completed_dates[0] == today:
+        current_streak = 1
+        compare_date = yesterday
+    elif completed_dates[0] == yesterday:
+        current_streak = 1
+        compare_date = yesterday - datetime.timedelta(days=1)
+    else:
+        # Se não foi completado nem hoje nem ontem, a streak é 0
+        return 0
+
+    # Continua a contagem para os dias anteriores
+    for i in range(1, len(completed_dates)):
+        if completed_dates[i] == compare_date:
+            current_streak += 1
+            compare_date -= datetime.timedelta(days=1)
+        elif completed_dates[i] < compare_date:
+            # Houve uma quebra na sequência
+            break
+    return current_streak
+
+
+def uses_target(habit):
+    return (
+        habit["completion_method"] in ["quantity", "minutes"]
+        and habit["target_quantity"] is not None
+        and habit["target_quantity"] > 0
+    )
+
+
+def current_streak_from_state(state, today=None):
+    # Leitura O(1): a sequência armazenada só vale se terminou hoje ou ontem
+    if not state or state["last_qualifying_date"] is None:
+        return 0
+    today = today or datetime.date.today()
+    if state["last_qualifying_date"] in (today, today - ONE_DAY):
+        return state["current_streak"]
+    return 0
+
+
+def qualifying_dates_query(habit, start=None, end=None, order="ASC"):
+    # Dias que qualificam nos totais diários (rollups.py), já agregados por dia
+    query = "SELECT record_date FROM habit_daily_totals WHERE habit_id = %s"
+    params = [habit["id"]]
+    if start is not None:
+        query += " AND record_date >= %s"
+        params.append(start)
+    if end is not None:
+        query += " AND record_date <= %s"
+        params.append(end)
+    if uses_target(habit):
+        query += " AND total_quantity >= %s"
+        params.append(habit["target_quantity"])
+    query += f" ORDER BY record_date {order}"
+    return query, tuple(params)
+
+
+def _qualifying_dates(cursor, habit, start=None, end=None, order="ASC"):
+    # Totais diários e anos arquivados (archive.py) em [start, end]
+    cursor.execute(*qualifying_dates_query(habit, start, end, order))
+    dates = [row["record_date"] for row in cursor.fetchall()]
+    archived = [
+        day
+        for day, quantity in archive.archived_days(cursor, [habit["id"]], start, end).get(
+            habit["id"], []
+        )
+        if qualifies(habit, quantity)
+    ]
+    if not archived:
+        return dates
+    # As camadas não têm dias em comum
+    return sorted(dates + archived, reverse=order == "DESC")
+
+
+def qualifies(habit, quantity):
+    # Regra de um dia com um único registro de quantity (dias arquivados)
+    return quantity >= habit["target_quantity"] if uses_target(habit) else True
+
+
+def _run_length(cursor, habit, from_date, step):
+    # Conta dias consecutivos que qualificam a partir de from_date, andando
+    # para trás (step=-1) ou para frente (step=1) até a primeira quebra.
+    if step < 0:
+        dates = _qualifying_dates(cursor, habit, end=from_date, order="DESC")
+    else:
+        dates = _qualifying_dates(cursor, habit, start=from_date)
+    expected = from_date
+    length = 0
+    for record_date in dates:
+        if record_date != expected:
+            break
+        length += 1
+        expected += ONE_DAY * step
+    return length
+
+
+def _day_qualifies(cursor, habit, record_date):
+    cursor.execute(
+        """
+        SELECT record_count, total_quantity FROM habit_daily_totals
+        WHERE habit_id = %s AND record_date = %s
+        """,
+        (habit["id"], record_date),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    if uses_target(habit):
+        return row["total_quantity"] >= habit["target_quantity"]
+    return row["record_count"] > 0
+
+
+def load_state(cursor, habit_id):
+    cursor.execute(
+        """
+        SELECT habit_id, current_streak, run_start_date, last_qualifying_date, longest_streak
+        FROM habit_streaks WHERE habit_id = %s
+        """,
+        (habit_id,),
+    )
+    return cursor.fetchone()
+
+
+def states_query(habit_ids):
+    placeholders = ", ".join(["%s"] * len(habit_ids))
+    return (
+        f"""
+        SELECT habit_id, current_streak, run_start_date, last_qualifying_date, longest_streak
+        FROM habit_streaks WHERE habit_id IN ({placeholders})
+        """,
+        tuple(habit_ids),
+    )
+
+
+def load_states(cursor, habit_ids):
+    if not habit_ids:
+        return {}
+    cursor.execute(*states_query(habit_ids))
+    return {row["habit_id"]: row for row in cursor.fetchall()}
+
+
+STATE_COLUMNS = (
+    "habit_id",
+    "current_streak",
+    "run_start_date",
+    "last_qualifying_date",
+    "longest_streak",
+)
+
+
+def save_state(cursor, state):
+    dialect = dialect_of(cursor)
+    cursor.execute(
+        dialect.upsert(
+            "habit_streaks",
+            STATE_COLUMNS,
+            ("habit_id",),
+            {column: dialect.new(column) for column in STATE_COLUMNS[1:]},
+        ),
+        (
+            state["habit_id"],
+            state["current_streak"],
+            state["run_start_date"],
+            state["last_qualifying_date"],
+            state["longest_streak"],
+        ),
+    )
+
+
+def state_from_dates(habit_id, qualifying_dates):
+    # Percorre as datas (ordenadas, sem repetição) uma única vez
+    state = {
+        "habit_id": habit_id,
+        "current_streak": 0,
+        "run_start_date": None,
+        "last_qualifying_date": None,
+        "longest_streak": 0,
+    }
+    for record_date in qualifying_dates:
+        last = state["last_qualifying_date"]
+        if last is not None and record_date == last + ONE_DAY:
+            state["current_streak"] += 1
+        else:
+            state["current_streak"] = 1
+            state["run_start_date"] = record_date
+        state["last_qualifying_date"] = record_date
+        state["longest_streak"] = max(state["longest_streak"], state["current_streak"])
+    return state
+
+
+def compute_state(cursor, habit):
+    # Sem gravar: usado em leituras de réplica (replicas.py)
+    return state_from_dates(habit["id"], _qualifying_dates(cursor, habit))
+
+
+def state_with_pending(cursor, habit, pending):
+    # Sem gravar, com os incrementos ainda no buffer de escrita
+    # (write_buffer.py) somados ao total de cada dia: {data: quantidade}
+    cursor.execute(
+        "SELECT record_date, total_quantity FROM habit_daily_totals WHERE habit_id = %s"
+        f" AND record_date IN ({', '.join(['%s'] * len(pending))})",
+        (habit["id"], *pending),
+    )
+    totals = {row["record_date"]: row["total_quantity"] for row in cursor.fetchall()}
+    dates = set(_qualifying_dates(cursor, habit))
+    for record_date, quantity in pending.items():
+        if qualifies(habit, totals.get(record_date, 0) + quantity):
+            dates.add(record_date)
+    return state_from_dates(habit["id"], sorted(dates))
+
+
+def recompute_state(cursor, habit):
+    state = compute_state(cursor, habit)
+    save_state(cursor, state)
+    return state
+
+
+def on_day_changed(cursor, habit, record_date):
+    # Atualiza o estado depois que os registros de um único dia mudaram,
+    # relendo apenas a faixa de dias vizinha que pode ter sido afetada.
+    # Os totais diários do dia já devem ter sido atualizados.
+    if not isinstance(record_date, datetime.date):
+        record_date = datetime.date.fromisoformat(str(record_date))
+    state = load_state(cursor, habit["id"])
+    if state is None:
+        return recompute_state(cursor, habit)
+
+    start = state["run_start_date"]
+    last = state["last_qualifying_date"]
+    in_current_run = last is not None and start <= record_date <= last
+
+    if _day_qualifies(cursor, habit, record_date):
+        if in_current_run:
+            return state
+        if last is None or record_date > last + ONE_DAY:
+            state["current_streak"] = 1
+            state["run_start_date"] = record_date
+            state["last_qualifying_date"] = record_date
+        elif record_date == last + ONE_DAY:
+            state["current_streak"] += 1
+            state["last_qualifying_date"] = record_date
+        elif record_date == start - ONE_DAY:
+            # Registro retroativo que encosta na sequência atual (e pode
+            # uni-la a uma sequência anterior)
+            previous = _run_length(cursor, habit, record_date - ONE_DAY, -1)
+            state["current_streak"] += 1 + previous
+            state["run_start_date"] = record_date - ONE_DAY * previous
+        else:
+            # Registro retroativo em uma sequência antiga: só o recorde muda
+            merged = (
+                1
+                + _run_length(cursor, habit, record_date - ONE_DAY, -1)
+                + _run_length(cursor, habit, record_date + ONE_DAY, 1)
+            )
+            state["longest_streak"] = max(state["longest_streak"], merged)
+            save_state(cursor, state)
+            return state
+        state["longest_streak"] = max(state["longest_streak"], state["current_streak"])
+        save_state(cursor, state)
+        return state
+
+    # O dia deixou de qualificar
+    if in_current_run:
+        if state["current_streak"] >= state["longest_streak"]:
+            # A maior sequência encolheu; só uma releitura completa garante o recorde
+            return recompute_state(cursor, habit)
+        if record_date == start and record_date == last:
+            rows = _qualifying_dates(cursor, habit, end=record_date - ONE_DAY, order="DESC")
+            if not rows:
+                state["current_streak"] = 0
+                state["run_start_date"] = None
+                state["last_qualifying_date"] = None
+            else:
+                previous_date = rows[0]
+                length = _run_length(cursor, habit, previous_date, -1)
+                state["current_streak"] = length
+                state["run_start_date"] = previous_date - ONE_DAY * (length - 1)
+                state["last_qualifying_date"] = previous_date
+        elif record_date == last:
+            state["current_streak"] -= 1
+            state["last_qualifying_date"] = last - ONE_DAY
+        else:
+            state["current_streak"] = (last - record_date).days
+            state["run_start_date"] = record_date + ONE_DAY
+        save_state(cursor, state)
+        return state
+
+    if last is not None and record_date < start:
+        # O dia pode ter pertencido a uma sequência antiga; se ela podia ser
+        # a maior, recalcula o recorde
+        merged = (
+            1
+            + _run_length(cursor, habit, record_date - ONE_DAY, -1)
+            + _run_length(cursor, habit, record_date + ONE_DAY, 1)
+        )
+        if merged >= state["longest_streak"]:
+            return recompute_state(cursor, habit)
+    return state
+
+
+def check_consistency(cursor, habit_ids=None, today=None):
+    # Compara o estado armazenado com um recálculo completo via calculate_streak
+    query = "SELECT id, completion_method, target_quantity FROM habits"
+    params = ()
+    if habit_ids:
+        query += " WHERE id IN (" + ", ".join(["%s"] * len(habit_ids)) + ")"
+        params = tuple(habit_ids)
+    cursor.execute(query, params)
+    habits = cursor.fetchall()
+    states = load_states(cursor, [habit["id"] for habit in habits])
+
+    mismatches = []
+    for habit in habits:
+        dates = _qualifying_dates(cursor, habit)
+        expected_current = calculate_streak(dates)
+        expected_longest = state_from_dates(habit["id"], dates)["longest_streak"]
+        state = states.get(habit["id"])
+        stored_current = current_streak_from_state(state, today)
+        stored_longest = state["longest_streak"] if state else None
+        if state is None or (stored_current, stored_longest) != (
+            expected_current,
+            expected_longest,
+        ):
+            mismatches.append(
+                {
+                    "habit_id": habit["id"],
+                    "stored_current_streak": stored_current if state else None,
+                    "expected_current_streak": expected_current,
+                    "stored_longest_streak": stored_longest,
+                    "expected_longest_streak": expected_longest,
+                }
+            )
+    return mismatches
+
+
+def rebuild_all(cursor):
+    cursor.execute("SELECT id, completion_method, target_quantity FROM habits")
+    habits = cursor.fetchall()
+    for habit in habits:
+        recompute_state(cursor, habit)
+    return len(habits)
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from app import app, db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+    with app.app_context():
+        cursor = db.connection.cursor()
+        if command == "rebuild":
+            total = rebuild_all(cursor)
+            db.connection.commit()
+            print(f"Streaks recalculadas para {total} hábitos.")
+        elif command == "check":
+            mismatches = check_consistency(cursor)
+            print(json.dumps(mismatches, indent=2, default=str))
+            cursor.close()
+            sys.exit(1 if mismatches else 0)
+        else:
+            print("Uso: python streaks.py [check|rebuild]")
+            sys.exit(2)
+        cursor.close()
@@ -0,0 +1,89 @@
+import zlib
+
+from flask import Response, request, stream_with_context
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só gzip é oferecido
+    brotli = None
+
+# Tamanho aproximado de cada pedaço enviado ao cliente
+STREAM_BUFFER_BYTES = 64 * 1024
+
+
+def client_accepts_encoding(encoding, accepted=None):
+    if accepted is None:
+        accepted = request.headers.get("Accept-Encoding", "")
+    return any(
+        part.split(";")[0].strip().lower() == encoding for part in accepted.split(",")
+    )
+
+
+def buffered(chunks, buffer_bytes=STREAM_BUFFER_BYTES):
+    # Junta pedaços pequenos (um por registro) em blocos maiores
+    pending = []
+    size = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= buffer_bytes:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b"".join(pending)
+
+
+def negotiate_encoding(accepted=None):
+    if brotli is not None and client_accepts_encoding("br", accepted):
+        return "br"
+    if client_accepts_encoding("gzip", accepted):
+        return "gzip"
+    return None
+
+
+def choose_encoding(compress, accepted=None):
+    # compress=None negocia pelo Accept-Encoding do cliente (br ou gzip);
+    # True força gzip e False desliga a compressão
+    if compress is None:
+        return negotiate_encoding(accepted)
+    return "gzip" if compress else None
+
+
+def compressor(encoding):
+    # (compress, finish) do codificador; também usado pelo async_app.py
+    if encoding == "br":
+        brotli_compressor = brotli.Compressor(quality=5)
+        return brotli_compressor.process, brotli_compressor.finish
+    gzip_compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = cabeçalho gzip
+    return gzip_compressor.compress, gzip_compressor.flush
+
+
+def compressed(chunks, encoding):
+    compress, finish = compressor(encoding)
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def encoding_headers(encoding, headers=None):
+    response_headers = dict(headers or {})
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+        response_headers["Vary"] = "Accept-Encoding"
+    return response_headers
+
+
+def streamed_response(chunks, mimetype, compress=None, headers=None):
+    encoding = choose_encoding(compress)
+    body = buffered(chunks)
+    if encoding:
+        body = compressed(body, encoding)
+    response_headers = encoding_headers(encoding, headers)
+    return Response(
+        stream_with_context(body), mimetype=mimetype, headers=response_headers
+    )
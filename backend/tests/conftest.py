@@ -0,0 +1,131 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Os testes rodam contra o app de verdade (app.py). O motor vem de
+# TEST_DATABASE_ENGINE: "sqlite" (padrão, um arquivo temporário) ou "mysql",
+# que usa MYSQL_HOST/MYSQL_USER/MYSQL_PASSWORD/MYSQL_DB de um banco de teste
+# descartável (as tabelas são esvaziadas antes de cada teste).
+#
+#   cd backend
+#   python -m pytest
+#   TEST_DATABASE_ENGINE=mysql MYSQL_DB=habit_tracker_test python -m pytest
+#
+# Os testes de conformidade (test_store.py) rodam sempre no SQLite e também no
+# MySQL quando TEST_MYSQL_DB aponta para um banco de teste descartável.
+#
+# No MySQL o próprio banco de teste também é configurado como réplica
+# (MYSQL_REPLICAS, réplica sem atraso), então as rotas com @db.read_only
+# passam pelo roteamento de replicas.py; test_replicas.py confere quais.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ENGINE = os.environ.get("TEST_DATABASE_ENGINE", "sqlite")
+os.environ["DATABASE_ENGINE"] = ENGINE
+if ENGINE == "mysql":
+    os.environ.setdefault(
+        "MYSQL_REPLICAS",
+        f"{os.environ.get('MYSQL_HOST', 'localhost')}/{os.environ.get('MYSQL_DB', 'habit_tracker')}",
+    )
+if ENGINE == "sqlite":
+    _sqlite_dir = tempfile.mkdtemp(prefix="habit_tracker_tests_")
+    os.environ["SQLITE_PATH"] = os.path.join(_sqlite_dir, "habit_tracker.db")
+# Cache e buffer de escrita desligados por padrão: cada teste liga o que usa
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+os.environ.setdefault("WRITE_BUFFER_ENABLED", "0")
+
+# Tabelas de dados, filhos antes dos pais
+DATA_TABLES = (
+    "habit_records",
+    "habit_record_archive",
+    "habit_daily_totals",
+    "habit_period_totals",
+    "habit_streaks",
+    "habit_categories",
+    "habits",
+    "categories",
+    "change_log",
+    "jobs",
+    "write_buffer_flushes",
+)
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app as app_module
+
+    if ENGINE == "mysql":
+        import migrate
+
+        connection = migrate.connect()
+        migrate.upgrade(connection)
+        connection.close()
+    return app_module
+
+
+@pytest.fixture
+def app(app_module):
+    flask_app = app_module.app
+    with flask_app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        for table in DATA_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        connection.commit()
+        cursor.close()
+    app_module.response_cache.clear()
+    app_module.response_cache.version = None
+    with app_module.completion_index.lock:
+        app_module.completion_index.entries.clear()
+        app_module.completion_index.version = None
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def create_habit(client, name="Hábito", **fields):
+    payload = {
+        "name": name,
+        "count_method": "daily",
+        "completion_method": "boolean",
+        **fields,
+    }
+    response = client.post("/habits", json=payload)
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()["id"]
+
+
+def add_record(client, habit_id, record_date, quantity=1):
+    response = client.post(
+        "/habit_records",
+        json={
+            "habit_id": habit_id,
+            "record_date": str(record_date),
+            "quantity_completed": quantity,
+        },
+    )
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def create_category(app_module, name):
+    with app_module.app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO categories (name) VALUES (%s)", (name,))
+        category_id = cursor.lastrowid
+        connection.commit()
+        cursor.close()
+    return category_id
+
+
+def query_count(response):
+    # Comandos SQL da requisição, do cabeçalho Server-Timing (metrics.py)
+    timing = response.headers["Server-Timing"]
+    return int(timing.split('desc="', 1)[1].split(" ", 1)[0])
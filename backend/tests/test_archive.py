@@ -0,0 +1,164 @@
+import datetime
+import io
+import json
+
+import pytest
+
+import archive
+import bulk_import
+import migrate
+import rollups
+import store
+
+# Camada arquivada (archive.py) no SQLite: os totais reconstruídos e a
+# paginação de todos os registros precisam dar o mesmo resultado com os anos
+# antigos no arquivo.
+
+OLD_YEAR = datetime.date.today().year - 5
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "archive.db"))
+    connection = migrate.connect("sqlite")
+    migrate.upgrade(connection, engine="sqlite")
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def archived(connection):
+    # Dois hábitos com registros em dois anos antigos, arquivados
+    cursor = connection.cursor()
+    habit_ids = []
+    for name in ("Água", "Leitura"):
+        habit_id = store.insert_habit(
+            cursor,
+            {"name": name, "count_method": "weekly", "completion_method": "quantity"},
+        )
+        habit = store.habit_info(cursor, habit_id)
+        for year in (OLD_YEAR, OLD_YEAR + 1):
+            for offset in range(0, 364, 9):
+                day = datetime.date(year, 1, 1) + datetime.timedelta(days=offset)
+                store.write_record(cursor, habit, day, offset % 5 + 1)
+        habit_ids.append(habit_id)
+    rollups.rebuild(cursor)
+    connection.commit()
+    cursor.close()
+    archive.run(connection, archive.MIN_HORIZON_DAYS)
+    return habit_ids
+
+
+def _rows(connection, query, params=()):
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+PERIODS_SQL = """
+    SELECT habit_id, period_type, period_start, total_quantity, days_completed
+    FROM habit_period_totals ORDER BY habit_id, period_type, period_start
+"""
+
+
+def test_rebuild_keeps_archive_and_period_totals(connection, archived):
+    segments = _rows(connection, "SELECT habit_id, year FROM habit_record_archive")
+    periods = _rows(connection, PERIODS_SQL)
+    assert len(segments) == 4
+
+    cursor = connection.cursor()
+    rollups.rebuild(cursor)
+    rollups.rebuild(cursor, archived[:1])
+    connection.commit()
+    cursor.close()
+
+    assert _rows(connection, "SELECT habit_id, year FROM habit_record_archive") == segments
+    assert _rows(connection, "SELECT COUNT(*) AS n FROM habit_records")[0]["n"] == 0
+    assert _rows(connection, PERIODS_SQL) == periods
+
+
+def test_archived_records_pages_match_full_list(connection, archived):
+    start = datetime.date(OLD_YEAR, 1, 1)
+    end = datetime.date(OLD_YEAR + 1, 12, 31)
+    cursor = connection.cursor()
+    everything = archive.archived_records(cursor, start, end)
+    pages = []
+    after = None
+    while True:
+        page = archive.archived_records(cursor, start, end, after, limit=7)
+        if not page:
+            break
+        pages.extend(page)
+        after = page[-1][:2]
+    cursor.close()
+
+    assert len(everything) == 2 * 2 * len(range(0, 364, 9))
+    assert everything == sorted(everything)
+    assert pages == everything
+
+
+def test_merge_import_thaws_only_imported_years(connection, archived):
+    day = datetime.date(OLD_YEAR, 1, 2)
+    body = json.dumps(
+        {"habit_records": [{"habit_id_json": archived[0], "record_date": day.isoformat(), "quantity_completed": 9}]}
+    )
+    bulk_import.run_import(
+        connection, bulk_import.iter_json_sections(io.BytesIO(body.encode())), "merge"
+    )
+
+    segments = _rows(
+        connection, "SELECT habit_id, year FROM habit_record_archive ORDER BY habit_id, year"
+    )
+    assert [(row["habit_id"], row["year"]) for row in segments] == [
+        (archived[0], OLD_YEAR + 1),
+        (archived[1], OLD_YEAR),
+        (archived[1], OLD_YEAR + 1),
+    ]
+    hot = _rows(
+        connection,
+        "SELECT record_date, quantity_completed FROM habit_records WHERE habit_id = %s "
+        "AND record_date = %s",
+        (archived[0], day),
+    )
+    assert [row["quantity_completed"] for row in hot] == [9]
+
+
+def test_refresh_keeps_archived_days_of_the_new_year_week(connection, monkeypatch):
+    # 31/12/2020 é uma quinta: a semana de 28/12 tem dias de 2020, arquivado,
+    # e de 2021, que continua quente
+    monkeypatch.setattr(archive, "oldest_hot_year", lambda today=None: 2021)
+    week_start = datetime.date(2020, 12, 28)
+    cursor = connection.cursor()
+    habit_id = store.insert_habit(
+        cursor, {"name": "Água", "count_method": "weekly", "completion_method": "quantity"}
+    )
+    habit = store.habit_info(cursor, habit_id)
+    for day, quantity in (((2020, 12, 29), 2), ((2020, 12, 31), 3), ((2021, 1, 2), 4)):
+        store.write_record(cursor, habit, datetime.date(*day), quantity)
+    rollups.rebuild(cursor)
+    connection.commit()
+    cursor.close()
+    archive.run(connection, archive.MIN_HORIZON_DAYS, today=datetime.date(2022, 6, 1))
+    segments = _rows(connection, "SELECT year FROM habit_record_archive")
+    assert [row["year"] for row in segments] == [2020]
+
+    def week_totals():
+        rows = _rows(
+            connection,
+            "SELECT total_quantity, days_completed FROM habit_period_totals "
+            "WHERE habit_id = %s AND period_type = 'week' AND period_start = %s",
+            (habit_id, week_start),
+        )
+        return [(row["total_quantity"], row["days_completed"]) for row in rows]
+
+    cursor = connection.cursor()
+    store.write_record(cursor, habit, datetime.date(2021, 1, 3), 1)
+    rollups.refresh_day(cursor, habit_id, datetime.date(2021, 1, 3))
+    assert week_totals() == [(10, 4)]
+    rollups.refresh_days(cursor, [(habit_id, datetime.date(2021, 1, 2))])
+    assert week_totals() == [(10, 4)]
+    rollups.rebuild(cursor, [habit_id])
+    assert week_totals() == [(10, 4)]
+    cursor.close()
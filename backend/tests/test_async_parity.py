@@ -0,0 +1,68 @@
+import asyncio
+import datetime
+import gzip
+import json
+
+import pytest
+
+import loadtest
+from conftest import ENGINE, add_record, create_category, create_habit
+
+# As rotas de async_app.py precisam devolver o mesmo corpo que o app Flask
+# (mesmas rotas de loadtest.py --check-against). A variante assíncrona só
+# existe no MySQL.
+
+pytestmark = pytest.mark.skipif(
+    ENGINE != "mysql", reason="a variante assíncrona só roda no MySQL"
+)
+
+
+def _decoded(status, headers, body):
+    # (status, corpo decodificado, token da próxima página), como loadtest.py
+    if headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    text = body.decode("utf-8")
+    if headers.get("Content-Type", "").startswith("application/x-ndjson"):
+        decoded = [json.loads(line) for line in text.splitlines() if line]
+    else:
+        decoded = json.loads(text)
+    return status, decoded, headers.get("X-Next-Page-Token")
+
+
+def _seed(client, app_module):
+    today = datetime.date.today()
+    categories = [create_category(app_module, f"Categoria {i}") for i in range(2)]
+    for i in range(5):
+        habit_id = create_habit(
+            client,
+            f"Hábito {i}",
+            completion_method=("boolean", "quantity")[i % 2],
+            target_quantity=2 if i % 2 else None,
+            category_ids=categories[: i % 2 + 1],
+        )
+        for days_ago in range(i):
+            add_record(client, habit_id, today - datetime.timedelta(days=days_ago), 2)
+
+
+async def _fetch_async(paths):
+    import async_app
+
+    got = {}
+    async with async_app.app.test_app() as test_app:
+        async_client = test_app.test_client()
+        for path in paths:
+            response = await async_client.get(path)
+            got[path] = _decoded(
+                response.status_code, response.headers, await response.get_data()
+            )
+    return got
+
+
+def test_async_routes_match_sync_app(app_module, client):
+    _seed(client, app_module)
+    expected = {}
+    for path in loadtest.PARITY_PATHS:
+        response = client.get(path)
+        expected[path] = _decoded(response.status_code, response.headers, response.get_data())
+
+    assert asyncio.run(_fetch_async(loadtest.PARITY_PATHS)) == expected
@@ -0,0 +1,24 @@
+import datetime
+
+import completion_index
+import streaks
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def test_entry_matches_reference_implementations():
+    assert completion_index.check(cases=1000, seed=7) == []
+
+
+def test_future_day_resets_current_streak_everywhere():
+    today = datetime.date.today()
+    dates = [today - ONE_DAY, today, today + ONE_DAY]
+    entry = completion_index.Entry()
+    for day in dates:
+        entry.set_day(day, True)
+    state = streaks.state_from_dates(0, dates)
+
+    assert streaks.calculate_streak(dates) == 0
+    assert streaks.current_streak_from_state(state, today) == 0
+    assert entry.current_streak(today) == 0
+    assert entry.longest_streak() == state["longest_streak"] == 3
@@ -0,0 +1,60 @@
+import MySQLdb
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rollbacks = 0
+        self.closed = False
+        self.broken = False
+
+    def rollback(self):
+        if self.broken:
+            raise MySQLdb.OperationalError(2006, "MySQL server has gone away")
+        self.rollbacks += 1
+
+    def ping(self):
+        if self.broken:
+            raise MySQLdb.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(db_pool.MySQLdb, "connect", lambda **kwargs: FakeConnection())
+    return ConnectionPool({}, min_size=0, max_size=2)
+
+
+def test_release_rolls_back_and_reuses_connection(pool):
+    connection = pool.acquire()
+    assert pool.release(connection) is True
+    assert connection.rollbacks == 1
+    assert pool.acquire() is connection
+    assert pool.stats()["created"] == 1
+
+
+def test_release_discards_connection_that_fails_rollback(pool):
+    # Falhas que não chegam ao teardown como OperationalError (a rota trata
+    # o erro e responde 500) também não podem devolver uma conexão morta
+    connection = pool.acquire()
+    connection.broken = True
+    assert pool.release(connection) is False
+    assert connection.closed
+    stats = pool.stats()
+    assert stats["idle"] == 0
+    assert stats["in_use"] == 0
+    assert stats["failed_release_checks"] == 1
+    assert pool.acquire() is not connection
+
+
+def test_release_with_discard_skips_rollback(pool):
+    connection = pool.acquire()
+    pool.release(connection, discard=True)
+    assert connection.rollbacks == 0
+    assert connection.closed
+    assert pool.stats()["recycled_on_error"] == 1
@@ -0,0 +1,68 @@
+import datetime
+
+from conftest import add_record, create_category, create_habit, query_count
+
+
+def _seed(client, app_module, count):
+    today = datetime.date.today()
+    categories = [create_category(app_module, f"Categoria {i}") for i in range(3)]
+    for i in range(count):
+        habit_id = create_habit(
+            client,
+            f"Hábito {i}",
+            count_method=("daily", "weekly", "monthly")[i % 3],
+            completion_method=("boolean", "quantity")[i % 2],
+            target_quantity=3 if i % 2 else None,
+            category_ids=categories[: i % 3 + 1],
+        )
+        for days_ago in range(i % 5):
+            add_record(client, habit_id, today - datetime.timedelta(days=days_ago), 2)
+
+
+def _habits_query_count(client):
+    response = client.get("/habits")
+    assert response.status_code == 200
+    # A primeira leitura monta as entradas do índice; conta a segunda
+    response = client.get("/habits")
+    assert response.status_code == 200
+    return len(response.get_json()), query_count(response)
+
+
+def test_habits_query_count_does_not_grow_with_habits(app_module, client):
+    _seed(client, app_module, 3)
+    few_habits, few_queries = _habits_query_count(client)
+    _seed(client, app_module, 30)
+    many_habits, many_queries = _habits_query_count(client)
+
+    assert (few_habits, many_habits) == (3, 33)
+    assert many_queries == few_queries
+
+
+def test_habits_response_fields(app_module, client):
+    today = datetime.date.today()
+    category_id = create_category(app_module, "Saúde")
+    habit_id = create_habit(
+        client,
+        "Água",
+        count_method="weekly",
+        completion_method="quantity",
+        target_quantity=4,
+        category_ids=[category_id],
+    )
+    add_record(client, habit_id, today - datetime.timedelta(days=1), 4)
+    add_record(client, habit_id, today, 2)
+    add_record(client, habit_id, today, 3)
+
+    habit = client.get("/habits").get_json()[0]
+
+    week_start = today - datetime.timedelta(days=today.weekday())
+    expected_days = 2 if today - datetime.timedelta(days=1) >= week_start else 1
+    assert habit["categories"] == [{"id": category_id, "name": "Saúde"}]
+    assert habit["is_completed_today"] is True
+    assert habit["last_completed_date"] == today.isoformat()
+    # Número nos dois motores (DECIMAL no MySQL)
+    assert type(habit["current_period_quantity"]) is int
+    assert habit["current_period_quantity"] == (9 if expected_days == 2 else 5)
+    assert habit["current_period_days_completed"] == expected_days
+    assert habit["current_streak"] == 2
+    assert habit["longest_streak"] == 2
@@ -0,0 +1,124 @@
+import json
+import socket
+import subprocess
+import sys
+
+from conftest import create_habit
+
+# Importação replace atômica e limitada e tarefas órfãs (jobs.py).
+
+
+def _import(client, payload, strategy):
+    return client.post(
+        f"/import_data?strategy={strategy}&batch_size=1",
+        data=json.dumps(payload),
+        content_type="application/json",
+    )
+
+
+def _habit_names(client):
+    return sorted(habit["name"] for habit in client.get("/habits").get_json())
+
+
+def test_failed_replace_import_keeps_existing_data(client):
+    create_habit(client, "Existente")
+    payload = {
+        "habits": [
+            {"id_json": 1, "name": "Novo", "count_method": "daily", "completion_method": "boolean"},
+            # Sem name: KeyError depois do primeiro lote
+            {"id_json": 2, "count_method": "daily", "completion_method": "boolean"},
+        ]
+    }
+
+    response = _import(client, payload, "replace")
+
+    assert response.status_code == 400
+    assert _habit_names(client) == ["Existente"]
+
+
+def _habits_payload(*ids):
+    return {
+        "habits": [
+            {"id_json": i, "name": f"Novo {i}", "count_method": "daily", "completion_method": "boolean"}
+            for i in ids
+        ]
+    }
+
+
+def test_replace_import_is_limited_to_one_bounded_transaction(app_module, client, monkeypatch):
+    # Linhas apagadas (o hábito e o estado de streak) + inseridas na única
+    # transação do replace
+    monkeypatch.setitem(app_module.app.config, "IMPORT_REPLACE_MAX_ROWS", 4)
+    create_habit(client, "Existente")
+
+    response = _import(client, _habits_payload(1, 2, 3), "replace")
+
+    assert response.status_code == 413
+    assert _habit_names(client) == ["Existente"]
+
+    response = _import(client, _habits_payload(1, 2), "replace")
+
+    assert response.status_code == 201
+    assert _habit_names(client) == ["Novo 1", "Novo 2"]
+
+
+def test_replace_import_refuses_a_base_over_the_limit(app_module, client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, "IMPORT_REPLACE_MAX_ROWS", 1)
+    create_habit(client, "A")
+    create_habit(client, "B")
+
+    response = _import(client, _habits_payload(1), "replace")
+
+    assert response.status_code == 413
+    assert _habit_names(client) == ["A", "B"]
+
+
+def test_failed_merge_import_keeps_confirmed_batches(client):
+    create_habit(client, "Existente")
+    payload = {
+        "habits": [
+            {"id_json": 1000, "name": "Novo", "count_method": "daily", "completion_method": "boolean"},
+            {"id_json": 1001, "count_method": "daily", "completion_method": "boolean"},
+        ]
+    }
+
+    response = _import(client, payload, "merge")
+
+    assert response.status_code == 400
+    assert _habit_names(client) == ["Existente", "Novo"]
+
+
+def _insert_job(app_module, job_id, status, owner):
+    with app_module.app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO jobs (id, kind, status, owner) VALUES (%s, %s, %s, %s)",
+            (job_id, "import_data", status, owner),
+        )
+        connection.commit()
+        cursor.close()
+
+
+def test_jobs_of_dead_processes_are_marked_failed(app_module, client, monkeypatch):
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    host = socket.gethostname()
+    _insert_job(app_module, "dead", "running", f"{host}:{finished.pid}")
+    _insert_job(app_module, "queued", "queued", f"{host}:{finished.pid}")
+    _insert_job(app_module, "alive", "running", f"{host}:1")
+    _insert_job(app_module, "remote", "running", "outro-host:1")
+    # Simula o primeiro uso num processo novo
+    monkeypatch.setattr(app_module.jobs, "_executor", None)
+
+    statuses = {
+        job_id: client.get(f"/jobs/{job_id}").get_json()["status"]
+        for job_id in ("dead", "queued", "alive", "remote")
+    }
+
+    assert statuses == {
+        "dead": "failed",
+        "queued": "failed",
+        "alive": "running",
+        "remote": "running",
+    }
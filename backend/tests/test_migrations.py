@@ -0,0 +1,58 @@
+import datetime
+import os
+
+import pytest
+
+import migrate
+import store
+from conftest import DATA_TABLES
+
+# Portão de EXPLAIN: as consultas quentes (migrate.hot_queries, montadas pelos
+# mesmos construtores das rotas) precisam usar índice nos dois motores.
+
+DAY = datetime.date(2025, 3, 10)
+
+
+def _seed(connection):
+    cursor = connection.cursor()
+    for number in range(3):
+        habit_id = store.insert_habit(
+            cursor,
+            {
+                "name": f"Hábito {number}",
+                "count_method": "daily",
+                "completion_method": "numeric",
+                "target_quantity": 2,
+            },
+        )
+        habit = store.habit_info(cursor, habit_id)
+        for offset in range(5):
+            store.write_record(cursor, habit, DAY + datetime.timedelta(days=offset), 1)
+    connection.commit()
+    cursor.close()
+
+
+def test_sqlite_hot_queries_use_indexes(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "explain.db"))
+    connection = migrate.connect("sqlite")
+    migrate.upgrade(connection, engine="sqlite")
+    _seed(connection)
+    assert migrate.explain_hot_queries(connection, engine="sqlite") == []
+    connection.close()
+
+
+def test_mysql_hot_queries_use_indexes(monkeypatch):
+    database = os.environ.get("TEST_MYSQL_DB")
+    if not database:
+        pytest.skip("TEST_MYSQL_DB não definido")
+    monkeypatch.setenv("MYSQL_DB", database)
+    connection = migrate.connect("mysql")
+    migrate.upgrade(connection)
+    cursor = connection.cursor()
+    for table in DATA_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+    connection.commit()
+    cursor.close()
+    _seed(connection)
+    assert migrate.explain_hot_queries(connection) == []
+    connection.close()
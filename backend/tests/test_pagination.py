@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+from conftest import add_record, create_habit
+from pagination import encode_page_token
+
+
+def test_habits_without_pagination_args_returns_everything(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, "HABITS_PAGE_SIZE_DEFAULT", 2)
+    ids = {create_habit(client, f"Hábito {i}") for i in range(5)}
+    response = client.get("/habits")
+    assert response.status_code == 200
+    assert {habit["id"] for habit in response.get_json()} == ids
+    assert "X-Next-Page-Token" not in response.headers
+
+
+def test_habits_pages_follow_next_token(client):
+    ids = {create_habit(client, f"Hábito {i}") for i in range(5)}
+    seen = []
+    url = "/habits?limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= 2
+        seen.extend(habit["id"] for habit in page)
+        token = response.headers.get("X-Next-Page-Token")
+        url = f"/habits?limit=2&page_token={token}" if token else None
+    assert sorted(seen) == sorted(ids)
+
+
+def test_habits_page_param_uses_offset(client):
+    for i in range(3):
+        create_habit(client, f"Hábito {i}")
+    assert len(client.get("/habits?page=1&per_page=2").get_json()) == 2
+    assert len(client.get("/habits?page=2&per_page=2").get_json()) == 1
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/habits?page_token=abc",
+        "/habits?page_token=" + encode_page_token(["ontem", 1]),
+        "/habits?page_token=" + encode_page_token(["2024-01-01T00:00:00", "x"]),
+        "/habits/{habit_id}/records?page_token=" + encode_page_token(["2024-13-45"]),
+        "/habits/{habit_id}/records?page_token=" + encode_page_token([17]),
+        "/all_habit_records?page_token=" + encode_page_token(["2024-02-30", 1]),
+        "/all_habit_records?page_token=" + encode_page_token(["2024-01-01", "x"]),
+    ],
+)
+def test_invalid_page_tokens_are_rejected(client, url):
+    habit_id = create_habit(client)
+    response = client.get(url.format(habit_id=habit_id))
+    assert response.status_code == 400
+    assert "page_token" in response.get_json()["error"]
+
+
+def test_heatmap_pages_by_date(client):
+    habit_id = create_habit(client)
+    today = datetime.date.today()
+    days = [today - datetime.timedelta(days=offset) for offset in range(5)]
+    for day in days:
+        add_record(client, habit_id, day)
+
+    seen = []
+    url = f"/habits/{habit_id}/records?limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(record["record_date"] for record in response.get_json())
+        token = response.headers.get("X-Next-Page-Token")
+        url = f"/habits/{habit_id}/records?limit=2&page_token={token}" if token else None
+    assert seen == sorted(day.isoformat() for day in days)
@@ -0,0 +1,48 @@
+import datetime
+
+import pytest
+
+from conftest import ENGINE, add_record, create_habit
+
+# Rotas de leitura que vão para as réplicas (replicas.py). No MySQL o banco de
+# teste é a própria réplica (conftest.py), então cada leitura roteada conta
+# em Replica.reads.
+
+pytestmark = pytest.mark.skipif(ENGINE != "mysql", reason="réplicas só existem no MySQL")
+
+
+def _replica(app_module):
+    with app_module.app.app_context():
+        replicas = app_module.db.replicas()
+    if not replicas:
+        pytest.skip("MYSQL_REPLICAS vazio")
+    return replicas[0]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/habits/{habit_id}/records",
+        "/all_habit_records",
+        "/all_habit_records?format=columnar",
+    ],
+)
+def test_heatmap_reads_go_to_replica(app_module, client, path):
+    habit_id = create_habit(client)
+    add_record(client, habit_id, datetime.date.today())
+    replica = _replica(app_module)
+    reads = replica.reads
+
+    response = client.get(path.format(habit_id=habit_id))
+
+    assert response.status_code == 200
+    assert replica.reads == reads + 1
+
+
+def test_writes_stay_on_primary(app_module, client):
+    replica = _replica(app_module)
+    reads = replica.reads
+
+    create_habit(client)
+
+    assert replica.reads == reads
@@ -0,0 +1,53 @@
+import changes
+from conftest import create_habit
+
+
+def _rename_from_other_worker(app_module, habit_id, name):
+    # Escrita feita por outro processo: só o banco e o registro de alterações
+    # ficam sabendo, o cache deste processo não recebe invalidate()
+    with app_module.app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        cursor.execute("UPDATE habits SET name = %s WHERE id = %s", (name, habit_id))
+        changes.log(cursor, [changes.habit_change(habit_id)])
+        connection.commit()
+        cursor.close()
+
+
+def test_cache_sees_writes_from_other_workers(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.response_cache, "enabled", True)
+    habit_id = create_habit(client, "Ler")
+    other_id = create_habit(client, "Correr")
+
+    assert client.get("/habits").headers["X-Cache"] == "MISS"
+    assert client.get("/habits").headers["X-Cache"] == "HIT"
+    heatmap = f"/habits/{other_id}/records"
+    assert client.get(heatmap).headers["X-Cache"] == "MISS"
+
+    _rename_from_other_worker(app_module, habit_id, "Ler 20 páginas")
+
+    response = client.get("/habits")
+    assert response.headers["X-Cache"] == "MISS"
+    names = {habit["id"]: habit["name"] for habit in response.get_json()}
+    assert names[habit_id] == "Ler 20 páginas"
+    # Só o que a escrita afetou sai do cache
+    assert client.get(heatmap).headers["X-Cache"] == "HIT"
+
+
+def test_cache_clears_everything_after_reset(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.response_cache, "enabled", True)
+    create_habit(client, "Ler")
+    assert client.get("/habits").headers["X-Cache"] == "MISS"
+
+    with app_module.app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM habit_streaks")
+        cursor.execute("DELETE FROM habits")
+        changes.log(cursor, [changes.reset_change("delete_all_data")])
+        connection.commit()
+        cursor.close()
+
+    response = client.get("/habits")
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.get_json() == []
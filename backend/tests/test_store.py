@@ -0,0 +1,192 @@
+import contextlib
+import datetime
+import os
+
+import pytest
+
+import migrate
+import rollups
+import store
+from conftest import DATA_TABLES
+
+# Testes de conformidade dos motores (repository.py): as mesmas operações do
+# store.py rodam no SQLite e, com TEST_MYSQL_DB apontando para um banco de
+# teste descartável, no MySQL, e precisam devolver os mesmos resultados.
+
+DAY = datetime.date(2025, 3, 10)
+
+
+def _day(offset):
+    return DAY + datetime.timedelta(days=offset)
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def connection(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "conformance.db"))
+        connection = migrate.connect("sqlite")
+        migrate.upgrade(connection, engine="sqlite")
+    else:
+        database = os.environ.get("TEST_MYSQL_DB")
+        if not database:
+            pytest.skip("TEST_MYSQL_DB não definido")
+        monkeypatch.setenv("MYSQL_DB", database)
+        connection = migrate.connect("mysql")
+        migrate.upgrade(connection)
+        cursor = connection.cursor()
+        for table in DATA_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        connection.commit()
+        cursor.close()
+    yield connection
+    connection.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def cursor(connection):
+    cursor = connection.cursor()
+    yield cursor
+    cursor.close()
+
+
+def _habit(cursor, name, completion_method="boolean", **fields):
+    return store.insert_habit(
+        cursor,
+        {
+            "name": name,
+            "count_method": "daily",
+            "completion_method": completion_method,
+            **fields,
+        },
+    )
+
+
+def _category(cursor, name):
+    cursor.execute("INSERT INTO categories (name) VALUES (%s)", (name,))
+    return cursor.lastrowid
+
+
+def test_habit_fields_and_categories(connection, cursor):
+    saude = _category(cursor, "Saúde")
+    estudo = _category(cursor, "Estudo")
+    habit_id = _habit(cursor, "Ler", "quantity", target_quantity=20, description="livros")
+    store.add_habit_categories(cursor, habit_id, [saude, estudo])
+    connection.commit()
+
+    assert [category["name"] for category in store.list_categories(cursor)] == [
+        "Estudo",
+        "Saúde",
+    ]
+    assert store.habit_info(cursor, habit_id) == {
+        "id": habit_id,
+        "completion_method": "quantity",
+        "target_quantity": 20,
+    }
+    assert store.habit_info(cursor, habit_id + 1) is None
+
+    store.update_habit(cursor, habit_id, {"name": "Ler mais", "target_quantity": 30, "x": 1})
+    store.replace_habit_categories(cursor, habit_id, [estudo])
+    connection.commit()
+    (habit,) = store.habits_with_category_ids(cursor, [habit_id])
+    assert habit["name"] == "Ler mais"
+    assert habit["description"] == "livros"
+    assert habit["target_quantity"] == 30
+    assert habit["category_ids"] == [estudo]
+    assert isinstance(habit["created_at"], datetime.datetime)
+    assert store.habits_with_category_ids(cursor, []) == []
+    assert store.category_ids_by_habit(cursor) == {habit_id: [estudo]}
+
+    assert store.habit_infos(cursor, [habit_id, habit_id + 1]).keys() == {habit_id}
+    assert store.analytics_habits(cursor) == [
+        {
+            "id": habit_id,
+            "completion_method": "quantity",
+            "target_quantity": 30,
+            "target_days_per_week": None,
+        }
+    ]
+
+
+def test_record_writes_follow_completion_rules(connection, cursor):
+    boolean_id = _habit(cursor, "Meditar")
+    quantity_id = _habit(cursor, "Água", "quantity", target_quantity=8)
+    boolean = store.habit_info(cursor, boolean_id)
+    quantity = store.habit_info(cursor, quantity_id)
+    for _ in range(2):
+        store.write_record(cursor, boolean, DAY, 5)
+        store.write_record(cursor, quantity, DAY, 3)
+    connection.commit()
+
+    assert store.records_by_habit(cursor, [boolean_id, quantity_id], DAY, DAY) == {
+        boolean_id: [(DAY, 1)],
+        quantity_id: [(DAY, 6)],
+    }
+    assert store.delete_record(cursor, boolean_id, DAY) == 1
+    assert store.delete_record(cursor, boolean_id, DAY) == 0
+    assert store.delete_habit(cursor, quantity_id) == 1
+    assert store.delete_habit(cursor, quantity_id) == 0
+    connection.commit()
+    assert store.records_by_habit(cursor, [boolean_id, quantity_id], DAY, DAY) == {
+        boolean_id: [],
+        quantity_id: [],
+    }
+
+
+def _seed_records(connection, cursor):
+    first = _habit(cursor, "A", "quantity")
+    second = _habit(cursor, "B", "quantity")
+    for habit_id, offsets in ((first, (0, 1, 3)), (second, (1, 2, 3))):
+        habit = store.habit_info(cursor, habit_id)
+        for day in map(_day, offsets):
+            store.write_record(cursor, habit, day, habit_id)
+            rollups.refresh_day(cursor, habit_id, day)
+    connection.commit()
+    return first, second
+
+
+def test_record_pages_and_keys(connection, cursor):
+    first, second = _seed_records(connection, cursor)
+    end = _day(30)
+
+    assert store.habit_records_page(cursor, first, DAY, end, limit=2) == [
+        (DAY, first),
+        (_day(1), first),
+    ]
+    assert store.habit_records_page(cursor, first, DAY, end, after=_day(1)) == [
+        (_day(3), first)
+    ]
+
+    expected = [
+        (first, _day(0)),
+        (first, _day(1)),
+        (second, _day(1)),
+        (second, _day(2)),
+        (first, _day(3)),
+        (second, _day(3)),
+    ]
+    page = store.all_records_page(cursor, DAY, end, limit=3)
+    assert [(record["habit_id"], record["record_date"]) for record in page] == expected[:3]
+    after = (page[-1]["record_date"], page[-1]["habit_id"])
+    page = store.all_records_page(cursor, DAY, end, after=after)
+    assert [(record["habit_id"], record["record_date"]) for record in page] == expected[3:]
+
+    rows = store.iter_all_records_rows(connection, DAY, end, after, 10, fetch_size=2)
+    with contextlib.closing(rows):
+        assert [(habit_id, day) for habit_id, day, _ in rows] == expected[3:]
+    exported = sorted(
+        (record["habit_id"], record["record_date"])
+        for record in store.iter_all_records(connection, fetch_size=2)
+    )
+    assert exported == sorted(expected)
+
+    keys = [(first, _day(0)), (first, _day(2)), (second, _day(2))]
+    assert sorted(
+        (record["habit_id"], record["record_date"], record["quantity_completed"])
+        for record in store.records_for_keys(cursor, keys)
+    ) == [(first, _day(0), first), (second, _day(2), second)]
+    assert store.days_with_totals(cursor, keys) == {keys[0], keys[2]}
+    assert [
+        (record["habit_id"], record["record_date"])
+        for record in store.recent_records(cursor, _day(3))
+    ] == expected[4:]
@@ -0,0 +1,109 @@
+import datetime
+import os
+import subprocess
+import sys
+import uuid
+
+import write_buffer
+from conftest import add_record, create_habit
+
+
+def _dead_pid():
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    return finished.pid
+
+
+def _buffer(journal_dir, owner):
+    buffer = write_buffer.WriteBuffer()
+    buffer.journal_dir = str(journal_dir)
+    buffer._owner = owner
+    return buffer
+
+
+def test_dead_journal_is_claimed_by_one_process(tmp_path):
+    host = write_buffer.socket.gethostname()
+    segment_id = uuid.uuid4().hex
+    journal = tmp_path / f"{host}-{_dead_pid()}-{segment_id}{write_buffer.JOURNAL_SUFFIX}"
+    journal.write_text('[1, "2025-03-10", 2]\n[1, "2025-03-10", 3]\n')
+    first = _buffer(tmp_path, f"{host}-{os.getpid()}")
+    second = _buffer(tmp_path, f"{host}-{os.getpid()}-outro")
+
+    first._adopt_dead_journals()
+    second._adopt_dead_journals()
+
+    assert [segment.id for segment in first._sealed] == [segment_id]
+    assert first._sealed[0].entries == {(1, datetime.date(2025, 3, 10)): 5}
+    assert second._sealed == []
+    assert os.listdir(tmp_path) == [os.path.basename(first._sealed[0].path)]
+
+
+def _execute(app_module, query, params=()):
+    with app_module.app.app_context():
+        connection = app_module.db.connection
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        connection.commit()
+        cursor.close()
+    return rows
+
+
+def test_flush_records_version_and_prunes_old_markers(app_module, client, monkeypatch):
+    habit_id = create_habit(client, "Água", completion_method="quantity", target_quantity=8)
+    _execute(
+        app_module,
+        "INSERT INTO write_buffer_flushes (id, flushed_at) VALUES (%s, %s)",
+        ("velho", "2000-01-01 00:00:00"),
+    )
+    buffer = app_module.write_buffer
+    monkeypatch.setattr(buffer, "_pruned_at", None)
+    monkeypatch.setattr(buffer, "flushed_version", 0)
+    segment = write_buffer._Segment(uuid.uuid4().hex, None)
+    segment.add((habit_id, datetime.date(2025, 3, 10)), 3)
+    buffer._sealed.append(segment)
+
+    with app_module.app.app_context():
+        buffer._apply(segment)
+
+    markers = _execute(app_module, "SELECT id, version FROM write_buffer_flushes")
+    assert [marker["id"] for marker in markers] == [segment.id]
+    assert markers[0]["version"] == buffer.flushed_version > 0
+
+
+def test_request_waits_for_segments_of_other_processes(app_module, monkeypatch):
+    flushed = uuid.uuid4().hex
+    missing = uuid.uuid4().hex
+    _execute(
+        app_module,
+        "INSERT INTO write_buffer_flushes (id, version) VALUES (%s, %s)",
+        (flushed, 42),
+    )
+    buffer = app_module.write_buffer
+    monkeypatch.setattr(buffer, "read_wait_seconds", 0.05)
+    monkeypatch.setattr(buffer, "flushed_version", 0)
+    monkeypatch.setattr(buffer, "_resolved", write_buffer.collections.OrderedDict())
+
+    headers = {write_buffer.SEGMENT_HEADER: f"{flushed},{missing},não-é-id"}
+    with app_module.app.test_request_context(headers=headers):
+        buffer._wait_for_segments()
+        assert buffer.read_floor() == 42
+    assert dict(buffer._resolved) == {flushed: 42, missing: 0}
+
+
+def test_habits_count_pending_days_in_streaks(app_module, client, monkeypatch):
+    today = datetime.date.today()
+    habit_id = create_habit(client, "Água", completion_method="quantity", target_quantity=3)
+    add_record(client, habit_id, today - datetime.timedelta(days=1), 3)
+    # Dois incrementos de hoje ainda no buffer: juntos cumprem a meta
+    monkeypatch.setattr(
+        app_module.write_buffer,
+        "request_pending",
+        lambda habit_ids=None: {(habit_id, today): 3},
+    )
+
+    habit = client.get("/habits").get_json()[0]
+
+    assert habit["is_completed_today"] is True
+    assert habit["last_completed_date"] == today.isoformat()
+    assert (habit["current_streak"], habit["longest_streak"]) == (2, 2)
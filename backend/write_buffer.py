@@ -0,0 +1,533 @@
+import atexit
+import collections
+import contextlib
+import datetime
+import functools
+import json
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from flask import g, has_request_context, request
+
+import changes
+import record_batch
+from repository import dialect_of
+
+# Buffer de escrita opcional (WRITE_BUFFER_ENABLED) para os toques em
+# hábitos de quantidade/minutos: POST /habit_records só soma o incremento em
+# memória, por (habit_id, record_date), e um thread grava tudo em uma
+# transação a cada WRITE_BUFFER_WINDOW_MS ou quando o buffer passa de
+# WRITE_BUFFER_MAX_KEYS chaves. Hábitos booleanos continuam síncronos.
+#
+# Leitura das próprias escritas: GET /habits e os endpoints de heatmap somam
+# as quantidades pendentes deste processo ao que veio do banco
+# (consistent_reads). As demais rotas que leem ou alteram registros chamam
+# flush() antes. Entre processos (vários workers do gunicorn ou máquinas), a
+# resposta do toque leva o id do segmento no cookie write_buffer_segment e
+# no cabeçalho X-Write-Buffer-Segment (que clientes sem cookies podem
+# devolver como cabeçalho). Um processo que recebe segmentos que não são
+# seus espera, até WRITE_BUFFER_READ_WAIT_MS, a marca deles em
+# write_buffer_flushes antes de atender; a versão gravada na marca vira piso
+# das réplicas (read_floor).
+#
+# Quedas: cada incremento é anexado ao diário do processo
+# (WRITE_BUFFER_JOURNAL_DIR) antes da resposta. Um segmento do diário vira
+# uma transação no flush, marcada em write_buffer_flushes (migrações 0006 e
+# 0009) com o id do segmento, e o arquivo só é apagado depois do commit. Ao
+# iniciar, cada processo assume os diários de processos mortos da mesma
+# máquina renomeando-os para o seu nome (o rename é atômico: só um processo
+# consegue) e os reaplica, pulando segmentos já marcados. As marcas ficam
+# WRITE_BUFFER_FLUSH_RETENTION_DAYS dias; um diário parado mais que isso
+# (máquina fora do ar) pode ser aplicado de novo. Sem WRITE_BUFFER_FSYNC o
+# diário sobrevive à queda do processo, mas não à do sistema operacional.
+
+JOURNAL_SUFFIX = ".journal"
+SEGMENT_COOKIE = "write_buffer_segment"
+SEGMENT_HEADER = "X-Write-Buffer-Segment"
+# Depois disso o segmento já foi gravado (ou o processo morreu com ele)
+SEGMENT_COOKIE_SECONDS = 60
+MAX_SEGMENTS_PER_REQUEST = 8
+SEGMENT_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+WAIT_POLL_SECONDS = 0.02
+PRUNE_INTERVAL_SECONDS = 3600
+# Segmentos de outros processos já vistos (id -> versão do flush)
+RESOLVED_SEGMENTS_MAX = 1024
+
+
+class _Segment:
+    def __init__(self, segment_id, path):
+        self.id = segment_id
+        self.path = path
+        self.file = None
+        self.entries = {}
+
+    def add(self, key, quantity):
+        self.entries[key] = self.entries.get(key, 0) + quantity
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_journal(path):
+    entries = {}
+    with open(path, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                habit_id, record_date, quantity = json.loads(line)
+                key = (habit_id, datetime.date.fromisoformat(record_date))
+            except ValueError:
+                # Última linha cortada pela queda
+                continue
+            entries[key] = entries.get(key, 0) + quantity
+    return entries
+
+
+def pending_by_habit(pending):
+    # {(habit_id, data): n} -> {habit_id: {data: n}}
+    by_habit = {}
+    for (habit_id, record_date), quantity in pending.items():
+        by_habit.setdefault(habit_id, {})[record_date] = quantity
+    return by_habit
+
+
+def merge_days(rows, extra):
+    # rows: [(data, quantidade)] em ordem de data; extra: {data: incremento}
+    merged = dict(rows)
+    for record_date, quantity in extra.items():
+        merged[record_date] = merged.get(record_date, 0) + quantity
+    return sorted(merged.items())
+
+
+class WriteBuffer:
+    def __init__(self, app=None, repository=None, on_flushed=None):
+        self.app = app
+        self.repository = repository
+        self.on_flushed = on_flushed
+        self.enabled = False
+        self.window_seconds = 0.2
+        self.max_keys = 500
+        self.journal_dir = None
+        self.fsync = False
+        self.read_wait_seconds = 2.0
+        self.retention_days = 7
+        # _lock protege o segmento aberto e a fila; _flush_lock garante um
+        # flush por vez e segura os commits durante leituras com pendências
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._current = None
+        self._sealed = []
+        self._thread = None
+        self._pid = None
+        self._owner = None
+        self._pruned_at = None
+        self._resolved = collections.OrderedDict()
+        # Versão do registro de alterações do último flush deste processo
+        # (piso das leituras em réplicas, veja replicas.py)
+        self.flushed_version = 0
+        self.counters = collections.Counter()
+        if app is not None:
+            self.init_app(app, repository, on_flushed)
+
+    def init_app(self, app, repository, on_flushed=None):
+        self.app = app
+        self.repository = repository
+        self.on_flushed = on_flushed
+        app.config.setdefault("WRITE_BUFFER_ENABLED", False)
+        app.config.setdefault("WRITE_BUFFER_WINDOW_MS", 200)
+        app.config.setdefault("WRITE_BUFFER_MAX_KEYS", 500)
+        app.config.setdefault("WRITE_BUFFER_JOURNAL_DIR", "write_buffer_journal")
+        app.config.setdefault("WRITE_BUFFER_FSYNC", False)
+        app.config.setdefault("WRITE_BUFFER_READ_WAIT_MS", 2000)
+        app.config.setdefault("WRITE_BUFFER_FLUSH_RETENTION_DAYS", 7)
+        self.enabled = app.config["WRITE_BUFFER_ENABLED"]
+        self.window_seconds = app.config["WRITE_BUFFER_WINDOW_MS"] / 1000.0
+        self.max_keys = app.config["WRITE_BUFFER_MAX_KEYS"]
+        self.journal_dir = app.config["WRITE_BUFFER_JOURNAL_DIR"] or None
+        self.fsync = app.config["WRITE_BUFFER_FSYNC"]
+        self.read_wait_seconds = app.config["WRITE_BUFFER_READ_WAIT_MS"] / 1000.0
+        self.retention_days = app.config["WRITE_BUFFER_FLUSH_RETENTION_DAYS"]
+        if self.enabled:
+            # Na primeira requisição do processo: adota diários órfãos e
+            # inicia o thread de flush
+            app.before_request(self._ensure_started)
+            # Antes das rotas (e do cache de respostas): segmentos de outros
+            # processos precisam estar gravados
+            app.before_request(self._wait_for_segments)
+            app.after_request(self._remember_segment)
+            atexit.register(self.close)
+
+    def _ensure_started(self):
+        # O thread e o diário são por processo (workers do gunicorn)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._current = None
+            self._sealed = []
+            self._owner = f"{socket.gethostname()}-{os.getpid()}"
+            if self.journal_dir:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                self._adopt_dead_journals()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="write-buffer", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _adopt_dead_journals(self):
+        # Diários de processos mortos desta máquina entram na fila como
+        # segmentos já fechados; o flush aplica os que ainda não foram gravados
+        host = socket.gethostname()
+        for filename in sorted(os.listdir(self.journal_dir)):
+            if not filename.endswith(JOURNAL_SUFFIX):
+                continue
+            try:
+                file_host, pid, segment_id = filename[: -len(JOURNAL_SUFFIX)].rsplit("-", 2)
+                pid = int(pid)
+            except ValueError:
+                continue
+            if file_host != host or pid == os.getpid() or _process_alive(pid):
+                continue
+            # Assume o diário renomeando-o para este processo; se outro
+            # processo chegou antes, o arquivo não existe mais e o rename falha
+            path = os.path.join(self.journal_dir, f"{self._owner}-{segment_id}{JOURNAL_SUFFIX}")
+            try:
+                os.rename(os.path.join(self.journal_dir, filename), path)
+            except OSError:
+                continue
+            segment = _Segment(segment_id, path)
+            segment.entries = _read_journal(path)
+            self._sealed.append(segment)
+            self.counters["segments_recovered"] += 1
+
+    def _new_segment(self):
+        segment_id = uuid.uuid4().hex
+        path = None
+        if self.journal_dir:
+            path = os.path.join(
+                self.journal_dir, f"{self._owner}-{segment_id}{JOURNAL_SUFFIX}"
+            )
+        segment = _Segment(segment_id, path)
+        if path:
+            segment.file = open(path, "a", encoding="utf-8")
+        return segment
+
+    def add(self, habit_id, record_date, quantity):
+        self._ensure_started()
+        with self._lock:
+            if self._current is None:
+                self._current = self._new_segment()
+            segment = self._current
+            if segment.file is not None:
+                segment.file.write(json.dumps([habit_id, record_date.isoformat(), quantity]) + "\n")
+                segment.file.flush()
+                if self.fsync:
+                    os.fsync(segment.file.fileno())
+            segment.add((habit_id, record_date), quantity)
+            full = len(segment.entries) >= self.max_keys
+            self.counters["increments"] += 1
+        if full:
+            self._wake.set()
+        if has_request_context():
+            g.write_buffer_segment = segment.id
+        return segment.id
+
+    def _seal_current(self):
+        segment = self._current
+        self._current = None
+        if segment.file is not None:
+            segment.file.close()
+            segment.file = None
+        self._sealed.append(segment)
+
+    def pending(self, habit_ids=None):
+        wanted = set(habit_ids) if habit_ids is not None else None
+        totals = {}
+        with self._lock:
+            segments = list(self._sealed)
+            if self._current is not None:
+                segments.append(self._current)
+            for segment in segments:
+                for key, quantity in segment.entries.items():
+                    if wanted is None or key[0] in wanted:
+                        totals[key] = totals.get(key, 0) + quantity
+        return totals
+
+    def has_pending(self):
+        with self._lock:
+            return bool(self._sealed) or (
+                self._current is not None and bool(self._current.entries)
+            )
+
+    @contextlib.contextmanager
+    def reading(self):
+        # Entrega as quantidades pendentes. Havendo alguma, nenhum flush
+        # confirma durante a leitura: o banco e o retrato do buffer ficam
+        # coerentes (nada contado duas vezes, nada some). Sem pendências, o
+        # que já saiu do buffer já está confirmado no banco.
+        if not self.enabled or not self.has_pending():
+            yield {}
+            return
+        with self._flush_lock:
+            yield self.pending()
+
+    def consistent_reads(self, view):
+        # Decorator das rotas que somam as pendências (request_pending)
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.reading() as pending:
+                g.write_buffer_pending = pending
+                return view(*args, **kwargs)
+
+        return wrapper
+
+    def flushed_first(self, view):
+        # Decorator das rotas que leem ou alteram registros sem somar as
+        # pendências: o buffer é gravado antes, na conexão da requisição
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            self.flush()
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    def _request_segments(self):
+        value = request.headers.get(SEGMENT_HEADER) or request.cookies.get(SEGMENT_COOKIE)
+        if not value:
+            return []
+        segment_ids = [segment_id.strip() for segment_id in value.split(",")]
+        return [
+            segment_id for segment_id in segment_ids if SEGMENT_ID_RE.match(segment_id)
+        ][:MAX_SEGMENTS_PER_REQUEST]
+
+    def _wait_for_segments(self):
+        # Segmentos deste processo já são cobertos por consistent_reads e
+        # flushed_first; os dos outros são esperados no banco
+        segment_ids = self._request_segments()
+        if not segment_ids:
+            return
+        floor = 0
+        waiting = []
+        with self._lock:
+            local = {segment.id for segment in self._sealed}
+            if self._current is not None:
+                local.add(self._current.id)
+            for segment_id in segment_ids:
+                if segment_id in local:
+                    continue
+                if segment_id in self._resolved:
+                    floor = max(floor, self._resolved[segment_id])
+                else:
+                    waiting.append(segment_id)
+        g.write_buffer_local_segments = [
+            segment_id for segment_id in segment_ids if segment_id in local
+        ]
+        if waiting:
+            floor = max(floor, self._await_flushes(waiting))
+        g.write_buffer_floor = floor
+
+    def _await_flushes(self, segment_ids):
+        # Consulta as marcas até todas aparecerem ou o prazo acabar. Devolve
+        # a maior versão confirmada pelos flushes encontrados.
+        connection = self.repository.connection
+        deadline = time.monotonic() + self.read_wait_seconds
+        versions = {}
+        waiting = list(segment_ids)
+        while True:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT id, version FROM write_buffer_flushes "
+                f"WHERE id IN ({', '.join(['%s'] * len(waiting))})",
+                tuple(waiting),
+            )
+            for row in cursor.fetchall():
+                versions[row["id"]] = row["version"] or 0
+            cursor.close()
+            # Fecha o retrato da leitura: a próxima consulta vê commits novos
+            connection.rollback()
+            waiting = [segment_id for segment_id in waiting if segment_id not in versions]
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(WAIT_POLL_SECONDS)
+        with self._lock:
+            if waiting:
+                self.counters["read_wait_timeouts"] += 1
+            self.counters["read_waits"] += 1
+            # Os que não apareceram no prazo também não são esperados de novo
+            for segment_id in segment_ids:
+                self._resolved[segment_id] = versions.get(segment_id, 0)
+                self._resolved.move_to_end(segment_id)
+            while len(self._resolved) > RESOLVED_SEGMENTS_MAX:
+                self._resolved.popitem(last=False)
+        return max(versions.values(), default=0)
+
+    def _remember_segment(self, response):
+        # O cookie leva o segmento novo e os deste processo que o cliente já
+        # tinha e ainda estão pendentes; os dos outros já foram esperados
+        segment_id = g.get("write_buffer_segment")
+        if segment_id is None:
+            return response
+        carried = [
+            other
+            for other in g.get("write_buffer_local_segments", [])
+            if other != segment_id
+        ]
+        value = ",".join([segment_id, *carried][:MAX_SEGMENTS_PER_REQUEST])
+        response.headers[SEGMENT_HEADER] = value
+        response.set_cookie(
+            SEGMENT_COOKIE,
+            value,
+            max_age=SEGMENT_COOKIE_SECONDS,
+            httponly=True,
+            samesite="Lax",
+        )
+        return response
+
+    def read_floor(self):
+        # Versão mínima das réplicas: o último flush deste processo e os
+        # flushes de outros processos que a requisição esperou
+        floor = g.get("write_buffer_floor", 0) if has_request_context() else 0
+        return max(self.flushed_version, floor)
+
+    def request_pending(self, habit_ids=None):
+        pending = g.get("write_buffer_pending") or {}
+        if habit_ids is None:
+            return pending
+        wanted = set(habit_ids)
+        return {key: quantity for key, quantity in pending.items() if key[0] in wanted}
+
+    def flush(self):
+        # Grava o que estiver pendente usando a conexão do contexto atual.
+        # Segmentos que falharem continuam na fila para a próxima tentativa.
+        if not self.enabled or not self.has_pending():
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                if self._current is not None and self._current.entries:
+                    self._seal_current()
+                sealed = list(self._sealed)
+            applied = 0
+            for segment in sealed:
+                self._apply(segment)
+                applied += len(segment.entries)
+            return applied
+
+    def _apply(self, segment):
+        connection = self.repository.connection
+        cursor = connection.cursor()
+        habit_ids = sorted({habit_id for habit_id, _ in segment.entries})
+        version = None
+        try:
+            cursor.execute(
+                "SELECT id FROM write_buffer_flushes WHERE id = %s", (segment.id,)
+            )
+            if cursor.fetchone() is None:
+                habits = {}
+                if habit_ids:
+                    cursor.execute(
+                        "SELECT id, completion_method, target_quantity FROM habits "
+                        f"WHERE id IN ({', '.join(['%s'] * len(habit_ids))})",
+                        tuple(habit_ids),
+                    )
+                    habits = {habit["id"]: habit for habit in cursor.fetchall()}
+                # Hábitos apagados depois do toque são descartados
+                effects = {
+                    key: ("add", quantity)
+                    for key, quantity in segment.entries.items()
+                    if key[0] in habits
+                }
+                record_batch.write_effects(cursor, habits, effects)
+                version = changes.current_version(cursor)
+                cursor.execute(
+                    "INSERT INTO write_buffer_flushes (id, version) VALUES (%s, %s)",
+                    (segment.id, version),
+                )
+            prune = (
+                self._pruned_at is None
+                or time.monotonic() - self._pruned_at >= PRUNE_INTERVAL_SECONDS
+            )
+            if prune:
+                # Marcas antigas: os diários e cookies delas já se foram
+                cursor.execute(
+                    "DELETE FROM write_buffer_flushes "
+                    f"WHERE flushed_at < {dialect_of(cursor).days_ago('%s')}",
+                    (self.retention_days,),
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            self.counters["flush_errors"] += 1
+            raise
+        finally:
+            cursor.close()
+
+        if prune:
+            self._pruned_at = time.monotonic()
+        if version is not None:
+            self.flushed_version = max(self.flushed_version, version)
+        with self._lock:
+            self._sealed.remove(segment)
+            self.counters["flushes"] += 1
+            self.counters["keys_flushed"] += len(segment.entries)
+        if segment.path:
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+        if self.on_flushed is not None:
+            self.on_flushed(habit_ids)
+
+    def _flush_in_context(self):
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception:
+            traceback.print_exc()
+
+    def _run(self):
+        while not self._stopping:
+            self._flush_in_context()
+            self._wake.wait(self.window_seconds)
+            self._wake.clear()
+
+    def close(self):
+        # Chamado na saída do processo: para o thread e grava o que restou
+        if self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._flush_in_context()
+        with self._lock:
+            if self._current is not None and self._current.file is not None:
+                self._current.file.close()
+                self._current.file = None
+
+    def stats(self):
+        with self._lock:
+            pending_keys = sum(len(segment.entries) for segment in self._sealed)
+            if self._current is not None:
+                pending_keys += len(self._current.entries)
+            return {
+                "enabled": self.enabled,
+                "pending_keys": pending_keys,
+                "sealed_segments": len(self._sealed),
+                **self.counters,
+            }
@@ -0,0 +1,13 @@
+# Ponto de entrada para servidores WSGI em produção.
+#
+#   cd backend
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Cada worker é um processo com o próprio pool de conexões (criado no
+# primeiro uso, depois do fork). Com worker_class "gthread", cada thread
+# usa uma conexão por requisição, então mantenha
+# MYSQL_POOL_MAX_SIZE >= GUNICORN_THREADS. O total de conexões no MySQL
+# fica em até GUNICORN_WORKERS * MYSQL_POOL_MAX_SIZE.
+from app import app
+
+application = app
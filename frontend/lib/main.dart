@@ -75,17 +75,24 @@ class _OverallProgressScreenState extends State<OverallProgressScreen> {
         today.day,
       );
 
-      final String apiUrl =
+      final String baseApiUrl =
           '$_baseUrl/all_habit_records?' +
           'start_date=${oneYearAgo.toIso8601String().split('T')[0]}&' +
           'end_date=${today.toIso8601String().split('T')[0]}';
 
-      final response = await http.get(Uri.parse(apiUrl));
+      // O backend pagina os registros; segue o X-Next-Page-Token até o fim
+      Map<DateTime, int> aggregatedDatasets = {};
+      String? pageToken;
+      http.Response response;
+      do {
+        final String apiUrl =
+            pageToken == null
+                ? baseApiUrl
+                : '$baseApiUrl&page_token=${Uri.encodeQueryComponent(pageToken)}';
+        response = await http.get(Uri.parse(apiUrl));
+        if (response.statusCode != 200) break;
 
-      if (response.statusCode == 200) {
         List<dynamic> jsonList = jsonDecode(response.body);
-        Map<DateTime, int> aggregatedDatasets = {};
-
         for (var json in jsonList) {
           DateTime recordDate = DateTime.parse(json['record_date'] as String);
           DateTime normalizedDate = DateTime(
@@ -100,7 +107,10 @@ class _OverallProgressScreenState extends State<OverallProgressScreen> {
           aggregatedDatasets[normalizedDate] =
               (aggregatedDatasets[normalizedDate] ?? 0) + quantity;
         }
+        pageToken = response.headers['x-next-page-token'];
+      } while (pageToken != null);
 
+      if (response.statusCode == 200) {
         if (mounted) {
           setState(() {
             _overallDatasets = aggregatedDatasets;
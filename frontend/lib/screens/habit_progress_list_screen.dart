@@ -30,6 +30,9 @@ class _HabitProgressListScreenState extends State<HabitProgressListScreen> {
 
   final String _baseUrl = 'http://10.0.2.2:5000';
 
+  // Heatmaps dos hábitos carregados, buscados em lote por página
+  final Map<int, Map<DateTime, int>> _heatmapDatasets = {};
+
   @override
   void initState() {
     super.initState();
@@ -91,9 +94,15 @@ class _HabitProgressListScreenState extends State<HabitProgressListScreen> {
         List<Habit> newHabits =
             jsonList.map((json) => Habit.fromJson(json)).toList();
 
+        final heatmaps = await _fetchHeatmapsForHabits(newHabits);
+
         setState(() {
-          if (isRefresh) _habits.clear();
+          if (isRefresh) {
+            _habits.clear();
+            _heatmapDatasets.clear();
+          }
           _habits.addAll(newHabits);
+          _heatmapDatasets.addAll(heatmaps);
           _currentPage = page;
           _hasMore = newHabits.length == _perPage;
         });
@@ -116,6 +125,52 @@ class _HabitProgressListScreenState extends State<HabitProgressListScreen> {
     }
   }
 
+  // Uma requisição para os heatmaps de todos os hábitos da página, em vez
+  // de uma por card
+  Future<Map<int, Map<DateTime, int>>> _fetchHeatmapsForHabits(
+    List<Habit> habits,
+  ) async {
+    if (habits.isEmpty) return {};
+    final DateTime today = DateTime.now();
+    final DateTime sixMonthsAgo = DateTime(
+      today.year,
+      today.month - 5,
+      today.day,
+    );
+    final String apiUrl =
+        '$_baseUrl/habit_records/batch?' +
+        'habit_ids=${habits.map((habit) => habit.id).join(',')}&' +
+        'start_date=${sixMonthsAgo.toIso8601String().split('T')[0]}&' +
+        'end_date=${today.toIso8601String().split('T')[0]}';
+
+    try {
+      final response = await http.get(Uri.parse(apiUrl));
+      if (response.statusCode != 200) return {};
+      final Map<String, dynamic> body = jsonDecode(response.body);
+      final DateTime startDate = DateTime.parse(body['start_date'] as String);
+      final Map<int, Map<DateTime, int>> result = {};
+      (body['habits'] as Map<String, dynamic>).forEach((habitId, series) {
+        final List<dynamic> offsets = series['day_offsets'];
+        final List<dynamic> quantities = series['quantities'];
+        final Map<DateTime, int> datasets = {};
+        for (int i = 0; i < offsets.length; i++) {
+          final DateTime date = DateTime(
+            startDate.year,
+            startDate.month,
+            startDate.day + (offsets[i] as int),
+          );
+          datasets[date] =
+              (datasets[date] ?? 0) + (quantities[i] as int? ?? 1);
+        }
+        result[int.parse(habitId)] = datasets;
+      });
+      return result;
+    } catch (e) {
+      // Sem os dados em lote, cada card busca o próprio heatmap
+      return {};
+    }
+  }
+
   void _filterHabitsBy({int? categoryId}) {
     setState(() {
       _selectedCategoryIdFilter = categoryId;
@@ -219,6 +274,7 @@ class _HabitProgressListScreenState extends State<HabitProgressListScreen> {
                         // mas o parâmetro é necessário.
                       },
                       showDetails: false, // Importante para o layout desta tela
+                      datasets: _heatmapDatasets[habit.id],
                     ),
                   );
                 }, childCount: _habits.length + (_hasMore ? 1 : 0)),
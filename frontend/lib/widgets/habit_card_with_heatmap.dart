@@ -11,6 +11,9 @@ class HabitCardWithHeatmap extends StatefulWidget {
   final VoidCallback onHabitModified;
   final Function(Habit) onCheckButtonPressed;
   final bool showDetails;
+  // Dados já carregados pela lista (endpoint em lote). Quando presentes, o
+  // card não faz a própria requisição.
+  final Map<DateTime, int>? datasets;
 
   const HabitCardWithHeatmap({
     super.key,
@@ -18,6 +21,7 @@ class HabitCardWithHeatmap extends StatefulWidget {
     required this.onHabitModified,
     required this.onCheckButtonPressed,
     this.showDetails = true,
+    this.datasets,
   });
 
   @override
@@ -32,9 +36,27 @@ class _HabitCardWithHeatmapState extends State<HabitCardWithHeatmap> {
   String? _heatmapErrorMessage;
   bool _dataFetchInitiated = false;
 
+  @override
+  void initState() {
+    super.initState();
+    if (widget.datasets != null) {
+      _datasets = widget.datasets!;
+      _dataFetchInitiated = true;
+    }
+  }
+
   @override
   void didUpdateWidget(covariant HabitCardWithHeatmap oldWidget) {
     super.didUpdateWidget(oldWidget);
+    if (widget.datasets != null) {
+      if (!identical(widget.datasets, oldWidget.datasets)) {
+        setState(() {
+          _datasets = widget.datasets!;
+          _dataFetchInitiated = true;
+        });
+      }
+      return;
+    }
     if (_dataFetchInitiated &&
         (oldWidget.habit.id != widget.habit.id ||
             oldWidget.habit.isCompletedToday != widget.habit.isCompletedToday ||